@@ -3,3 +3,8 @@ from .views import api
 from .auth import views as api_auth_views
 from .user import views as api_user_views
 from .help import views as api_help_views
+from .changes import views as api_changes_views
+from .search import views as api_search_views
+from .export import views as api_export_views
+from .bulk_import import views as api_bulk_import_views
+from .operations import views as api_operations_views
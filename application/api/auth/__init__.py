@@ -1,3 +1,4 @@
 """package auth in api blueprint"""
 from .authentication import basic_auth
+from .cache import auth_cache, AuthIdentity, AuthUser
 from .errors import error_response, bad_request
@@ -2,6 +2,8 @@
 from flask import g, request
 from flask_login import login_user
 from flask_httpauth import HTTPBasicAuth
+from .cache import auth_cache
+from ...metrics import observe_auth
 from .errors import error_response, unauthorized, forbidden
 from .. import api as api_blueprint
 from ...user import User, AnonymousUser
@@ -23,16 +25,21 @@ def verify_password(email_or_token, password):
         #  POST /api/v#/users/ to register a new user is allowed without login
         if (request.endpoint == 'api.user_list' and request.method == 'POST'):
             g.current_user = AnonymousUser()
+            observe_auth('anonymous', success=True)
             return True
 
+        observe_auth('none', success=False)
         return False
 
     if password == '':
-        g.current_user = User.verify_auth_token(email_or_token)
+        # Usually answered from the cache, without a database query
+        g.current_user = auth_cache.verify_token(email_or_token)
         g.token_used = True
+        observe_auth('token', success=g.current_user is not None)
         return g.current_user is not None
     user = User.query.filter_by(email=email_or_token).first()
     if not user:
+        observe_auth('password', success=False)
         return False
     g.current_user = user
     g.token_used = False
@@ -40,8 +47,10 @@ def verify_password(email_or_token, password):
     if user.verify_password(password):
         # Also login to Flask_Login
         login_user(user, remember=False)
+        observe_auth('password', success=True)
         return True
 
+    observe_auth('password', success=False)
     return False
 
 
@@ -0,0 +1,275 @@
+"""Process-local caches that let token authenticated API requests skip the
+database
+
+Verifying a token means building a serializer, checking the HMAC signature and
+loading the User. Two small caches avoid most of that work:
+
+- token cache:    sha256 digest of the token -> id of the user, until the token
+                  expires. Only valid tokens are cached, and the tokens
+                  themselves are never stored.
+
+- identity cache: user id -> AuthIdentity, the few fields that authentication
+                  and authorization need (id, confirmed, blocked, permissions).
+                  Entries live for AUTH_IDENTITY_CACHE_TTL seconds.
+
+Invalidation:
+- SQLAlchemy events on User (confirmed, blocked or role changed, or deleted)
+  and Role (permissions changed) clear the identities of the process that made
+  the change, at flush and again after the transaction is committed.
+
+- Other worker processes pick up the change when their entry expires, so keep
+  AUTH_IDENTITY_CACHE_TTL short. Set it to 0 to disable the identity cache.
+"""
+import hashlib
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from flask import current_app
+from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
+from itsdangerous import BadSignature, SignatureExpired
+from ...extensions import db
+from ...metrics import observe_cache
+from ...user import User, Role, Permission
+
+# Read-only copy of the User fields needed to authenticate and authorize
+AuthIdentity = namedtuple('AuthIdentity',
+                          ['id', 'confirmed', 'blocked', 'permissions'])
+
+# Changes to these User attributes invalidate the cached identity
+AUTH_ATTRIBUTES = ('confirmed', 'blocked', 'role_id', 'role')
+
+
+class TTLCache(object):
+    """Thread-safe mapping with at most maxsize entries, that each expire at
+    their own time. When full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key):
+        """Return the value of key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, expires_at):
+        """Store value under key until the epoch time expires_at"""
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        """Remove key from the cache"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class AuthUser(object):
+    """The user of a token authenticated API request.
+
+    Authentication and the permission checks are answered from the cached
+    AuthIdentity. Any other attribute is read from, or written to, the User,
+    which is only loaded from the database when such an attribute is used.
+    """
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, identity):
+        object.__setattr__(self, 'identity', identity)
+        object.__setattr__(self, '_user', None)
+
+    @property
+    def id(self):  # pylint: disable=invalid-name
+        """Id of the user"""
+        return self.identity.id
+
+    @property
+    def confirmed(self):
+        """True if the email of the user is confirmed"""
+        return self.identity.confirmed
+
+    @property
+    def blocked(self):
+        """True if the account of the user is blocked"""
+        return self.identity.blocked
+
+    @property
+    def user(self):
+        """The User, loaded on first use"""
+        if self._user is None:
+            object.__setattr__(self, '_user', User.query.get(self.id))
+        return self._user
+
+    def get_id(self):
+        """Id of the user, as expected by Flask-Login"""
+        return str(self.id)
+
+    def can(self, perm):
+        """Returns True if User has all the permissions"""
+        return (self.identity.permissions is not None and
+                self.identity.permissions & perm == perm)
+
+    def is_administrator(self):
+        """Returns True if user has admin privileges"""
+        return self.can(Permission.ADMIN)
+
+    def is_usermanager(self):
+        """Returns True if user has usermanager privileges"""
+        return self.can(Permission.CRUD_USERS)
+
+    def __getattr__(self, name):
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+
+
+class AuthCache(object):
+    """Cache of verified tokens and of the identities of their users"""
+
+    def __init__(self):
+        self.tokens = TTLCache()
+        self.identities = TTLCache()
+        self.identity_ttl = 30
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def init_app(self, app):
+        """Read configuration of app and start with empty caches"""
+        self.tokens.maxsize = app.config.get('AUTH_TOKEN_CACHE_SIZE', 10000)
+        self.identities.maxsize = app.config.get('AUTH_IDENTITY_CACHE_SIZE',
+                                                 10000)
+        self.identity_ttl = app.config.get('AUTH_IDENTITY_CACHE_TTL', 30)
+        self.tokens.clear()
+        self.clear()
+
+    def verify_token(self, token):
+        """Returns the AuthUser of a valid authentication token, or None"""
+        key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        user_id = self.tokens.get(key)
+        observe_cache('auth_tokens', hit=user_id is not None)
+        if user_id is None:
+            ser = Serializer(current_app.config['SECRET_KEY'])
+            try:
+                data, header = ser.loads(token, return_header=True)
+            except (BadSignature, SignatureExpired):
+                return None
+            # Other tokens, eg. for email confirmation, carry no 'id'
+            user_id = data.get('id') if isinstance(data, dict) else None
+            if user_id is None:
+                return None
+            self.tokens.set(key, user_id, header['exp'])
+
+        identity = self.get_identity(user_id)
+        if identity is None:
+            return None
+        return AuthUser(identity)
+
+    def get_identity(self, user_id):
+        """Returns the AuthIdentity of user_id, or None if there is no such
+        user. Loads it from the database if needed.
+        """
+        identity = self.identities.get(user_id)
+        observe_cache('auth_identities', hit=identity is not None)
+        if identity is not None:
+            return identity
+
+        generation = self._generation
+        row = db.session.query(
+            User.id, User.confirmed, User.blocked, Role.permissions).outerjoin(
+                Role, User.role_id == Role.id).filter(
+                    User.id == user_id).first()
+        if row is None:
+            return None
+        identity = AuthIdentity(*row)
+
+        with self._lock:
+            # Do not store the identity if it was invalidated while loading
+            if self.identity_ttl and generation == self._generation:
+                self.identities.set(user_id, identity,
+                                    time.time() + self.identity_ttl)
+        return identity
+
+    def invalidate(self, user_id):
+        """Forget the identity of user_id"""
+        with self._lock:
+            self._generation += 1
+            self.identities.pop(user_id)
+
+    def clear(self):
+        """Forget all identities"""
+        with self._lock:
+            self._generation += 1
+            self.identities.clear()
+
+
+# Flask coding convention is to use lowercase for extension-like objects.
+auth_cache = AuthCache()  # pylint: disable=invalid-name
+
+
+def mark_dirty(session, user_id):
+    """Remember that the identity of user_id (None for all identities) must be
+    invalidated again when the transaction of session ends
+    """
+    if session is not None:
+        session.info.setdefault('auth_cache_dirty', set()).add(user_id)
+
+
+@event.listens_for(User, 'after_update')
+def on_user_update(unused_mapper, unused_connection, target):
+    """Invalidate the identity when an auth attribute of a user is flushed"""
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes()
+           for name in AUTH_ATTRIBUTES):
+        auth_cache.invalidate(target.id)
+        mark_dirty(object_session(target), target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def on_user_delete(unused_mapper, unused_connection, target):
+    """Invalidate the identity of a deleted user"""
+    auth_cache.invalidate(target.id)
+    mark_dirty(object_session(target), target.id)
+
+
+@event.listens_for(Role, 'after_update')
+@event.listens_for(Role, 'after_delete')
+def on_role_change(unused_mapper, unused_connection, target):
+    """Invalidate all identities when the permissions of a role change"""
+    auth_cache.clear()
+    mark_dirty(object_session(target), None)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def on_transaction_end(session):
+    """Invalidate again, so that a concurrent request of this process can not
+    have cached an identity from before the commit
+    """
+    for user_id in session.info.pop('auth_cache_dirty', ()):
+        if user_id is None:
+            auth_cache.clear()
+        else:
+            auth_cache.invalidate(user_id)
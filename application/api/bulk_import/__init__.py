@@ -0,0 +1,2 @@
+"""package bulk_import in api blueprint"""
+from .views import import_item_list
@@ -0,0 +1,35 @@
+"""Define the URL routes (views) for the bulk_import package of the REST api
+blueprint: bulk import of items, owned by the current user.
+
+    POST /api/v1/import/items?format=ndjson
+    POST /api/v1/import/items       (Content-Type: text/csv)
+
+The body is read line by line while the items are written, in batches. The
+response reports the number of inserted, updated, unchanged and failed rows,
+and the errors with their line numbers. See application/catalog/bulk_import.py
+"""
+import codecs
+from flask import g, jsonify, request
+from .. import api as api_blueprint
+from ..auth.errors import bad_request
+from ...catalog.bulk_import import IMPORT_FORMATS, import_items
+
+
+@api_blueprint.route('/import/items', methods=['POST'])
+def import_item_list():
+    """Insert or update items, by name, from an NDJSON (default) or CSV body"""
+    import_format = request.args.get('format')
+    if import_format is None:
+        import_format = ('csv' if request.mimetype == IMPORT_FORMATS['csv']
+                         else 'ndjson')
+    if import_format not in IMPORT_FORMATS:
+        return bad_request('format must be one of: {}'.format(
+            ', '.join(sorted(IMPORT_FORMATS))))
+
+    lines = codecs.iterdecode(request.stream, 'utf-8')
+    try:
+        result = import_items(lines, import_format, g.current_user.id)
+    except UnicodeDecodeError:
+        return bad_request('The body must be encoded in UTF-8')
+
+    return jsonify(result.to_json())
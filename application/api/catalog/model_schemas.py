@@ -16,6 +16,8 @@ class CategorySchema(Schema):
 
     id = fields.Integer(as_string=True, dump_only=True)
     timestamp = fields.DateTime()
+    updated_at = fields.DateTime(dump_only=True)
+    version = fields.Integer()
     name = fields.Str()
 
     user = Relationship(attribute='user',
@@ -39,6 +41,8 @@ class ItemSchema(Schema):
     id = fields.Integer(as_string=True, dump_only=True)
     name = fields.Str()
     description = fields.Str()
+    updated_at = fields.DateTime(dump_only=True)
+    version = fields.Integer()
 
     user = Relationship(attribute='user',
                         self_view='api.item_user',
@@ -1,13 +1,17 @@
 """Define the URL routes (views) for the catalog package of the REST api
 blueprint and handle all the HTTP requests into those api routes
 """
-from flask_rest_jsonapi import ResourceDetail, ResourceList, \
-     ResourceRelationship
+from flask_rest_jsonapi import ResourceDetail, ResourceRelationship
 from flask_rest_jsonapi.exceptions import ObjectNotFound, \
      BadRequest
 from sqlalchemy.orm.exc import NoResultFound
 from flask import g
 from . import CategorySchema, ItemSchema
+from ..conditional import ConditionalResource
+from ..loading import EagerLoadingDataLayer
+from ..pagination import KeysetResourceList
+from ..serializer import CompiledListResource
+from ..versioning import VersionedDataLayer
 from ...user import User
 from ...catalog import Category, Item
 from ...extensions import db
@@ -62,9 +66,12 @@ def query_for_category_only(query_, category_id):
     return query_
 
 
-class CategoryList(ResourceList):
+class CategoryList(ConditionalResource, CompiledListResource,
+                   KeysetResourceList):
     """ResourceList: provides get and post methods to retrieve a collection of
-                     objects or create one"""
+                     objects or create one. Supports keyset pagination,
+                     conditional GET, eager loading of includes, and the
+                     compiled serializer."""
     # http://flask-rest-jsonapi.readthedocs.io/en/latest/resource_manager.html
     def query(self, view_kwargs):
         """Adjust query to search for categories owned by current user only if
@@ -97,21 +104,24 @@ class CategoryList(ResourceList):
         data['user_id'] = g.current_user.id
 
     schema = CategorySchema
-    data_layer = {'session': db.session,
+    data_layer = {'class': EagerLoadingDataLayer,
+                  'session': db.session,
                   'model': Category,
                   'methods': {
                       'query': query,
                       'before_create_object': before_create_object}}
 
 
-class CategoryDetail(ResourceDetail):
+class CategoryDetail(ConditionalResource, ResourceDetail):
     """ResourceDetail: provides get, patch and delete methods to retrieve
                        details of an object, update an object and delete an
-                       object"""
+                       object. Supports conditional GET and optimistic
+                       concurrency."""
     # http://flask-rest-jsonapi.readthedocs.io/en/latest/resource_manager.html
 
     schema = CategorySchema
-    data_layer = {'session': db.session,
+    data_layer = {'class': VersionedDataLayer,
+                  'session': db.session,
                   'model': Category}
 
 
@@ -140,9 +150,12 @@ class CategoryUserRelationship(ResourceRelationship):
 #                   }
 
 
-class ItemList(ResourceList):
+class ItemList(ConditionalResource, CompiledListResource,
+               KeysetResourceList):
     """ResourceList: provides get and post methods to retrieve a collection of
-                     objects or create one"""
+                     objects or create one. Supports keyset pagination,
+                     conditional GET, eager loading of includes, and the
+                     compiled serializer."""
     # http://flask-rest-jsonapi.readthedocs.io/en/latest/resource_manager.html
     def query(self, view_kwargs):
         """Adjust query to search for items owned by current user only if
@@ -196,21 +209,24 @@ class ItemList(ResourceList):
         data['category_id'] = category.id
 
     schema = ItemSchema
-    data_layer = {'session': db.session,
+    data_layer = {'class': EagerLoadingDataLayer,
+                  'session': db.session,
                   'model': Item,
                   'methods': {
                       'query': query,
                       'before_create_object': before_create_object}}
 
 
-class ItemDetail(ResourceDetail):
+class ItemDetail(ConditionalResource, ResourceDetail):
     """ResourceDetail: provides get, patch and delete methods to retrieve
                        details of an object, update an object and delete an
-                       object"""
+                       object. Supports conditional GET and optimistic
+                       concurrency."""
     # http://flask-rest-jsonapi.readthedocs.io/en/latest/resource_manager.html
 
     schema = ItemSchema
-    data_layer = {'session': db.session,
+    data_layer = {'class': VersionedDataLayer,
+                  'session': db.session,
                   'model': Item}
 
 
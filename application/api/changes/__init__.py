@@ -0,0 +1,3 @@
+"""package changes in api blueprint"""
+from .model_schemas import ChangeSchema
+from .views import ChangeList
@@ -0,0 +1,18 @@
+"""Define logical data abstraction for REST API of the change log"""
+from marshmallow_jsonapi.flask import Schema
+from marshmallow_jsonapi import fields
+
+
+class ChangeSchema(Schema):
+    """Flask-REST-JSONAPI: Logical data abstraction for Change model"""
+    class Meta:  # pylint: disable=too-few-public-methods
+        """Define the details that come with HTTP Request"""
+        type_ = 'change'
+        self_view_many = 'api.change_list'
+
+    id = fields.Integer(as_string=True, dump_only=True)
+    timestamp = fields.DateTime(dump_only=True)
+    resource_type = fields.Str(dump_only=True)
+    resource_id = fields.Integer(as_string=True, dump_only=True)
+    operation = fields.Str(dump_only=True)
+    version = fields.Integer(dump_only=True)
@@ -0,0 +1,102 @@
+"""Define the URL routes (views) for the changes package of the REST api
+blueprint: the change feed.
+
+A consumer syncs its copy of the catalog by reading the changes after the id
+of the last change it has seen, starting with since=0 after a full sync:
+
+    GET /api/v1/changes?since=0&page[size]=500
+    GET /api/v1/changes?since=500&page[size]=500
+
+Every page has a next link, with the id of its last change as since.
+While meta.has_more is true, there are more changes to read right away.
+After that, the consumer polls the next link every now and then.
+
+Optionally, filter[resource_type]=item only returns the changes of items.
+
+Change ids are allocated when a transaction writes its changes, but the
+transaction may commit after a later transaction. To not skip over such
+changes, the feed only returns changes that are older than
+CHANGE_FEED_DELAY seconds.
+"""
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from flask import current_app, request
+from flask_rest_jsonapi import ResourceList
+from flask_rest_jsonapi.decorators import check_method_requirements
+from flask_rest_jsonapi.exceptions import BadRequest
+from . import ChangeSchema
+from ...changes import Change
+from ...extensions import db
+from ...extensions import api as rest_jsonapi
+
+
+def parse_int(parameter, default):
+    """Returns the non-negative integer value of a query string parameter"""
+    try:
+        value = int(request.args.get(parameter, default))
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise BadRequest('{} must be a non-negative integer'.format(
+            parameter), source={'parameter': parameter})
+    return value
+
+
+def feed_link(since):
+    """Returns the URL of the page with the changes after since"""
+    querystring = request.args.copy()
+    querystring['since'] = since
+    return '?'.join((request.base_url,
+                     urlencode(list(querystring.items(multi=True)))))
+
+
+class ChangeList(ResourceList):
+    """ResourceList: provides the get method to retrieve the changes of
+                     categories, items and users after a given change."""
+    # http://flask-rest-jsonapi.readthedocs.io/en/latest/resource_manager.html
+
+    @check_method_requirements
+    def get(self, *args, **kwargs):
+        """Retrieve the page of changes after the change with id since"""
+        self.before_get(args, kwargs)
+
+        since = parse_int('since', 0)
+        page_size = (parse_int('page[size]', 0) or
+                     current_app.config['PAGE_SIZE'])
+
+        query_ = self._data_layer.session.query(Change).filter(
+            Change.id > since)
+
+        resource_type = request.args.get('filter[resource_type]')
+        if resource_type:
+            query_ = query_.filter(Change.resource_type == resource_type)
+
+        delay = current_app.config['CHANGE_FEED_DELAY']
+        if delay:
+            query_ = query_.filter(Change.timestamp <= datetime.utcnow() -
+                                   timedelta(seconds=delay))
+
+        changes = query_.order_by(Change.id).limit(page_size + 1).all()
+        has_more = len(changes) > page_size
+        changes = changes[:page_size]
+        last = changes[-1].id if changes else since
+
+        result = ChangeSchema(many=True).dump(changes).data
+        result['links'] = {'self': feed_link(since),
+                           'next': feed_link(last)}
+        result['meta'] = {'has_more': has_more}
+
+        self.after_get(result)
+
+        return result
+
+    schema = ChangeSchema
+    data_layer = {'session': db.session,
+                  'model': Change}
+    methods = ['GET']
+
+
+###############################################################################
+# Flask-REST-JSONAPI: Create endpoints (routes)
+rest_jsonapi.route(ChangeList, 'change_list',
+                   '/changes')
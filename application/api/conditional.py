@@ -0,0 +1,73 @@
+"""Conditional GET for the resources of the REST api
+
+ConditionalResource answers GET requests with 304 Not Modified when the
+If-None-Match header of the request matches the current version of the
+resource. The version is computed before the data layer runs the query, so
+an unchanged resource costs one small query and no marshmallow dump:
+
+- detail resources: the version column of the row, which is also sent as
+                    Last-Modified
+- list resources:   the count, the newest id and the last modification of
+                    the rows in the scope of the URL, eg. all items of a
+                    category
+
+Requests with an include parameter are always answered in full, because the
+included resources are not covered by the version.
+"""
+from flask import request
+from flask_rest_jsonapi import ResourceDetail
+from flask_rest_jsonapi.exceptions import JsonApiException
+from ..conditional import collection_version, row_version, make_etag, \
+    is_not_modified, set_validators, not_modified_response
+
+
+class ConditionalResource(object):
+    """Mixin for the resource managers of Flask-REST-JSONAPI. It must come
+    before the resource class in the bases:
+
+        class ItemDetail(ConditionalResource, ResourceDetail):
+    """
+
+    def get_version(self, view_kwargs):
+        """Returns the version token and the last modification of the
+        resource, or None to answer the request in full
+        """
+        data_layer = self._data_layer
+        if isinstance(self, ResourceDetail):
+            row = row_version(data_layer.session, data_layer.model,
+                              view_kwargs['id'])
+            return None if row is None else (row.version, row.updated_at)
+
+        # The scope of a list, without filters and pagination, which are part
+        # of the URL and thus of the ETag. Deleting a row does not change the
+        # last modification, so there is no Last-Modified.
+        query_ = data_layer.query(view_kwargs)
+        return collection_version(query_, data_layer.model), None
+
+    def dispatch_request(self, *args, **kwargs):
+        """Return 304 Not Modified if the client has the current version"""
+        if request.method not in ('GET', 'HEAD') or 'include' in request.args:
+            return super(ConditionalResource, self).dispatch_request(
+                *args, **kwargs)
+
+        try:
+            version = self.get_version(kwargs)
+        except JsonApiException:
+            # eg. the user of /users/<id>/items does not exist. Let the
+            # resource return the error.
+            version = None
+
+        if version is None:
+            return super(ConditionalResource, self).dispatch_request(
+                *args, **kwargs)
+
+        token, last_modified = version
+        etag = make_etag(self._data_layer.model.__tablename__, token)
+        if is_not_modified(etag, last_modified):
+            return not_modified_response(etag, last_modified)
+
+        response = super(ConditionalResource, self).dispatch_request(
+            *args, **kwargs)
+        if response.status_code == 200:
+            set_validators(response, etag, last_modified)
+        return response
@@ -0,0 +1,2 @@
+"""package export in api blueprint"""
+from .views import export_item_list
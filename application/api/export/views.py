@@ -0,0 +1,43 @@
+"""Define the URL routes (views) for the export package of the REST api
+blueprint: bulk export of the items, with the same filters as the item lists.
+
+    GET /api/v1/export/items?format=ndjson
+    GET /api/v1/users/<user_id>/export/items?format=csv
+    GET /api/v1/categories/<category_id>/export/items
+
+The response is streamed with chunked transfer encoding, while the items are
+read from the database. See application/catalog/export.py
+"""
+from flask import Response, request, stream_with_context
+from .. import api as api_blueprint
+from ..auth.errors import bad_request, error_response
+from ...catalog import Category
+from ...catalog.export import EXPORT_FORMATS, export_items
+from ...user import User
+
+
+@api_blueprint.route('/export/items', methods=['GET'])
+@api_blueprint.route('/users/<int:user_id>/export/items', methods=['GET'])
+@api_blueprint.route('/categories/<int:category_id>/export/items',
+                     methods=['GET'])
+def export_item_list(user_id=None, category_id=None):
+    """Stream all items, or those of a user or of a category, as NDJSON
+    (default) or CSV
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return bad_request('format must be one of: {}'.format(
+            ', '.join(sorted(EXPORT_FORMATS))))
+
+    if user_id is not None and User.query.get(user_id) is None:
+        return error_response(404, 'User: {} not found'.format(user_id))
+    if category_id is not None and Category.query.get(category_id) is None:
+        return error_response(404, 'Category: {} not found'.format(
+            category_id))
+
+    filename = 'items.{}'.format(export_format)
+    return Response(
+        stream_with_context(export_items(export_format, user_id, category_id)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition':
+                 'attachment; filename="{}"'.format(filename)})
@@ -0,0 +1,149 @@
+"""Eager loading and sparse column loading for the lists of the REST api
+
+A list with include=user serializes the user of every object. Loaded lazily,
+that is one query per object. The include and fields[...] query string
+parameters are therefore turned into loader options of the query of the list:
+
+- include: every relationship on the include path is loaded eagerly, a
+           many-to-one with a JOIN (joinedload), and a one-to-many with one
+           extra SELECT ... WHERE id IN (...) for the whole page
+           (selectinload), which does not multiply the rows of the page:
+
+               GET /api/v1/items/?include=user.categories
+
+- fields:  only the columns of the requested fields are loaded (load_only),
+           plus the primary key and the sort key of the keyset pagination:
+
+               GET /api/v1/items/?fields[item]=name&include=user
+                   &fields[user]=first_name,last_name
+
+- the other relationships only serialize their links, so the related objects
+  are not loaded at all (noload).
+
+So the number of queries per page does not depend on the page size.
+
+When a requested field is not a plain column, eg. UserSchema.display_name,
+all columns of that resource are loaded, so that its value does not cost a
+query per object.
+"""
+from marshmallow import class_registry
+from marshmallow.base import SchemaABC
+from marshmallow_jsonapi.fields import Relationship
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, load_only, noload, selectinload
+from flask_rest_jsonapi.exceptions import InvalidInclude
+from flask_rest_jsonapi.schema import get_related_schema
+from .versioning import VersionedDataLayer
+
+# Columns that are always loaded, when the model has them
+ALWAYS_LOADED = ('id', 'timestamp')
+
+
+def related_schema(schema, name):
+    """Returns the schema class of the relationship field name of schema"""
+    schema_cls = get_related_schema(schema, name)
+    if isinstance(schema_cls, SchemaABC):
+        schema_cls = schema_cls.__class__
+    if isinstance(schema_cls, str):
+        schema_cls = class_registry.get_class(schema_cls)
+    return schema_cls
+
+
+def column_names(model, schema, query_string):
+    """Returns the names of the columns of model needed for the sparse
+    fieldset of schema, or None to load all columns
+    """
+    requested = query_string.fields.get(schema.Meta.type_)
+    if not requested:
+        return None
+
+    column_attrs = inspect(model).column_attrs
+    names = {name for name in ALWAYS_LOADED if name in column_attrs}
+    for name in requested:
+        # pylint: disable=protected-access
+        field = schema._declared_fields[name]
+        if isinstance(field, Relationship):
+            # The links of a relationship only need the id
+            continue
+        attribute = field.attribute or name
+        if attribute not in column_attrs:
+            return None
+        names.add(attribute)
+    return names
+
+
+def include_tree(schema, includes):
+    """Returns the include paths as a tree, eg. {'user': {'categories': {}}}.
+    Raises InvalidInclude for a path that is not a relationship.
+    """
+    tree = {}
+    for include in includes:
+        node, node_schema = tree, schema
+        for name in include.split('.'):
+            # pylint: disable=protected-access
+            if not isinstance(node_schema._declared_fields.get(name),
+                              Relationship):
+                raise InvalidInclude('{} is not a relationship attribute of '
+                                     '{}'.format(name, node_schema.__name__))
+            node = node.setdefault(name, {})
+            node_schema = related_schema(node_schema, name)
+    return tree
+
+
+def relationship_options(model, schema, query_string, includes, parent=None):
+    """Returns the loader options for the columns and the relationships of
+    schema, chained to the loader of the parent relationship, if any
+    """
+    options = []
+    columns = column_names(model, schema, query_string)
+    if columns:
+        options.append(parent.load_only(*columns) if parent is not None
+                       else load_only(*columns))
+
+    requested = query_string.fields.get(schema.Meta.type_)
+    # pylint: disable=protected-access
+    for name, field in schema._declared_fields.items():
+        attribute = getattr(model, field.attribute or name, None)
+        if not isinstance(field, Relationship) or attribute is None:
+            continue
+
+        if name in includes:
+            strategy = (selectinload if attribute.property.uselist
+                        else joinedload)
+        elif requested is None or name in requested:
+            # Only the links are serialized, which do not need the related
+            # objects
+            strategy = noload
+        else:
+            continue
+
+        loader = (strategy(attribute) if parent is None
+                  else getattr(parent, strategy.__name__)(attribute))
+        options.append(loader)
+        if name in includes:
+            options.extend(relationship_options(
+                attribute.property.mapper.class_, related_schema(schema, name),
+                query_string, includes[name], loader))
+    return options
+
+
+def loader_options(model, schema, query_string):
+    """Returns the loader options of the query of a list, for the include and
+    fields query string parameters in query_string
+    """
+    return relationship_options(model, schema, query_string,
+                                include_tree(schema, query_string.include))
+
+
+class EagerLoadingDataLayer(VersionedDataLayer):
+    """VersionedDataLayer that loads the included relationships of a list
+    eagerly, and only the columns of the requested fields
+    """
+
+    # qs is the name of the argument in the method of the base class
+    def eagerload_includes(self, query, qs):  # pylint: disable=invalid-name
+        """Add the loader options for include and fields to the query of a
+        list. Called on the query of the query method of the resource.
+        """
+        return query.options(*loader_options(self.model, self.resource.schema,
+                                             qs))
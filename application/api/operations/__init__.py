@@ -0,0 +1,2 @@
+"""package operations in api blueprint"""
+from .views import operations
@@ -0,0 +1,254 @@
+"""Define the URL routes (views) for the operations package of the REST api
+blueprint: several creates, updates and deletes of categories and items in one
+request and one transaction, modeled on the JSON:API Atomic Operations
+extension (https://jsonapi.org/ext/atomic).
+
+    POST /api/v1/operations
+    {"atomic:operations": [
+        {"op": "add",
+         "data": {"type": "category", "lid": "new-category",
+                  "attributes": {"name": "Sour Ale"}}},
+        {"op": "add",
+         "data": {"type": "item",
+                  "attributes": {"name": "Gose", "description": "Salty"},
+                  "relationships": {"category": {"data": {
+                      "type": "category", "lid": "new-category"}}}}},
+        {"op": "update",
+         "data": {"type": "item", "id": "21",
+                  "attributes": {"description": "Sweet", "version": 3}}},
+        {"op": "remove", "ref": {"type": "item", "id": "22"}}
+    ]}
+
+A new resource gets a local id (lid), that later operations use instead of its
+id. An item is added to the category of its category relationship.
+
+The operations run in order. The attributes are validated by the schemas of
+the resources, and the same rules apply as for the requests of the single
+resources: new resources are owned by the current user, and an update with a
+version only succeeds if nobody changed the resource in between. When an
+operation fails, nothing is committed, and the error points at the operation.
+Otherwise atomic:results has the result of every operation, in order.
+"""
+from flask import jsonify, request
+from flask_rest_jsonapi.errors import jsonapi_errors
+from flask_rest_jsonapi.exceptions import BadRequest, JsonApiException, \
+     ObjectNotFound
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from .. import api as api_blueprint
+from ..catalog import CategoryList, CategoryDetail, CategorySchema, \
+     ItemList, ItemDetail, ItemSchema
+from ...catalog import Category, Item
+from ...extensions import db
+
+MEDIA_TYPE = 'application/vnd.api+json; ext="https://jsonapi.org/ext/atomic"'
+
+# The most operations in one request
+MAX_OPERATIONS = 100
+
+# type -> model, schema, list and detail resource
+RESOURCES = {'category': (Category, CategorySchema, CategoryList,
+                          CategoryDetail),
+             'item': (Item, ItemSchema, ItemList, ItemDetail)}
+
+
+class Operation(object):
+    """The operation at index of the request, while it runs"""
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, index, operation):
+        self.index = index
+        self.pointer = '/atomic:operations/{}'.format(index)
+        if not isinstance(operation, dict):
+            raise self.bad_request('Must be an object')
+        self.op = operation.get('op')  # pylint: disable=invalid-name
+        self.data = operation.get('data')
+        self.ref = operation.get('ref')
+
+        if self.op not in ('add', 'update', 'remove'):
+            raise self.bad_request('op must be add, update or remove', '/op')
+        if self.op != 'remove' and not isinstance(self.data, dict):
+            raise self.bad_request('Must include data', '/data')
+        if self.op == 'remove' and not isinstance(self.ref, dict):
+            raise self.bad_request('Must include ref', '/ref')
+        if self.ref is not None and not isinstance(self.ref, dict):
+            raise self.bad_request('ref must be an object', '/ref')
+
+        member = 'ref' if self.op == 'remove' else 'data'
+        self.resource_type = (self.ref or self.data).get('type')
+        if self.resource_type not in RESOURCES:
+            raise self.bad_request('type must be category or item',
+                                   '/{}/type'.format(member))
+        (self.model, self.schema, self.list_resource,
+         self.detail_resource) = RESOURCES[self.resource_type]
+
+    def bad_request(self, detail, pointer=''):
+        """Returns a BadRequest error for this operation"""
+        return BadRequest(detail, source={'pointer': self.pointer + pointer})
+
+    def locate(self, error):
+        """Make the source of an error point into this operation"""
+        source = error.source if isinstance(error.source, dict) else {}
+        pointer = source.get('pointer') or ''
+        if not pointer.startswith(self.pointer):
+            error.source = {'pointer': self.pointer + (
+                pointer if pointer.startswith('/data') else '')}
+        return error
+
+    def load(self, partial=False):
+        """Returns the attributes of data, validated by the schema"""
+        document = {'data': {key: value for key, value in self.data.items()
+                             if key in ('type', 'id', 'attributes')}}
+        data, errors = self.schema(partial=partial).load(document)
+        if errors:
+            error = errors['errors'][0]
+            raise JsonApiException(
+                error.get('detail'),
+                source={'pointer': self.pointer + error.get(
+                    'source', {}).get('pointer', '')},
+                title='Validation error', status='422')
+        return data
+
+    def find(self, identifier, lids, pointer):
+        """Returns the object of a resource identifier, by id or lid"""
+        if identifier.get('lid') is not None:
+            obj = lids.get((identifier.get('type'), identifier['lid']))
+            if obj is None:
+                raise self.bad_request('Unknown lid: {}'.format(
+                    identifier['lid']), pointer + '/lid')
+            return obj
+
+        model = RESOURCES[identifier.get('type')][0] \
+            if identifier.get('type') in RESOURCES else self.model
+        try:
+            obj = model.query.get(int(identifier.get('id')))
+        except (TypeError, ValueError):
+            obj = None
+        if obj is None:
+            raise ObjectNotFound('{}: {} not found'.format(
+                model.__name__, identifier.get('id')),
+                                 source={'pointer': self.pointer + pointer})
+        return obj
+
+
+def add(operation, lids):
+    """Create a category or an item"""
+    data = operation.load()
+    data.pop('version', None)
+
+    view_kwargs = {}
+    if operation.model is Item:
+        category = ((operation.data.get('relationships') or {}).get(
+            'category') or {}).get('data')
+        if not isinstance(category, dict) or category.get('type') != \
+                'category':
+            raise operation.bad_request(
+                'Must include the category relationship',
+                '/data/relationships/category')
+        view_kwargs['category_id'] = operation.find(
+            category, lids, '/data/relationships/category/data').id
+
+    # The same checks, and the same owner, as a POST of the resource
+    # pylint: disable=protected-access
+    operation.list_resource._data_layer.before_create_object(data,
+                                                             view_kwargs)
+
+    obj = operation.model(**data)
+    db.session.add(obj)
+    db.session.flush()
+
+    if operation.data.get('lid') is not None:
+        lids[operation.resource_type, operation.data['lid']] = obj
+    return obj
+
+
+def update(operation, lids):
+    """Update the attributes of a category or an item"""
+    obj = operation.find(operation.data, lids, '/data')
+    data = operation.load(partial=True)
+
+    # The same optimistic concurrency as a PATCH of the resource
+    # pylint: disable=protected-access
+    expected = data.pop('version', None)
+    if expected is not None and expected != obj.version:
+        raise operation.detail_resource._data_layer.conflict({'id': obj.id})
+
+    for key, value in data.items():
+        setattr(obj, key, value)
+    db.session.flush()
+    return obj
+
+
+def remove(operation, lids):
+    """Delete a category or an item"""
+    obj = operation.find(operation.ref, lids, '/ref')
+    db.session.delete(obj)
+    db.session.flush()
+
+
+def run_operations(operation_list):
+    """Run the operations of operation_list, and returns their results. Does
+    not commit.
+    """
+    lids = {}
+    objects = []
+    for index, operation in enumerate(operation_list):
+        operation = Operation(index, operation)
+        try:
+            run = {'add': add, 'update': update, 'remove': remove}[
+                operation.op]
+            objects.append((operation, run(operation, lids)))
+        except StaleDataError:
+            # pylint: disable=protected-access
+            obj_id = (operation.ref or operation.data).get('id')
+            raise operation.locate(
+                operation.detail_resource._data_layer.conflict(
+                    {'id': obj_id}))
+        except IntegrityError as error:
+            raise operation.locate(JsonApiException(
+                str(error.orig), title='Integrity error', status='409'))
+        except JsonApiException as error:
+            raise operation.locate(error)
+
+    return [{'data': operation.schema().dump(obj).data['data']}
+            if obj is not None else {} for operation, obj in objects]
+
+
+def atomic_response(document, status_code):
+    """Returns the JSON response of document, with the media type of the
+    atomic extension
+    """
+    response = jsonify(document)
+    response.status_code = status_code
+    response.headers['Content-Type'] = MEDIA_TYPE
+    return response
+
+
+@api_blueprint.route('/operations', methods=['POST'])
+def operations():
+    """Run a list of add, update and remove operations on categories and
+    items, all or nothing
+    """
+    try:
+        document = request.get_json(force=True, silent=True)
+        operation_list = document.get('atomic:operations') \
+            if isinstance(document, dict) else None
+        if not isinstance(operation_list, list) or not operation_list:
+            raise BadRequest('Must include a list of atomic:operations',
+                             source={'pointer': '/atomic:operations'})
+        if len(operation_list) > MAX_OPERATIONS:
+            raise BadRequest('At most {} operations are allowed'.format(
+                MAX_OPERATIONS), source={'pointer': '/atomic:operations'})
+
+        results = run_operations(operation_list)
+        db.session.commit()
+    except JsonApiException as error:
+        db.session.rollback()
+        return atomic_response(jsonapi_errors([error.to_dict()]),
+                               int(error.status))
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return atomic_response({'atomic:results': results,
+                            'jsonapi': {'version': '1.0'}}, 200)
@@ -0,0 +1,183 @@
+"""Keyset (cursor) pagination for the collections of the REST api
+
+The offset pagination of Flask-REST-JSONAPI (page[number]) makes the database
+skip all the rows before the requested page, so every page is slower than the
+one before it. Keyset pagination instead remembers the sort key of the last row
+of a page, and the next page starts right after it:
+
+    WHERE (timestamp, id) > (:timestamp, :id)
+    ORDER BY timestamp, id
+    LIMIT :size
+
+so every page costs the same, regardless of how deep a client pages.
+
+Clients request the first page with an empty cursor, and then follow the
+opaque 'next' link of each page, until a page is returned without one:
+
+    GET /api/v1/items/?page[cursor]=&page[size]=100
+    GET /api/v1/items/?page[cursor]=WyIyMDE4LTA0LTI...&page[size]=100
+
+Without page[cursor], the offset pagination of Flask-REST-JSONAPI is used, so
+existing clients keep working.
+"""
+from datetime import datetime
+from urllib.parse import urlencode
+from sqlalchemy import and_, or_
+from flask import current_app, request
+from flask_rest_jsonapi import ResourceList
+from flask_rest_jsonapi.decorators import check_method_requirements
+from flask_rest_jsonapi.exceptions import BadRequest
+from flask_rest_jsonapi.querystring import QueryStringManager as QSManager
+from flask_rest_jsonapi.schema import compute_schema
+from ..cursors import encode_key, decode_key
+
+CURSOR_PARAMETER = 'page[cursor]'
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def encode_cursor(timestamp, id_):
+    """Returns an opaque cursor for the sort key (timestamp, id) of a row"""
+    return encode_key([timestamp.strftime(DATETIME_FORMAT), id_])
+
+
+def decode_cursor(cursor):
+    """Returns the sort key (timestamp, id) stored in a cursor.
+    An empty cursor returns None, which means: start at the first row.
+    """
+    if not cursor:
+        return None
+
+    try:
+        key = decode_key(cursor)
+        return datetime.strptime(key[0], DATETIME_FORMAT), int(key[1])
+    except (ValueError, TypeError, IndexError, KeyError):
+        raise BadRequest('Invalid cursor',
+                         source={'parameter': CURSOR_PARAMETER})
+
+
+def page_link(querystring):
+    """Returns the URL of the current request with another querystring"""
+    return '?'.join((request.base_url,
+                     urlencode(list(querystring.items(multi=True)))))
+
+
+def collection_query(data_layer, query_string, view_kwargs):
+    """Returns the filtered query of the collection of the data layer, like
+    its get_collection
+    """
+    data_layer.before_get_collection(query_string, view_kwargs)
+
+    query_ = data_layer.query(view_kwargs)
+
+    if query_string.filters:
+        query_ = data_layer.filter_query(query_, query_string.filters,
+                                         data_layer.model)
+    return query_
+
+
+def keyset_query(query_, model, after, size):
+    """Adjust query to return the page of size rows that come after the sort
+    key (timestamp, id) in after
+    """
+    if after is not None:
+        timestamp, id_ = after
+        query_ = query_.filter(or_(
+            model.timestamp > timestamp,
+            and_(model.timestamp == timestamp, model.id > id_)))
+
+    return query_.order_by(model.timestamp, model.id).limit(size)
+
+
+def keyset_querystring():
+    """Returns the query string of the request without the cursor, and the
+    cursor. Raises BadRequest when the cursor is combined with offset
+    pagination or sorting.
+    """
+    querystring = request.args.copy()
+    cursor = querystring.pop(CURSOR_PARAMETER)
+    for parameter in ('page[number]', 'sort'):
+        if parameter in querystring:
+            message = '{} can not be combined with {}'.format(
+                parameter, CURSOR_PARAMETER)
+            raise BadRequest(message, source={'parameter': parameter})
+    return querystring, cursor
+
+
+class KeysetResourceList(ResourceList):
+    """ResourceList that adds keyset pagination on (timestamp, id) to the get
+    method when the page[cursor] query string parameter is provided
+    """
+    # http://flask-rest-jsonapi.readthedocs.io/en/latest/resource_manager.html
+
+    @check_method_requirements
+    def get(self, *args, **kwargs):
+        """Retrieve a page of a collection of objects"""
+        if CURSOR_PARAMETER not in request.args:
+            return super(KeysetResourceList, self).get(*args, **kwargs)
+
+        self.before_get(args, kwargs)
+
+        result = self.get_keyset_page(kwargs)
+
+        self.after_get(result)
+
+        return result
+
+    def get_keyset_page(self, view_kwargs, serializer=None):
+        """Returns the document of the page that starts after the cursor.
+        The objects are dumped by the schema, or, when a compiled serializer
+        is given, only its columns are selected and it dumps the rows.
+        """
+        querystring, cursor = keyset_querystring()
+
+        query_string = QSManager(querystring, self.schema)
+        page_size = (int(query_string.pagination.get('size', 0)) or
+                     current_app.config['PAGE_SIZE'])
+
+        objects = self.get_keyset_collection(
+            query_string, view_kwargs, decode_cursor(cursor), page_size + 1,
+            serializer.columns if serializer is not None else None)
+        has_next = len(objects) > page_size
+        objects = objects[:page_size]
+
+        if serializer is None:
+            schema_kwargs = getattr(self, 'get_schema_kwargs', dict())
+            schema_kwargs.update({'many': True})
+
+            schema = compute_schema(self.schema,
+                                    schema_kwargs,
+                                    query_string,
+                                    query_string.include)
+
+            result = schema.dump(objects).data
+        else:
+            result = {'data': serializer.dump(objects)}
+
+        links = {'self': page_link(request.args)}
+        if has_next:
+            querystring[CURSOR_PARAMETER] = encode_cursor(
+                objects[-1].timestamp, objects[-1].id)
+            links['next'] = page_link(querystring)
+        result['links'] = links
+
+        return result
+
+    def get_keyset_collection(self, query_string, view_kwargs, after, size,
+                              columns=None):
+        """Retrieve the objects of a page through the data layer, or only
+        their columns, as rows
+        """
+        # pylint: disable=too-many-arguments
+        data_layer = self._data_layer
+
+        query_ = collection_query(data_layer, query_string, view_kwargs)
+
+        if columns is None:
+            query_ = data_layer.eagerload_includes(query_, query_string)
+        else:
+            query_ = query_.with_entities(*columns)
+
+        collection = keyset_query(query_, data_layer.model, after, size).all()
+
+        return data_layer.after_get_collection(collection, query_string,
+                                               view_kwargs)
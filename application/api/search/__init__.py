@@ -0,0 +1,2 @@
+"""package search in api blueprint"""
+from .views import Search
@@ -0,0 +1,101 @@
+"""Define the URL routes (views) for the search package of the REST api
+blueprint: full-text search of items and categories.
+
+    GET /api/v1/search?q=amber ale
+    GET /api/v1/search?q=amber ale&filter[type]=item&page[size]=10
+
+The data contains the matching items and categories, best match first, with
+their score in meta. Follow the next link for more results, until a page is
+returned without one. See application/search
+"""
+from urllib.parse import urlencode
+from flask import current_app, request
+from flask_rest_jsonapi.resource import Resource
+from flask_rest_jsonapi.exceptions import BadRequest
+from ..catalog import CategorySchema, ItemSchema
+from ...catalog import Category, Item
+from ...search import search, encode_hit_cursor, decode_hit_cursor
+from ...search.query import RESOURCE_TYPES
+from ...extensions import api as rest_jsonapi
+
+CURSOR_PARAMETER = 'page[cursor]'
+
+# Model and schema of the search results of each type
+RESOURCES = {'category': (Category, CategorySchema),
+             'item': (Item, ItemSchema)}
+
+
+def page_link(querystring):
+    """Returns the URL of the current request with another querystring"""
+    return '?'.join((request.base_url,
+                     urlencode(list(querystring.items(multi=True)))))
+
+
+def dump_hits(hits):
+    """Returns the resource objects of hits, in the same order"""
+    resources = {}
+    for resource_type, (model, schema) in RESOURCES.items():
+        ids = [hit.id for hit in hits if hit.resource_type == resource_type]
+        if not ids:
+            continue
+        objects = model.query.filter(model.id.in_(ids)).all()
+        for resource in schema(many=True).dump(objects).data['data']:
+            resources[resource_type, int(resource['id'])] = resource
+
+    data = []
+    for hit in hits:
+        # A row that was deleted after the search is left out
+        resource = resources.get((hit.resource_type, hit.id))
+        if resource is not None:
+            resource['meta'] = {'score': hit.score}
+            data.append(resource)
+    return data
+
+
+class Search(Resource):
+    """Resource: provides the get method to search items and categories"""
+    # http://flask-rest-jsonapi.readthedocs.io/en/latest/resource_manager.html
+
+    def get(self):  # pylint: disable=no-self-use
+        """Retrieve a page of the items and categories matching q"""
+        query = request.args.get('q', '').strip()
+        if not query:
+            raise BadRequest('Missing search query',
+                             source={'parameter': 'q'})
+
+        resource_types = RESOURCE_TYPES
+        if request.args.get('filter[type]'):
+            resource_types = request.args['filter[type]'].split(',')
+            if not set(resource_types) <= set(RESOURCE_TYPES):
+                message = 'filter[type] must be one of: {}'.format(
+                    ', '.join(RESOURCE_TYPES))
+                raise BadRequest(message, source={'parameter': 'filter[type]'})
+
+        try:
+            page_size = int(request.args.get('page[size]') or
+                            current_app.config['PAGE_SIZE'])
+            after = decode_hit_cursor(request.args.get(CURSOR_PARAMETER))
+            if page_size < 1:
+                raise ValueError(page_size)
+        except ValueError:
+            raise BadRequest('Invalid page[size] or page[cursor]',
+                             source={'parameter': 'page'})
+
+        hits = search(query, resource_types, after, page_size + 1)
+        has_next = len(hits) > page_size
+        hits = hits[:page_size]
+
+        result = {'data': dump_hits(hits),
+                  'links': {'self': page_link(request.args)}}
+        if has_next:
+            querystring = request.args.copy()
+            querystring[CURSOR_PARAMETER] = encode_hit_cursor(hits[-1])
+            result['links']['next'] = page_link(querystring)
+
+        return result
+
+
+###############################################################################
+# Flask-REST-JSONAPI: Create endpoints (routes)
+rest_jsonapi.route(Search, 'search',
+                   '/search')
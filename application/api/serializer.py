@@ -0,0 +1,335 @@
+"""Compiled serializer for the lists of the REST api
+
+marshmallow-jsonapi dumps every object of a page field by field, and resolves
+the self links of every object and of every relationship with url_for. On a
+page of a few hundred items, that is most of the time of the request.
+
+A list without include is therefore dumped by a RowSerializer instead. It is
+compiled once per schema and sparse fieldset:
+
+- attributes:    a list of (key, attribute, format) of the plain fields, where
+                 format is None when the value of the column is already what
+                 marshmallow returns (eg. String and Integer columns)
+- links:         the URL of every self and related link is a template, built
+                 with url_for once per application, eg. /api/v1/items/{id}
+- function fields, eg. UserSchema.display_name, are called with the row
+
+and it reads rows with only the columns it needs, instead of ORM instances:
+
+    SELECT items.id, items.timestamp, items.name, ... FROM items LIMIT 10
+
+The document is the same as the one of marshmallow-jsonapi, so the response is
+byte-identical. Fields that are not compiled, eg. a relationship with resource
+linkage, make the list use the schema, as do requests with include.
+Set FAST_SERIALIZER = False to always use the schemas.
+"""
+from functools import lru_cache
+from flask import current_app, request, url_for
+from flask_rest_jsonapi.decorators import check_method_requirements
+from flask_rest_jsonapi.pagination import add_pagination_links
+from flask_rest_jsonapi.querystring import QueryStringManager as QSManager
+from marshmallow import fields, utils
+from marshmallow_jsonapi.fields import Relationship
+from marshmallow_jsonapi.utils import tpl
+from sqlalchemy import Integer, String, inspect
+from .loading import ALWAYS_LOADED
+from .pagination import CURSOR_PARAMETER, KeysetResourceList, \
+    collection_query, keyset_querystring
+
+# Stands in for the values of a link, while its template is built
+SENTINEL = 9876543210123456789
+
+
+def isoformat(value):
+    """Format a datetime the same way as marshmallow DateTime, as UTC"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.isoformat() + '+00:00'
+    return utils.isoformat(value)
+
+
+def to_string(value):
+    """Format an Integer(as_string=True), eg. the id"""
+    return None if value is None else str(value)
+
+
+def link_template(endpoint, params):
+    """Returns the URL of endpoint as a str.format template, with a
+    replacement field for every parameter in params, eg. /api/v1/items/{id}
+    """
+    values = {param: SENTINEL + index for index, param in enumerate(params)}
+    template = url_for(endpoint, **values).replace('{', '{{').replace(
+        '}', '}}')
+    for param, value in values.items():
+        template = template.replace(str(value), '{' + param + '}')
+    return template
+
+
+def link_templates(links):
+    """Returns the templates of links, cached per application and script
+    root, because url_for depends on both
+    """
+    cache = current_app.extensions.setdefault('link_templates', {})
+    templates = []
+    for endpoint, params in links:
+        key = (endpoint, tuple(params), request.script_root)
+        if key not in cache:
+            cache[key] = link_template(endpoint, [param for param, _ in
+                                                  params])
+        templates.append(cache[key])
+    return templates
+
+
+def column_format(field, column):
+    """Returns the format of a field of column, None if the value of the
+    column is the serialized value, or False if it is not compiled
+    """
+    if isinstance(field, fields.Integer) and isinstance(column.type,
+                                                        Integer):
+        return to_string if field.as_string else None
+    # Not a subclass, eg. Email, which may format the value
+    if (type(field) is fields.String and  # pylint: disable=C0123
+            isinstance(column.type, String)):
+        return None
+    if isinstance(field, fields.DateTime) and not field.localtime and \
+            (field.dateformat or 'iso') in ('iso', 'iso8601'):
+        return isoformat
+    return False
+
+
+def url_params(view_kwargs, column_attrs):
+    """Returns [(param, attribute)] of the view kwargs of a link, or None
+    when a value is not a column of the row
+    """
+    params = []
+    for param, value in sorted(view_kwargs.items()):
+        attribute = tpl(str(value))
+        if attribute not in column_attrs:
+            return None
+        params.append((param, attribute))
+    return params
+
+
+class RowSerializer(object):
+    """Dumps rows to the resource objects of a schema"""
+
+    def __init__(self, schema_type, columns):
+        self.type_ = schema_type
+        self.columns = columns
+        self.attributes = []
+        self.functions = []
+        self.relationships = []
+        self.links = []
+        self.self_link = None
+
+    def add_link(self, endpoint, params):
+        """Returns the index of the template of a link"""
+        self.links.append((endpoint, params))
+        return len(self.links) - 1
+
+    def dump(self, rows):
+        """Returns the resource objects of the rows, as marshmallow-jsonapi
+        would dump the objects
+        """
+        templates = link_templates(self.links)
+        relationships = [
+            (key, [(name, templates[index], params)
+                   for name, index, params in links])
+            for key, links in self.relationships]
+        self_template = templates[self.self_link[0]]
+        return [self.dump_row(row, self_template, relationships)
+                for row in rows]
+
+    def dump_row(self, row, self_template, relationships):
+        """Returns the resource object of a row, with the templates of its
+        links
+        """
+        values = {}
+        for key, attribute, format_ in self.attributes:
+            value = getattr(row, attribute)
+            values[key] = value if format_ is None else format_(value)
+        for key, function in self.functions:
+            values[key] = function(row)
+
+        item = {'type': self.type_,
+                'id': str(row.id),
+                'links': {'self': self_template.format(**{
+                    param: getattr(row, attribute)
+                    for param, attribute in self.self_link[1]})}}
+        if values:
+            item['attributes'] = values
+        if relationships:
+            item['relationships'] = {
+                key: {'links': {name: template.format(**{
+                    param: getattr(row, attribute)
+                    for param, attribute in params})
+                                for name, template, params in links}}
+                for key, links in relationships}
+        return item
+
+
+def dumped_fields(schema_cls, only):
+    """Returns {name: field} of the fields of the schema that are dumped, for
+    the sparse fieldset only, the same fields as compute_schema
+    """
+    schema = schema_cls(only=tuple(set(only) | {'id'}) if only else None)
+    return {name: field for name, field in schema.fields.items()
+            if not field.load_only}
+
+
+def compile_relationship(serializer, key, field, column_attrs):
+    """Add the links of a Relationship field to serializer. Returns the
+    names of the columns of the links, or None if they can not be compiled
+    """
+    if field.include_resource_linkage:
+        return None
+    names = set()
+    links = []
+    for link, endpoint, view_kwargs in [
+            ('self', field.self_view, field.self_view_kwargs),
+            ('related', field.related_view, field.related_view_kwargs)]:
+        if endpoint is None:
+            continue
+        params = url_params(view_kwargs, column_attrs)
+        if params is None:
+            return None
+        names.update(attribute for _, attribute in params)
+        links.append((link, serializer.add_link(endpoint, params), params))
+    if links:
+        serializer.relationships.append((key, links))
+    return names
+
+
+def compile_field(serializer, name, field, column_attrs):
+    """Add a dumped field of a schema to serializer. Returns the names of the
+    columns that it needs, or None if it can not be compiled
+    """
+    key = field.dump_to or name
+    attribute = field.attribute or name
+    if name == 'id':
+        compiled = isinstance(field, fields.Integer) and field.as_string \
+            and attribute == 'id'
+        return set() if compiled else None
+    if isinstance(field, Relationship):
+        return compile_relationship(serializer, key, field, column_attrs)
+    if isinstance(field, fields.Function) and field.serialize_func:
+        # Called with the row, which has all the columns
+        serializer.functions.append((key, field.serialize_func))
+        return set(column_attrs.keys())
+
+    format_ = column_format(field, column_attrs[attribute].columns[0]) \
+        if attribute in column_attrs else False
+    if format_ is False:
+        return None
+    serializer.attributes.append((key, attribute, format_))
+    return {attribute}
+
+
+@lru_cache(maxsize=None)
+def compile_schema(schema_cls, model, only=None):
+    """Returns the RowSerializer of schema_cls for the rows of model, with
+    the fields in the frozenset only, or None if the schema can not be
+    compiled
+    """
+    opts = schema_cls.opts
+    column_attrs = inspect(model).column_attrs
+    if opts.self_url is None or opts.inflect is not None:
+        return None
+    self_params = url_params(opts.self_url_kwargs or {}, column_attrs)
+    if self_params is None:
+        return None
+
+    names = {name for name in ALWAYS_LOADED if name in column_attrs}
+    names.update(attribute for _, attribute in self_params)
+
+    serializer = RowSerializer(opts.type_, None)
+    serializer.self_link = (serializer.add_link(opts.self_url, self_params),
+                            self_params)
+    for name, field in dumped_fields(schema_cls, only).items():
+        field_names = compile_field(serializer, name, field, column_attrs)
+        if field_names is None:
+            return None
+        names.update(field_names)
+
+    serializer.columns = [getattr(model, name) for name in sorted(names)]
+    return serializer
+
+
+def row_collection(data_layer, query_string, view_kwargs, columns):
+    """Returns the number of rows and the rows of a page of the collection of
+    the data layer, with only the columns, like its get_collection
+    """
+    query_ = collection_query(data_layer, query_string, view_kwargs)
+
+    if query_string.sorting:
+        query_ = data_layer.sort_query(query_, query_string.sorting)
+
+    object_count = query_.count()
+
+    query_ = data_layer.paginate_query(query_.with_entities(*columns),
+                                       query_string.pagination)
+
+    return object_count, query_.all()
+
+
+class CompiledListResource(object):
+    """Mixin for the list resources of Flask-REST-JSONAPI, that dumps lists
+    without include with the compiled serializer of the schema. It must come
+    before the resource class in the bases:
+
+        class UserList(CompiledListResource, ResourceList):
+    """
+
+    def compiled_serializer(self):
+        """Returns the RowSerializer for the request, or None to use the
+        schema
+        """
+        if not current_app.config['FAST_SERIALIZER']:
+            return None
+
+        if CURSOR_PARAMETER in request.args and \
+                isinstance(self, KeysetResourceList):
+            querystring = keyset_querystring()[0]
+        else:
+            querystring = request.args
+        query_string = QSManager(querystring, self.schema)
+        if query_string.include:
+            return None
+
+        only = query_string.fields.get(self.schema.opts.type_)
+        return compile_schema(self.schema, self._data_layer.model,
+                              frozenset(only) if only else None)
+
+    @check_method_requirements
+    def get(self, *args, **kwargs):
+        """Retrieve a collection of objects"""
+        serializer = self.compiled_serializer()
+        if serializer is None:
+            return super(CompiledListResource, self).get(*args, **kwargs)
+
+        self.before_get(args, kwargs)
+
+        if CURSOR_PARAMETER in request.args and \
+                isinstance(self, KeysetResourceList):
+            result = self.get_keyset_page(kwargs, serializer)
+        else:
+            query_string = QSManager(request.args, self.schema)
+            objects_count, rows = row_collection(
+                self._data_layer, query_string, kwargs, serializer.columns)
+
+            result = {'data': serializer.dump(rows)}
+
+            view_kwargs = request.view_args if getattr(
+                self, 'view_kwargs', None) is True else dict()
+            add_pagination_links(result,
+                                 objects_count,
+                                 query_string,
+                                 url_for(self.view, _external=True,
+                                         **view_kwargs))
+
+            result.update({'meta': {'count': objects_count}})
+
+        self.after_get(result)
+
+        return result
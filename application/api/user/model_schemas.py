@@ -19,6 +19,7 @@ class UserSchema(Schema):
     password = fields.Str(load_only=True)
     first_name = fields.Str()
     last_name = fields.Str()
+    version = fields.Integer()
 
     # Extra: a nicely formatted display name
     display_name = fields.Function(lambda obj: "{} {} <{}>".format(
@@ -1,19 +1,25 @@
 """Define the URL routes (views) for the user package of the REST api
 blueprint and handle all the HTTP requests into those api routes
 """
+import os
 from flask_rest_jsonapi import ResourceDetail, ResourceList, \
      ResourceRelationship
 from flask_rest_jsonapi.exceptions import JsonApiException, BadRequest
+from werkzeug.exceptions import HTTPException
 from werkzeug.http import HTTP_STATUS_CODES
-from flask import current_app, g, request, send_from_directory, jsonify, \
-     url_for
+from flask import abort, g, request, jsonify, url_for
 from . import UserSchema
 from .. import api as api_blueprint
 from ..catalog import find_user_by_category_id, find_user_by_item_id
+from ..serializer import CompiledListResource
+from ..auth.errors import error_response
+from ..versioning import VersionedDataLayer
 from ...user import User
 from ...decorators import admin_required
 from ...email import send_confirmation_email, send_invitation_email
-from ...extensions import db
+from ...thumbnails import thumbnailer
+from ...blobs import image_upload, send_media
+from ...extensions import db, images
 from ...extensions import api as rest_jsonapi
 
 
@@ -25,9 +31,10 @@ from ...extensions import api as rest_jsonapi
 #    https://github.com/miLibris/flask-rest-jsonapi/blob/master/
 #          flask_rest_jsonapi/resource.py
 
-class UserList(ResourceList):
+class UserList(CompiledListResource, ResourceList):
     """ResourceList: provides get and post methods to retrieve a collection of
-                     objects or create one"""
+                     objects or create one. Supports the compiled
+                     serializer."""
     # http://flask-rest-jsonapi.readthedocs.io/en/latest/resource_manager.html
     def query(self, unused_view_kwargs):
         """Adjust query to retrieve only data for users that the current user
@@ -76,7 +83,8 @@ class UserList(ResourceList):
             send_confirmation_email(obj)
 
     schema = UserSchema
-    data_layer = {'session': db.session,
+    data_layer = {'class': VersionedDataLayer,
+                  'session': db.session,
                   'model': User,
                   'methods': {
                       'query': query,
@@ -117,7 +125,8 @@ class UserDetail(ResourceDetail):
             view_kwargs['id'] = user.id
 
     schema = UserSchema
-    data_layer = {'session': db.session,
+    data_layer = {'class': VersionedDataLayer,
+                  'session': db.session,
                   'model': User,
                   'methods': {
                       'before_get_object': before_get_object}}
@@ -186,30 +195,75 @@ rest_jsonapi.route(UserItemRelationship, 'user_items',
 #############################################################################
 # Custom routes, not going over Flask-REST-JSONAPI
 @api_blueprint.route('/profile_pic', methods=['GET', 'POST'])
+@image_upload
 def upload_profile_pic():
     """Upload or download of a profile picture via HTTP request to the API """
-    if request.method == 'POST':
-        if 'profile_pic' in request.files:
-            client_file_storage = request.files['profile_pic']
-            g.current_user.profile_pic = client_file_storage  # Calls "setter"
-
-            db.session.commit()
-
-            response = jsonify({})
-            response.status_code = 201
-            response.headers['Location'] = url_for('api.upload_profile_pic',
-                                                   _external=True)
-            return response
-
-        return jsonify(
-            message='profile_pic not in request files'), 400
-
-    if g.current_user.profile_pic_filename:
-        return send_from_directory(
-            current_app.config['UPLOADED_IMAGES_DEST'],
-            g.current_user.profile_pic_filename)
-
-    return jsonify(message="Profile picture for user not found"), 404
+    try:
+        if request.method == 'POST':
+            return receive_profile_pic()
+        return send_profile_pic()
+    except HTTPException as error:
+        # eg. one of UPLOAD_ERRORS, when the upload is not an image
+        return error_response(error.code, error.description)
+
+
+def receive_profile_pic():
+    """Store the uploaded profile picture of the current user"""
+    files = request.files
+    if 'profile_pic' not in files:
+        abort(400, 'profile_pic not in request files')
+
+    client_file_storage = files['profile_pic']
+    g.current_user.profile_pic = client_file_storage  # Calls "setter"
+
+    db.session.commit()
+
+    response = jsonify({})
+    response.status_code = 201
+    response.headers['Location'] = url_for('api.upload_profile_pic',
+                                           _external=True)
+    return response
+
+
+def send_profile_pic():
+    """Send the profile picture of the current user, or its thumbnail of the
+    size of the request
+    """
+    if not g.current_user.profile_pic_filename:
+        abort(404, 'Profile picture for user not found')
+
+    size = request.args.get('size')
+    if size == 'original':
+        return send_media(g.current_user.profile_pic_filename, private=True)
+    try:
+        size = int(size) if size else None
+    except ValueError:
+        abort(400, 'size must be a number of pixels or original')
+    return send_profile_pic_thumbnail(g.current_user.profile_pic_filename,
+                                      size)
+
+
+def send_profile_pic_thumbnail(filename, size):
+    """Send the smallest thumbnail of the profile picture filename that is at
+    least size pixels, in WebP if the client accepts it. The picture itself is
+    sent while it has no thumbnails yet.
+
+    The response depends on the user, so clients revalidate it. The URLs of
+    the files themselves, in profile_pic_url, are cached as immutable.
+    """
+    mimetypes = ('image/jpeg',)
+    if 'image/webp' in [value for value, _ in request.accept_mimetypes]:
+        mimetypes = ('image/webp',) + mimetypes
+
+    found = thumbnailer.find(images.path(filename), size, mimetypes)
+    if found is None:
+        return send_media(filename, private=True)
+
+    response = send_media(os.path.relpath(found[0],
+                                          images.config.destination),
+                          mimetype=found[1], private=True)
+    response.vary.add('Accept')
+    return response
 
 
 @api_blueprint.route('/invite/<string:user_email>', methods=['POST'])
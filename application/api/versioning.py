@@ -0,0 +1,66 @@
+"""Optimistic concurrency for the resources of the REST api
+
+Category, Item and User have a version column, that SQLAlchemy increments on
+every UPDATE. Resources return it as an attribute, and a client that sends it
+back with a PATCH only updates the resource if nobody changed it in between:
+
+    PATCH /api/v1/items/21
+    {"data": {"type": "item", "id": "21",
+              "attributes": {"description": "...", "version": 3}}}
+
+Otherwise the response is 409 Conflict, and the client should GET the
+resource again. The same happens when another transaction updates the row
+between the SELECT and the UPDATE of the request (StaleDataError).
+"""
+from flask_rest_jsonapi.data_layers.alchemy import SqlalchemyDataLayer
+from flask_rest_jsonapi.exceptions import JsonApiException
+from sqlalchemy.orm.exc import StaleDataError
+
+
+class Conflict(JsonApiException):
+    """Raised when the resource was changed by another request"""
+    title = 'Conflict'
+    status = '409'
+
+
+class VersionedDataLayer(SqlalchemyDataLayer):
+    """Data layer for models with a version_id_col named version"""
+
+    def create_object(self, data, view_kwargs):
+        """Create an object. The version of a new object is always 1."""
+        data.pop('version', None)
+        return super(VersionedDataLayer, self).create_object(data,
+                                                             view_kwargs)
+
+    def update_object(self, obj, data, view_kwargs):
+        """Update obj, unless the client edited another version of it"""
+        expected = data.pop('version', None)
+        if obj is not None and expected is not None and \
+                expected != obj.version:
+            raise self.conflict(view_kwargs)
+
+        try:
+            super(VersionedDataLayer, self).update_object(obj, data,
+                                                          view_kwargs)
+        except JsonApiException as error:
+            # The data layer wraps the error of the commit
+            if isinstance(error.__context__, StaleDataError):
+                raise self.conflict(view_kwargs)
+            raise
+
+    def delete_object(self, obj, view_kwargs):
+        """Delete obj, unless it was changed by another transaction"""
+        try:
+            super(VersionedDataLayer, self).delete_object(obj, view_kwargs)
+        except JsonApiException as error:
+            if isinstance(error.__context__, StaleDataError):
+                raise self.conflict(view_kwargs)
+            raise
+
+    def conflict(self, view_kwargs):
+        """Returns the Conflict error for the object of the request"""
+        return Conflict('{} {} was changed by another request. Get it again, '
+                        'and retry your changes.'.format(
+                            self.model.__name__,
+                            view_kwargs[getattr(self, 'url_field', 'id')]),
+                        source={'pointer': '/data/attributes/version'})
@@ -1,10 +1,17 @@
 """Module with functions for application creation and configuration"""
+import click
 from flask import Flask
 
 from config import Config
 from .user import User, Role
-from .catalog import Item
+from .catalog import Item, category_cache
+# Importing the change log registers the session events that write it
+from .changes import Change  # pylint: disable=unused-import
+from .blobs import UploadRequest
 from .extensions import db, migrate, login_manager, api, images, mail
+from .passwords import password_hasher
+from .thumbnails import thumbnailer
+from .search import include_object, autocomplete_index
 
 
 # For import *
@@ -18,10 +25,13 @@ def create_app(config=Config, app_name=None):
         app_name = config.APP_NAME
 
     app = Flask(app_name, instance_relative_config=True)
+    # Checks the uploaded images while they are read
+    app.request_class = UploadRequest
     configure_app(app, config)
     configure_blueprints(app)
     configure_extensions(app)
     configure_logging(app)
+    configure_instrumentation(app)
     configure_cli(app)
 
     return app
@@ -55,12 +65,15 @@ def configure_extensions(app):
     - flask-rest-jsonapi
     - flask-uploads
     - flask-mail
+    - category cache of the catalog blueprint
+    - token & identity cache of the api authentication
+    - password hasher
     """
     # flask-sqlalchemy
     db.init_app(app)
 
-    # flask-migrate
-    migrate.init_app(app, db)
+    # flask-migrate, ignoring the full-text search tables of SQLite
+    migrate.init_app(app, db, include_object=include_object)
 
     # flask-login
     login_manager.login_view = 'auth.login'
@@ -83,6 +96,22 @@ def configure_extensions(app):
     # flask-mail
     mail.init_app(app)
 
+    # category cache of the catalog blueprint
+    category_cache.init_app(app)
+
+    # token & identity cache of the api authentication
+    from .api.auth import auth_cache
+    auth_cache.init_app(app)
+
+    # autocomplete index of the category and item names
+    autocomplete_index.init_app(app)
+
+    # password hasher
+    password_hasher.init_app(app)
+
+    # thumbnails of the profile pictures
+    thumbnailer.init_app(app)
+
 
 def configure_blueprints(app):
     """Configure blueprints in views."""
@@ -91,11 +120,14 @@ def configure_blueprints(app):
     from .auth import auth
     from .email import email
     from .catalog import catalog
+    from .metrics import metrics
+    from .blobs import media
     # Note: api blueprint already initialzed above in api.init_app(---)
     # from .api import api
 
     # Register all blueprints with the application
-    for blueprint in [user, auth, email, catalog]:
+    for blueprint in [user, auth, email, catalog, metrics,
+                      media]:
         app.register_blueprint(blueprint)
 
 
@@ -134,12 +166,37 @@ def configure_logging(app):
     app.logger.info('Application startup')
 
 
+def configure_instrumentation(app):
+    """Record the time and SQL statements of every request, to add them as a
+    Server-Timing header to the response and to log slow requests.
+
+    See application/instrumentation.py
+    """
+    from .instrumentation import instrumentation
+    instrumentation.init_app(app)
+
+
 def configure_cli(app):
     """Add custom commands to the flask command line interface.
 
     To reset the database to default content:
         $ flask initdb
 
+    To add a large synthetic catalog, eg. for capacity testing:
+        $ flask seed --users 1000 --categories 5000 --items 1000000
+
+    To send the emails that are queued in the outbox:
+        $ flask mail-worker
+
+    To export the items, eg. of one category, as NDJSON or CSV:
+        $ flask export --format csv --category 3 --output items.csv
+
+    To import items from NDJSON or CSV, owned by a user:
+        $ flask import items.csv --format csv --user admin@example.com
+
+    To remove the uploaded files that nobody refers to any more, eg. hourly:
+        $ flask gc-blobs
+
     See: http://flask.pocoo.org/docs/0.12/cli/
     """
     # Disable check because it is correct that callbacks are never used here.
@@ -162,3 +219,96 @@ def configure_cli(app):
 
         app.logger.info("Inserting default items...")
         Item.insert_default_items()
+
+    @app.cli.command()
+    @click.option('--users', default=10, help='Number of users to add')
+    @click.option('--categories', default=20,
+                  help='Number of categories to add')
+    @click.option('--items', default=1000, help='Number of items to add')
+    @click.option('--seed', 'seed_', default=42,
+                  help='Seed of the random generator')
+    @click.option('--chunk-size', default=10000,
+                  help='Number of rows inserted per transaction')
+    def seed(users, categories, items, seed_, chunk_size):
+        """Bulk insert a large synthetic catalog"""
+        import time
+        from .seed import seed_catalog
+
+        start = time.time()
+        result = seed_catalog(db.engine, users=users, categories=categories,
+                              items=items, seed=seed_, chunk_size=chunk_size)
+        app.logger.info("Inserted %d users, %d categories and %d items in "
+                        "%.1f seconds", result.users, result.categories,
+                        result.items, time.time() - start)
+
+    @app.cli.command('mail-worker')
+    @click.option('--poll-interval', default=5.0,
+                  help='Seconds between checks of the outbox')
+    @click.option('--once', is_flag=True,
+                  help='Send the emails that are due, and exit')
+    def mail_worker(poll_interval, once):
+        """Send the emails that are queued in the outbox"""
+        from .email.outbox import run_worker
+
+        app.logger.info("Mail worker started")
+        run_worker(poll_interval, once=once)
+
+    @app.cli.command('export')
+    @click.option('--format', 'export_format', default='ndjson',
+                  type=click.Choice(['ndjson', 'csv']),
+                  help='Output format')
+    @click.option('--user', 'user_id', type=int,
+                  help='Only export the items of this user id')
+    @click.option('--category', 'category_id', type=int,
+                  help='Only export the items of this category id')
+    @click.option('--output', type=click.File('w', encoding='utf-8'),
+                  default='-', help='Output file, default stdout')
+    def export(export_format, user_id, category_id, output):
+        """Stream the items as NDJSON or CSV"""
+        from .catalog.export import export_items
+
+        for chunk in export_items(export_format, user_id, category_id):
+            output.write(chunk)
+
+    @app.cli.command('import')
+    @click.argument('input_', metavar='INPUT',
+                    type=click.File('r', encoding='utf-8'))
+    @click.option('--format', 'import_format', default='ndjson',
+                  type=click.Choice(['ndjson', 'csv']),
+                  help='Input format')
+    @click.option('--user', 'email', required=True,
+                  help='Email of the user that owns the imported items')
+    @click.option('--batch-size', default=1000,
+                  help='Number of rows written per transaction')
+    def import_(input_, import_format, email, batch_size):
+        """Insert or update items, by name, from NDJSON or CSV"""
+        import time
+        from .catalog.bulk_import import import_items
+
+        user = User.query.filter_by(email=email).first()
+        if user is None:
+            raise click.BadParameter('No user with email {}'.format(email),
+                                     param_hint='--user')
+
+        start = time.time()
+        result = import_items(input_, import_format, user.id, batch_size)
+        app.logger.info("Inserted %d, updated %d and skipped %d unchanged "
+                        "items in %.1f seconds", result.inserted,
+                        result.updated, result.unchanged, time.time() - start)
+        for error in result.errors:
+            click.echo('line {}: {}'.format(error.line, error.message),
+                       err=True)
+        if result.failed:
+            raise click.ClickException('{} rows failed'.format(result.failed))
+
+    @app.cli.command('gc-blobs')
+    @click.option('--grace', type=int, default=None,
+                  help='Seconds that a file is kept after its last use, '
+                  'default BLOB_GC_GRACE')
+    def gc_blobs(grace):
+        """Remove the uploaded files that nobody refers to"""
+        from .blobs import collect_garbage
+
+        result = collect_garbage(grace)
+        app.logger.info("Removed %d blobs and %d files, %d bytes",
+                        result.blobs, result.files, result.bytes)
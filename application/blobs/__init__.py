@@ -0,0 +1,5 @@
+"""package blobs: content-addressed storage of the uploaded files"""
+from .models import Blob
+from .store import save_upload, release, collect_garbage, is_blob_filename
+from .views import media, media_url, send_media
+from .uploads import UploadRequest, UPLOAD_ERRORS, image_upload
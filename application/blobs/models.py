@@ -0,0 +1,25 @@
+"""Definition of database tables using ORM of blobs"""
+from datetime import datetime
+from ..extensions import db
+
+
+class Blob(db.Model):
+    """ORM for one stored file, by the SHA-256 of its content.
+
+    ref_count is the number of rows that refer to the file, eg. the users that
+    have it as profile picture. A blob that nobody refers to anymore is removed
+    by the garbage collection, with `flask gc-blobs`.
+    """
+    # pylint: disable=too-few-public-methods
+    __tablename__ = 'blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    filename = db.Column(db.String, unique=True)  # eg. 3f/3f7a...e1.jpg
+    size = db.Column(db.Integer)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+
+    def __repr__(self):
+        """Returns output of print"""
+        return '<Blob %r %r>' % (self.filename, self.ref_count)
@@ -0,0 +1,225 @@
+"""Content-addressed storage of the uploaded files, eg. the profile pictures
+
+An upload is streamed to a temporary file while it is hashed, and then renamed
+to a name derived from the SHA-256 of its content:
+
+    IMAGE_DEST/3f/3f7a...e1.jpg
+
+so a file that is uploaded many times, eg. a popular avatar, is stored once.
+The rename is atomic: a stored file is either absent, or complete.
+
+The blobs table counts the references to every file. save_upload adds one and
+release removes one, in the transaction of the caller. Requests never remove
+files. The garbage collection, `flask gc-blobs`, removes them in a batch:
+
+- blobs that nobody refers to for at least BLOB_GC_GRACE seconds
+- files without a blob, eg. of an upload that was rolled back, and temporary
+  files of failed uploads, once they are BLOB_GC_GRACE seconds old
+
+together with their thumbnails. The grace period keeps the files of uploads
+that are not committed yet.
+
+The reference count is added with INSERT ... ON CONFLICT, which both SQLite
+and PostgreSQL support. Files that were uploaded before the blob store keep
+their names, and are not counted.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_uploads import UploadNotAllowed, extension
+from ..extensions import db, images
+from ..thumbnails import thumbnailer
+from .models import Blob
+
+# Bytes read from the upload at a time
+CHUNK_SIZE = 64 * 1024
+
+# Sub-directory of the temporary files of uploads
+TMP_DIRECTORY = 'tmp'
+
+# eg. 3f/3f7a...e1.jpg
+BLOB_FILENAME = re.compile(r'^([0-9a-f]{2})/\1[0-9a-f]{62}\.[a-z0-9]+$')
+SHARD = re.compile(r'^[0-9a-f]{2}$')
+
+# Counts of a garbage collection
+GcResult = namedtuple('GcResult', ['blobs', 'files', 'bytes'])
+
+ACQUIRE = db.text(
+    'INSERT INTO blobs (sha256, filename, size, ref_count, created_at, '
+    'updated_at) VALUES (:sha256, :filename, :size, 1, :now, :now) '
+    'ON CONFLICT (sha256) DO UPDATE SET ref_count = blobs.ref_count + 1, '
+    'updated_at = :now').bindparams(db.bindparam('now', type_=db.DateTime))
+
+
+def is_blob_filename(filename):
+    """Returns True if filename is the name of a file in the blob store"""
+    return bool(filename) and BLOB_FILENAME.match(filename) is not None
+
+
+def stream_to_temporary_file(stream, directory):
+    """Copy stream to a new file in directory, while hashing it.
+
+    Returns the path of the file, its SHA-256 and its size.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    handle, path = tempfile.mkstemp(dir=directory, suffix='.upload')
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                sha256.update(chunk)
+                size += len(chunk)
+                file.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, sha256.hexdigest(), size
+
+
+def save_upload(storage, session=None, upload_set=images):
+    """Store the FileStorage of an upload in the blob store, and count a
+    reference to it in session. Raises UploadNotAllowed for a file that is
+    not allowed in upload_set.
+
+    Returns the filename of the blob, relative to the destination of
+    upload_set.
+    """
+    session = session or db.session
+    basename = upload_set.get_basename(storage.filename)
+    if not upload_set.file_allowed(storage, basename):
+        raise UploadNotAllowed()
+
+    root = upload_set.config.destination
+    file_extension = extension(basename)
+    if hasattr(storage.stream, 'persist'):
+        # An ImageSpool, which hashed and sniffed the upload while it was read
+        tmp_path = storage.stream.persist()
+        content = storage.stream.content
+        sha256, size = content.sha256.hexdigest(), content.size
+        file_extension = content.extension
+    else:
+        tmp_directory = os.path.join(root, TMP_DIRECTORY)
+        os.makedirs(tmp_directory, exist_ok=True)
+        tmp_path, sha256, size = stream_to_temporary_file(storage.stream,
+                                                          tmp_directory)
+
+    # The first upload of a content names it
+    filename = session.query(Blob.filename).filter(
+        Blob.sha256 == sha256).scalar() or '{}/{}.{}'.format(
+            sha256[:2], sha256, file_extension)
+    path = os.path.join(root, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Also when the file exists, in case the garbage collection is removing
+    # it right now
+    os.replace(tmp_path, path)
+
+    session.execute(ACQUIRE, {'sha256': sha256, 'filename': filename,
+                              'size': size, 'now': datetime.utcnow()})
+
+    if thumbnailer.find(path) is None:
+        thumbnailer.submit(path)
+    return filename
+
+
+def release(executor, filename):
+    """Remove a reference to the blob filename, with executor, a session or a
+    connection. Returns False if filename is not in the blob store.
+    """
+    if not is_blob_filename(filename):
+        return False
+    blobs = Blob.__table__
+    executor.execute(blobs.update().where(
+        blobs.c.filename == filename).values(
+            ref_count=blobs.c.ref_count - 1, updated_at=datetime.utcnow()))
+    return True
+
+
+def remove_file(path):
+    """Remove the file at path, and returns its size, or 0 if it is gone"""
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+    return size
+
+
+def collect_unreferenced(root, cutoff, batch_size):
+    """Delete the blobs that nobody refers to since cutoff, and their files.
+
+    Returns the number of blobs, and the number and the size of the files.
+    """
+    blobs = files = size = 0
+    unreferenced = (Blob.ref_count <= 0) & (Blob.updated_at < cutoff)
+    while True:
+        candidates = db.session.query(Blob.sha256, Blob.filename).filter(
+            unreferenced).limit(batch_size).all()
+        if not candidates:
+            break
+
+        # A blob that got a reference since the select is not deleted
+        removed = [filename for sha256, filename in candidates
+                   if Blob.query.filter(Blob.sha256 == sha256, unreferenced)
+                   .delete(synchronize_session=False)]
+        db.session.commit()
+
+        for filename in removed:
+            path = os.path.join(root, filename)
+            for removed_size in [remove_file(file) for file in
+                                 [path] + thumbnailer.derivatives(path)]:
+                files += 1 if removed_size else 0
+                size += removed_size
+        blobs += len(removed)
+    return blobs, files, size
+
+
+def collect_orphans(root, cutoff):
+    """Remove the files without a blob that were modified before cutoff, a
+    timestamp, including thumbnails and temporary files.
+
+    Returns the number and the size of the files.
+    """
+    files = size = 0
+
+    directories = [entry for entry in os.scandir(root)
+                   if entry.is_dir() and SHARD.match(entry.name)]
+    for directory in directories:
+        known = {sha256 for sha256, in db.session.query(Blob.sha256).filter(
+            Blob.sha256.like(directory.name + '%'))}
+        for entry in os.scandir(directory.path):
+            if entry.name[:64] not in known and \
+                    entry.stat().st_mtime < cutoff:
+                size += remove_file(entry.path)
+                files += 1
+        db.session.commit()
+
+    tmp_directory = os.path.join(root, TMP_DIRECTORY)
+    if os.path.isdir(tmp_directory):
+        for entry in os.scandir(tmp_directory):
+            if entry.stat().st_mtime < cutoff:
+                size += remove_file(entry.path)
+                files += 1
+    return files, size
+
+
+def collect_garbage(grace=None, batch_size=1000, upload_set=images):
+    """Remove the unreferenced blobs and the orphaned files of upload_set that
+    are older than grace seconds, BLOB_GC_GRACE by default.
+
+    Returns a GcResult.
+    """
+    if grace is None:
+        grace = current_app.config['BLOB_GC_GRACE']
+    root = upload_set.config.destination
+    if not os.path.isdir(root):
+        return GcResult(0, 0, 0)
+
+    blobs, files, size = collect_unreferenced(
+        root, datetime.utcnow() - timedelta(seconds=grace), batch_size)
+    orphan_files, orphan_size = collect_orphans(root, time.time() - grace)
+    return GcResult(blobs, files + orphan_files, size + orphan_size)
@@ -0,0 +1,221 @@
+"""Streaming, size-capped uploads of images
+
+The form parser of Werkzeug writes every uploaded file to a stream, in chunks,
+as it reads the body of the request. For the views decorated with
+image_upload, that stream is an ImageSpool, which checks the file while it
+arrives, long before the view runs:
+
+- UPLOAD_MAX_BYTES:     the size of the file. The upload is rejected with 413
+                        as soon as it is larger.
+- the type:             the first bytes must be those of a JPEG, PNG, GIF or
+                        BMP image, else 415. So eg. an SVG or an HTML page
+                        with an image extension is rejected after 8 bytes.
+- UPLOAD_MAX_DIMENSION: the width and the height of the image, read from its
+                        header when the file is complete, else 413. Pixels
+                        are never decoded here.
+
+The file is kept in memory up to UPLOAD_SPOOL_SIZE bytes, and then on disk in
+the temporary directory of the blob store, while it is hashed. save_upload
+then renames it into the blob store, instead of copying it again.
+
+MAX_CONTENT_LENGTH rejects larger form bodies, by their Content-Length, before
+any byte is read. Bodies that are read as a stream, eg. of the bulk import,
+are not limited by it.
+"""
+import hashlib
+import io
+import os
+import tempfile
+from functools import wraps
+from PIL import Image
+from flask import Request, current_app, request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from ..extensions import images
+from .store import TMP_DIRECTORY
+
+# Leading bytes of the image formats -> file extension
+SIGNATURES = [(b'\xff\xd8\xff', 'jpg'),
+              (b'\x89PNG\r\n\x1a\n', 'png'),
+              (b'GIF87a', 'gif'),
+              (b'GIF89a', 'gif'),
+              (b'BM', 'bmp')]
+HEAD_SIZE = max(len(signature) for signature, _ in SIGNATURES)
+
+# Errors of an upload that is rejected while it is read
+UPLOAD_ERRORS = (RequestEntityTooLarge, UnsupportedMediaType)
+
+
+def sniff_image(head):
+    """Returns the extension of the image format of the leading bytes head,
+    or None if it is not a known image format
+    """
+    for signature, extension in SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+class SpoolContent(object):
+    """The SHA-256, the size and the image format of the content of a spool,
+    taken while it is written
+    """
+
+    def __init__(self):
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+        self.extension = None
+        # Whether the complete image was checked
+        self.checked = False
+
+    def update(self, data):
+        """Add a chunk of the content"""
+        self.size += len(data)
+        self.sha256.update(data)
+        if len(self.head) < HEAD_SIZE:
+            self.head += data[:HEAD_SIZE - len(self.head)]
+
+    def sniff(self):
+        """Set the extension of the image format of the head. Returns False
+        if the head is not of an image.
+        """
+        self.extension = sniff_image(self.head)
+        return self.extension is not None
+
+
+class ImageSpool(object):
+    """Writable and readable file of an uploaded image, that rejects it as
+    soon as it is too large or not an image
+    """
+
+    def __init__(self, max_bytes, max_dimension, spool_size, directory):
+        self.max_bytes = max_bytes
+        self.max_dimension = max_dimension
+        self.spool_size = spool_size
+        self.directory = directory
+        self.file = io.BytesIO()
+        self.path = None
+        self.content = SpoolContent()
+
+    def write(self, data):
+        """Write a chunk of the upload"""
+        content = self.content
+        content.update(data)
+        if content.size > self.max_bytes:
+            raise self.reject(RequestEntityTooLarge(
+                'The image is larger than {} bytes'.format(self.max_bytes)))
+        if content.extension is None and len(content.head) == HEAD_SIZE:
+            self.check_type()
+
+        if self.path is None and content.size > self.spool_size:
+            self.rollover()
+        self.file.write(data)
+        return len(data)
+
+    def check_type(self):
+        """Raise UnsupportedMediaType if the head is not of an image"""
+        if not self.content.sniff():
+            raise self.reject(UnsupportedMediaType(
+                'The file is not a JPEG, PNG, GIF or BMP image'))
+
+    def check_dimensions(self):
+        """Raise RequestEntityTooLarge if the image is larger than
+        max_dimension pixels, or UnsupportedMediaType if its header is broken
+        """
+        self.file.seek(0)
+        try:
+            # Not in a with block, which would close the file of the spool
+            width, height = Image.open(self.file).size
+        except Image.DecompressionBombError:
+            width = height = float('inf')
+        except (IOError, OSError, SyntaxError, ValueError):
+            raise self.reject(UnsupportedMediaType('The image is broken'))
+        if max(width, height) > self.max_dimension:
+            raise self.reject(RequestEntityTooLarge(
+                'The image is larger than {0} x {0} pixels'.format(
+                    self.max_dimension)))
+
+    def reject(self, error):
+        """Returns error, after removing what was spooled"""
+        self.close()
+        return error
+
+    def seek(self, offset, whence=0):
+        """Seek, which the form parser does once the upload is complete"""
+        if not self.content.checked:
+            self.content.checked = True
+            if self.content.extension is None:
+                self.check_type()
+            self.check_dimensions()
+        return self.file.seek(offset, whence)
+
+    def rollover(self):
+        """Move the content from memory to a temporary file"""
+        os.makedirs(self.directory, exist_ok=True)
+        handle, self.path = tempfile.mkstemp(dir=self.directory,
+                                             suffix='.upload')
+        file = os.fdopen(handle, 'w+b')
+        file.write(self.file.getvalue())
+        self.file = file
+
+    def persist(self):
+        """Returns the path of a file with the upload, that the caller owns"""
+        if self.path is None:
+            self.rollover()
+        self.file.close()
+        path, self.path = self.path, None
+        return path
+
+    def close(self):
+        """Close the spool, and remove its file"""
+        self.file.close()
+        if self.path is not None:
+            os.remove(self.path)
+            self.path = None
+
+    def __getattr__(self, name):
+        """read, tell, etc. of the file"""
+        return getattr(self.file, name)
+
+
+class UploadRequest(Request):  # pylint: disable=too-many-ancestors
+    """Request that writes the uploaded files of the views decorated with
+    image_upload to an ImageSpool. The files of the spools are removed when
+    the request is closed, also when the form parser failed half-way.
+    """
+    image_upload = False
+    spools = ()
+
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        if not self.image_upload or not filename:
+            return super(UploadRequest, self)._get_file_stream(
+                total_content_length, content_type, filename, content_length)
+
+        config = current_app.config
+        spool = ImageSpool(config['UPLOAD_MAX_BYTES'],
+                           config['UPLOAD_MAX_DIMENSION'],
+                           config['UPLOAD_SPOOL_SIZE'],
+                           os.path.join(images.config.destination,
+                                        TMP_DIRECTORY))
+        self.spools = self.spools + (spool,)
+        return spool
+
+    def close(self):
+        """Close the files of the request, and all spools"""
+        super(UploadRequest, self).close()
+        for spool in self.spools:
+            spool.close()
+
+
+def image_upload(view):
+    """Decorator for views that receive images. Their uploads are checked
+    while they are read, and raise one of UPLOAD_ERRORS when the form or the
+    files of the request are first used.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        """Spool the files of the request through an ImageSpool"""
+        request.image_upload = True
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,116 @@
+"""Define the URL route of the media blueprint, which serves the uploaded
+files, eg. the profile pictures and their thumbnails:
+
+    GET /media/3f/3f7a...e1.jpg
+    GET /media/3f/3f7a...e1.jpg.128.webp
+
+The name of a blob is the hash of its content, and the name of a thumbnail is
+derived from it, so what a URL returns never changes. It is cached for
+MEDIA_MAX_AGE seconds, also by proxies, and browsers do not revalidate it:
+
+    Cache-Control: public, max-age=31536000, immutable
+    ETag: "3f7a...e1.jpg.128.webp"
+
+Files that were uploaded before the blob store are cached for
+MEDIA_LEGACY_MAX_AGE seconds only. All responses answer If-None-Match with
+304 Not Modified, and Range with 206 Partial Content.
+
+With MEDIA_OFFLOAD, the web server sends the bytes of the file, and the worker
+only checks it and sets the headers:
+
+- 'x-accel-redirect': nginx, with an internal location at MEDIA_ACCEL_PREFIX
+
+                          location /_media/ {
+                              internal;
+                              alias /path/to/IMAGE_DEST/;
+                          }
+
+- 'x-sendfile':       Apache with mod_xsendfile, lighttpd
+"""
+import mimetypes
+import os
+import re
+from flask import Blueprint, abort, current_app, request, safe_join, \
+    send_file, url_for
+from ..extensions import images
+
+media = Blueprint('media', __name__)  # pylint: disable=invalid-name
+
+# Blobs and their thumbnails, eg. 3f/3f7a...e1.jpg.128.webp
+IMMUTABLE = re.compile(
+    r'^([0-9a-f]{2})/\1[0-9a-f]{62}\.[a-z0-9]+(\.\d+\.[a-z]+)?$')
+
+# MEDIA_OFFLOAD -> header of the web server
+OFFLOAD_HEADERS = {'x-accel-redirect': 'X-Accel-Redirect',
+                   'x-sendfile': 'X-Sendfile'}
+
+
+@media.record
+def check_config(state):
+    """Raise ValueError for an unknown MEDIA_OFFLOAD"""
+    offload = state.app.config.get('MEDIA_OFFLOAD')
+    if offload and offload not in OFFLOAD_HEADERS:
+        raise ValueError('MEDIA_OFFLOAD must be one of {}, not {!r}'.format(
+            ', '.join(sorted(OFFLOAD_HEADERS)), offload))
+
+
+def media_url(filename):
+    """Returns the URL of the uploaded file filename"""
+    return url_for('media.image', filename=filename)
+
+
+def send_media(filename, mimetype=None, private=False):
+    """Returns the response with the uploaded file filename, relative to the
+    destination of images.
+
+    A private response is for a URL that is not the URL of the file, eg.
+    /api/v1/profile_pic, which clients must revalidate.
+    """
+    path = safe_join(images.config.destination, filename)
+    if not os.path.isfile(path):
+        abort(404)
+    stat = os.stat(path)
+    mimetype = mimetype or mimetypes.guess_type(filename)[0] or \
+        'application/octet-stream'
+
+    config = current_app.config
+    offload = config['MEDIA_OFFLOAD']
+    if offload:
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers[OFFLOAD_HEADERS[offload]] = \
+            config['MEDIA_ACCEL_PREFIX'] + filename \
+            if offload == 'x-accel-redirect' else path
+        response.content_length = stat.st_size
+        response.last_modified = stat.st_mtime
+    else:
+        response = send_file(path, mimetype=mimetype, add_etags=False)
+        response.headers.pop('Expires', None)
+
+    immutable = IMMUTABLE.match(filename) is not None
+    if immutable:
+        response.set_etag(os.path.basename(filename))
+    else:
+        response.set_etag('{:x}-{:x}'.format(int(stat.st_mtime * 1000),
+                                             stat.st_size))
+
+    if private:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    elif immutable:
+        response.headers['Cache-Control'] = \
+            'public, max-age={}, immutable'.format(config['MEDIA_MAX_AGE'])
+    else:
+        response.headers['Cache-Control'] = 'public, max-age={}'.format(
+            config['MEDIA_LEGACY_MAX_AGE'])
+
+    # The web server answers the ranges of offloaded files
+    response = response.make_conditional(
+        request, accept_ranges=not offload, complete_length=stat.st_size)
+    if offload and response.status_code == 304:
+        del response.headers[OFFLOAD_HEADERS[offload]]
+    return response
+
+
+@media.route('/media/<path:filename>')
+def image(filename):
+    """Return an uploaded image, or its thumbnail"""
+    return send_media(filename)
@@ -1,3 +1,4 @@
 """package for blueprint: catalog"""
 from .models import Category, Item
+from .cache import category_cache, CachedCategory
 from .views import catalog
@@ -0,0 +1,301 @@
+"""Bulk import of items from NDJSON or CSV, for the import endpoint of the REST
+api and the `flask import` command
+
+Every row is an item with these fields, other fields are ignored, so the output
+of the export can be imported again:
+- name:        required, unique. An item with the same name is updated.
+- description: optional
+- category:    name of an existing category, or
+  category_id: id of an existing category
+
+The rows are processed in batches of batch_size rows. Every batch is validated
+and written in its own transaction, with a few set-based statements instead of
+a flush per item:
+- one query that resolves the category names and ids of the batch
+- one query that finds the items that already exist, by name
+- one executemany INSERT of the new items, and one executemany UPDATE of the
+  changed items. Items that did not change are left alone.
+- one executemany INSERT into the change log
+
+The import upserts on the unique name in the application, the same way on
+every database. Another transaction that inserts the same name in the meantime
+makes the batch fail with an IntegrityError, and the batch is tried once more.
+The UPDATE only matches the version of an item that was read, like the ORM, so
+an item that another transaction changed in the meantime makes the batch fail
+with a StaleDataError, and it is tried once more too.
+
+Invalid rows are skipped and reported with their line number, and do not stop
+the import. Items of other users are not updated.
+"""
+import csv
+import json
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import and_, bindparam, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from ..extensions import db
+from ..changes import Change
+from .models import Category, Item
+
+# Import format -> mimetype
+IMPORT_FORMATS = {'ndjson': 'application/x-ndjson',
+                  'csv': 'text/csv'}
+
+# Number of rows validated and written in one transaction
+BATCH_SIZE = 1000
+
+# Only this many errors are reported, but all are counted
+MAX_REPORTED_ERRORS = 1000
+
+# Lengths of the String columns of Item
+NAME_LENGTH = Item.__table__.c.name.type.length
+DESCRIPTION_LENGTH = Item.__table__.c.description.type.length
+
+# An invalid row, at line number line of the input
+RowError = namedtuple('RowError', ['line', 'message'])
+
+# A valid row
+ImportRow = namedtuple('ImportRow', ['line', 'name', 'description',
+                                     'category', 'category_id'])
+
+
+class ImportResult(object):
+    """Counts of the imported items, and the first errors"""
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        """Count an invalid row, and report it if there are not too many"""
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(line, message))
+
+    def to_json(self):
+        """Serialize the result to json format"""
+        return {'inserted': self.inserted,
+                'updated': self.updated,
+                'unchanged': self.unchanged,
+                'failed': self.failed,
+                'errors': [{'line': error.line, 'message': error.message}
+                           for error in self.errors]}
+
+
+def parse_ndjson(lines):
+    """Yield (line number, dict) for the JSON objects of the lines, and
+    (line number, error message) for invalid lines. Empty lines are skipped.
+    """
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield number, 'Invalid JSON: {}'.format(error)
+            continue
+        if not isinstance(record, dict):
+            yield number, 'Must be a JSON object'
+            continue
+        yield number, record
+
+
+def parse_csv(lines):
+    """Yield (line number, dict) for the rows of CSV lines with a header"""
+    reader = csv.DictReader(lines)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def validate(line, record):
+    """Returns the ImportRow of a record, or an error message"""
+    name = record.get('name')
+    if not isinstance(name, str) or not name.strip():
+        return 'Must include name field'
+    name = name.strip()
+    if len(name) > NAME_LENGTH:
+        return 'name is longer than {} characters'.format(NAME_LENGTH)
+
+    description = record.get('description') or None
+    if description is not None:
+        if not isinstance(description, str):
+            return 'description must be a string'
+        if len(description) > DESCRIPTION_LENGTH:
+            return 'description is longer than {} characters'.format(
+                DESCRIPTION_LENGTH)
+
+    category = record.get('category') or None
+    category_id = record.get('category_id') or None
+    if category is None and category_id is None:
+        return 'Must include category or category_id field'
+    if category is not None and not isinstance(category, str):
+        return 'category must be the name of a category'
+    if category_id is not None:
+        try:
+            category_id = int(category_id)
+        except (TypeError, ValueError):
+            return 'category_id must be an integer'
+
+    return ImportRow(line, name, description, category, category_id)
+
+
+def resolve_categories(rows):
+    """Returns {name: id} and the set of ids of the categories of rows, with
+    one query
+    """
+    names = {row.category for row in rows if row.category is not None}
+    ids = {row.category_id for row in rows if row.category_id is not None}
+    if not names and not ids:
+        return {}, set()
+
+    found = db.session.query(Category.id, Category.name).filter(or_(
+        Category.name.in_(names), Category.id.in_(ids))).all()
+    return ({name: id_ for id_, name in found},
+            {id_ for id_, unused_name in found})
+
+
+def update_items(table, updates):
+    """Update the items with the executemany parameters updates, if they are
+    still at version b_version. Raises StaleDataError if another transaction
+    changed one of them.
+    """
+    statement = table.update().where(and_(
+        table.c.id == bindparam('b_id'),
+        table.c.version == bindparam('b_version'))).values(
+            version=bindparam('b_version') + 1)
+    if db.engine.dialect.supports_sane_multi_rowcount:
+        matched = db.session.execute(statement, updates).rowcount
+    else:
+        matched = sum(db.session.execute(statement, values).rowcount
+                      for values in updates)
+    if matched != len(updates):
+        raise StaleDataError('{} of {} items were changed by another '
+                             'transaction'.format(len(updates) - matched,
+                                                  len(updates)))
+
+
+def write_batch(rows, user_id, result):
+    """Insert or update the items of a batch of valid ImportRows, and log the
+    changes. Does not commit.
+    """
+    # pylint: disable=too-many-locals
+    category_by_name, category_ids = resolve_categories(rows)
+
+    # The last row with a name wins
+    items = {}
+    for row in rows:
+        if row.category is not None:
+            category_id = category_by_name.get(row.category)
+            if category_id is None:
+                result.add_error(row.line, 'Category: {} not found'.format(
+                    row.category))
+                continue
+        else:
+            category_id = row.category_id
+            if category_id not in category_ids:
+                result.add_error(row.line, 'Category: {} not found'.format(
+                    category_id))
+                continue
+        items[row.name] = (row, category_id)
+    if not items:
+        return
+
+    table = Item.__table__
+    existing = {found.name: found for found in db.session.execute(
+        db.select([table.c.id, table.c.name, table.c.description,
+                   table.c.category_id, table.c.user_id,
+                   table.c.version]).where(table.c.name.in_(list(items))))}
+
+    inserts, updates = [], []
+    for name, (row, category_id) in items.items():
+        found = existing.get(name)
+        if found is None:
+            inserts.append({'name': name, 'description': row.description,
+                            'category_id': category_id, 'user_id': user_id})
+        elif found.user_id != user_id:
+            result.add_error(row.line, 'Item: {} is owned by another '
+                             'user'.format(name))
+        elif found.description == row.description and \
+                found.category_id == category_id:
+            result.unchanged += 1
+        else:
+            updates.append({'b_id': found.id, 'b_version': found.version,
+                            'description': row.description,
+                            'category_id': category_id})
+
+    now = datetime.utcnow()
+    changes = []
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+        inserted = db.session.execute(db.select([table.c.id]).where(
+            table.c.name.in_([values['name'] for values in inserts])))
+        changes.extend({'timestamp': now, 'resource_type': 'item',
+                        'resource_id': id_, 'operation': Change.INSERT,
+                        'version': 1} for id_, in inserted)
+    if updates:
+        update_items(table, updates)
+        changes.extend({'timestamp': now, 'resource_type': 'item',
+                        'resource_id': values['b_id'],
+                        'operation': Change.UPDATE,
+                        'version': values['b_version'] + 1}
+                       for values in updates)
+    if changes:
+        db.session.execute(Change.__table__.insert(), changes)
+
+    result.inserted += len(inserts)
+    result.updated += len(updates)
+
+
+def import_batch(rows, user_id, result):
+    """Write a batch of valid ImportRows in its own transaction, trying once
+    more if a concurrent transaction inserted one of the names, or changed
+    one of the items
+    """
+    for attempt in (1, 2):
+        batch_result = ImportResult()
+        try:
+            write_batch(rows, user_id, batch_result)
+            db.session.commit()
+            break
+        except (IntegrityError, StaleDataError):
+            db.session.rollback()
+            if attempt == 2:
+                raise
+
+    result.inserted += batch_result.inserted
+    result.updated += batch_result.updated
+    result.unchanged += batch_result.unchanged
+    result.failed += batch_result.failed
+    result.errors.extend(
+        batch_result.errors[:MAX_REPORTED_ERRORS - len(result.errors)])
+
+
+def import_items(lines, import_format, user_id, batch_size=BATCH_SIZE):
+    """Import the items in the text lines, in import_format, one of
+    IMPORT_FORMATS, for the user with user_id.
+
+    Returns an ImportResult.
+    """
+    parse = parse_ndjson if import_format == 'ndjson' else parse_csv
+    result = ImportResult()
+
+    batch = []
+    for line, record in parse(lines):
+        row = record if isinstance(record, str) else validate(line, record)
+        if isinstance(row, str):
+            result.add_error(line, row)
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            import_batch(batch, user_id, result)
+            batch = []
+    if batch:
+        import_batch(batch, user_id, result)
+
+    result.errors.sort()
+    return result
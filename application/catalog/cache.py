@@ -0,0 +1,152 @@
+"""Process-local cache of the categories shown in the catalog sidebar
+
+Categories change rarely, but the list of categories is rendered on every
+catalog page. The cache keeps an ordered list of light-weight, read-only
+CachedCategory tuples in memory, so the sidebar does not cost a query.
+
+Invalidation:
+- SQLAlchemy after_insert, after_update and after_delete events on Category
+  clear the cache of the process that made the change. The cache is cleared
+  again after the transaction is committed, so that a concurrent request of the
+  same process can not re-populate it with data from before the commit.
+  Bulk deletes, which skip these events, call invalidate_after_commit. The
+  after_delete event on User does too, as the database deletes the categories
+  of a deleted user (ON DELETE CASCADE).
+
+- Optionally, set CATEGORY_CACHE_VERSION_FILE to a file path that is shared by
+  all worker processes (eg. gunicorn workers). After a commit that changed a
+  category, a new version token is written to that file. Every process compares
+  the token in the file with the token of its cached list, and reloads the list
+  when they differ.
+"""
+import os
+import threading
+import uuid
+from collections import namedtuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from ..extensions import db
+from ..metrics import observe_cache
+from ..user.models import User
+from .models import Category
+
+# Read-only copy of the Category columns needed to render the sidebar
+CachedCategory = namedtuple('CachedCategory', ['id', 'name', 'user_id'])
+
+
+class CategoryCache(object):
+    """Ordered list of all categories, cached in the memory of the process"""
+
+    def __init__(self):
+        self.version_file = None
+        self._lock = threading.Lock()
+        self._categories = None
+        self._version = None
+        self._generation = 0
+
+    def init_app(self, app):
+        """Read configuration of app and start with an empty cache"""
+        self.version_file = app.config.get('CATEGORY_CACHE_VERSION_FILE')
+        self.clear()
+
+    def get(self):
+        """Return the ordered list of CachedCategory, loading it if needed"""
+        version = self._read_version()
+
+        categories = self._categories
+        if categories is not None and version == self._version:
+            observe_cache('categories', hit=True)
+            return categories
+
+        observe_cache('categories', hit=False)
+
+        generation = self._generation
+        rows = db.session.query(
+            Category.id, Category.name, Category.user_id).order_by(
+                Category.id).all()
+        categories = [CachedCategory(*row) for row in rows]
+
+        with self._lock:
+            # Do not store the list if it was invalidated while loading
+            if generation == self._generation:
+                self._categories = categories
+                self._version = version
+
+        return categories
+
+    def find(self, category_id):
+        """Return the CachedCategory with category_id, or None"""
+        return next(
+            (cat for cat in self.get() if cat.id == category_id), None)
+
+    def clear(self):
+        """Clear the cache of this process only"""
+        with self._lock:
+            self._generation += 1
+            self._categories = None
+
+    def invalidate(self):
+        """Clear the cache of this process and notify the other processes"""
+        self.clear()
+        if self.version_file:
+            self._write_version(uuid.uuid4().hex)
+
+    def _read_version(self):
+        """Return the version token shared by all processes"""
+        if not self.version_file:
+            return None
+        try:
+            with open(self.version_file) as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_version(self, version):
+        """Atomically replace the version token shared by all processes"""
+        tmp_file = '{}.{}.tmp'.format(self.version_file, os.getpid())
+        with open(tmp_file, 'w') as file:
+            file.write(version)
+        os.replace(tmp_file, self.version_file)
+
+
+# Flask coding convention is to use lowercase for extension-like objects.
+category_cache = CategoryCache()  # pylint: disable=invalid-name
+
+
+def invalidate_after_commit(session):
+    """Invalidate the cache in all processes once the transaction of session
+    is committed, eg. after a bulk delete of categories
+    """
+    session.info['category_cache_dirty'] = True
+
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_update')
+@event.listens_for(Category, 'after_delete')
+def on_category_change(unused_mapper, unused_connection, target):
+    """Clear the cache when a category is flushed to the database"""
+    category_cache.clear()
+
+    session = object_session(target)
+    if session is not None:
+        invalidate_after_commit(session)
+
+
+@event.listens_for(User, 'after_delete')
+def on_user_delete(unused_mapper, unused_connection, target):
+    """Clear the cache when a user is deleted, with their categories"""
+    on_category_change(unused_mapper, unused_connection, target)
+
+
+@event.listens_for(Session, 'after_commit')
+def on_commit(session):
+    """Invalidate the cache in all processes after a category change"""
+    if session.info.pop('category_cache_dirty', False):
+        category_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def on_rollback(session):
+    """Forget about changes that were rolled back"""
+    if session.info.pop('category_cache_dirty', False):
+        category_cache.clear()
@@ -0,0 +1,100 @@
+"""Stream the items of the catalog as NDJSON or CSV, for the export endpoint of
+the REST api and the `flask export` command
+
+The rows are read with yield_per, which uses a server-side cursor where the
+database driver supports it (eg. psycopg2), and are written out batch by
+batch. Only one batch of rows is in memory at any time, whatever the size of
+the catalog.
+
+    NDJSON: one JSON object per line
+    CSV:    a header line with the column names, then one line per item
+
+Items are exported in the order of their id.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from ..extensions import db
+from .models import Item
+
+# Columns of an exported item, in order
+EXPORT_COLUMNS = ('id', 'name', 'description', 'category_id', 'user_id',
+                  'timestamp', 'updated_at', 'version')
+
+# Export format -> mimetype
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson',
+                  'csv': 'text/csv'}
+
+# Number of rows fetched from the cursor and written out at once
+BATCH_SIZE = 1000
+
+
+def export_query(user_id=None, category_id=None, batch_size=BATCH_SIZE):
+    """Returns the query of the exported columns of the items, optionally of
+    one user and/or one category only
+    """
+    query_ = db.session.query(
+        *[getattr(Item, column) for column in EXPORT_COLUMNS])
+    if user_id is not None:
+        query_ = query_.filter(Item.user_id == user_id)
+    if category_id is not None:
+        query_ = query_.filter(Item.category_id == category_id)
+    return query_.order_by(Item.id).yield_per(batch_size)
+
+
+def export_value(value):
+    """Returns a column value as it is exported"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def batches(rows, batch_size):
+    """Yield lists of up to batch_size rows"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ndjson_chunks(rows, batch_size=BATCH_SIZE):
+    """Yield the rows as NDJSON text, one chunk per batch of rows"""
+    for batch in batches(rows, batch_size):
+        yield ''.join(
+            json.dumps(dict(zip(EXPORT_COLUMNS,
+                                [export_value(value) for value in row])),
+                       ensure_ascii=False) + '\n'
+            for row in batch)
+
+
+def csv_chunks(rows, batch_size=BATCH_SIZE):
+    """Yield the rows as CSV text, one chunk per batch of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches(rows, batch_size):
+        writer.writerows([export_value(value) for value in row]
+                         for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Only the header, when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_items(export_format, user_id=None, category_id=None,
+                 batch_size=BATCH_SIZE):
+    """Yield chunks of text with the items in export_format, one of
+    EXPORT_FORMATS
+    """
+    rows = export_query(user_id, category_id, batch_size)
+    chunks = ndjson_chunks if export_format == 'ndjson' else csv_chunks
+    return chunks(rows, batch_size)
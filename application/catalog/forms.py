@@ -1,7 +1,8 @@
 """Define the forms of the catalog blueprint. (front-end)"""
 from flask_wtf import FlaskForm
-from wtforms import StringField, SubmitField, TextAreaField
-from wtforms.validators import DataRequired
+from wtforms import IntegerField, StringField, SubmitField, TextAreaField
+from wtforms.validators import DataRequired, InputRequired
+from wtforms.widgets import HiddenInput
 
 
 class AddCategoryForm(FlaskForm):
@@ -27,4 +28,6 @@ class EditItemForm(FlaskForm):
     """Form to edit an item"""
     name = StringField('Name', [DataRequired()])
     description = TextAreaField('Description', [DataRequired()])
+    # The version of the item that was edited, see Item.version
+    version = IntegerField(widget=HiddenInput(), validators=[InputRequired()])
     submit = SubmitField('Update')
@@ -12,10 +12,21 @@ class Category(db.Model):  # pylint: disable=too-few-public-methods
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     name = db.Column(db.String(96), unique=True)
+    updated_at = db.Column(db.DateTime, index=True, default=datetime.utcnow,
+                           onupdate=datetime.utcnow)
+    # Incremented by every UPDATE of the ORM, which fails with StaleDataError
+    # when another transaction changed the row since it was loaded
+    version = db.Column(db.Integer, nullable=False, server_default='1')
 
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer,
+                        db.ForeignKey('users.id', ondelete='CASCADE'),
+                        index=True)
 
-    user = db.relationship('User', backref=db.backref('categories'))
+    # passive_deletes: the database deletes the categories of a deleted user
+    user = db.relationship('User', backref=db.backref('categories',
+                                                      passive_deletes=True))
+
+    __mapper_args__ = {'version_id_col': version}
 
     def to_json(self):
         """Serialize category object to json format"""
@@ -27,16 +38,38 @@ class Item(db.Model):
     """ORM for Item"""
     __tablename__ = 'items'
 
+    # Indexes for the foreign keys, which also serve the listings of the items
+    # of a category or of a user, ordered by (timestamp, id)
+    __table_args__ = (
+        db.Index('ix_items_category_id_timestamp_id',
+                 'category_id', 'timestamp', 'id'),
+        db.Index('ix_items_user_id_timestamp_id',
+                 'user_id', 'timestamp', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     name = db.Column(db.String(96), unique=True)
     description = db.Column(db.String(1024))
+    updated_at = db.Column(db.DateTime, index=True, default=datetime.utcnow,
+                           onupdate=datetime.utcnow)
+    # Incremented by every UPDATE of the ORM, which fails with StaleDataError
+    # when another transaction changed the row since it was loaded
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    user_id = db.Column(db.Integer,
+                        db.ForeignKey('users.id', ondelete='CASCADE'))
+    category_id = db.Column(db.Integer,
+                            db.ForeignKey('categories.id', ondelete='CASCADE'))
 
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
+    # passive_deletes: the database deletes the items of a deleted user or
+    # category
+    user = db.relationship('User', backref=db.backref('items',
+                                                      passive_deletes=True))
+    category = db.relationship('Category', backref=db.backref(
+        'items', passive_deletes=True))
 
-    user = db.relationship('User', backref=db.backref('items'))
-    category = db.relationship('Category', backref=db.backref('items'))
+    __mapper_args__ = {'version_id_col': version}
 
     @staticmethod
     def insert_default_items():
@@ -0,0 +1,113 @@
+"""Assemble the content of the catalog pages (front-end)
+
+Every catalog page shows the same three things: the list of categories in the
+sidebar, the items of the selected category and, optionally, the details of a
+selected item. Loading them one by one costs a database round-trip per object,
+plus a lazy load for every relationship that is touched while rendering.
+
+The functions in this module fetch everything a page needs with a fixed number
+of queries, independent of how many categories or items are in the catalog:
+    1. all categories, ordered, served from the category_cache. This only
+       queries the database when the cache was invalidated.
+    2. all items of the active category, plus the active item, with their
+       owner eager-loaded
+
+Before that, category_items_version returns a version token of the page, so
+an unchanged page can be answered with 304 Not Modified after one small query.
+
+The search page loads all items of a page of search hits with one query.
+"""
+from collections import namedtuple
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+from ..conditional import collection_version
+from .models import Item
+from .cache import category_cache
+
+# Container with all the data that is passed to the catalog/items.html template
+CatalogPage = namedtuple('CatalogPage', ['categories',
+                                         'category_active',
+                                         'items',
+                                         'item_active'])
+
+# One result on the catalog/search.html page. category is a CachedCategory,
+# item is None for a matching category.
+SearchResult = namedtuple('SearchResult', ['category', 'item'])
+
+
+def load_categories():
+    """Return all categories, ordered as they are shown in the sidebar"""
+    return category_cache.get()
+
+
+def category_items_version(category_id):
+    """Return a version token of the data on the items page of the category
+    with category_id. Returns None if the category does not exist.
+    """
+    all_categories = load_categories()
+    if not any(cat.id == category_id for cat in all_categories):
+        return None
+
+    return (tuple(all_categories),
+            collection_version(Item.query.filter(
+                Item.category_id == category_id), Item))
+
+
+def load_catalog_page(category_id, item_id=None):
+    """Return a CatalogPage for the category with category_id, and the item
+    with item_id if provided.
+
+    Returns None if the category or the requested item does not exist.
+    """
+    all_categories = load_categories()
+
+    category_active = next(
+        (cat for cat in all_categories if cat.id == category_id), None)
+    if category_active is None:
+        return None
+
+    # Fetch the items of the category and the selected item in one go. The
+    # selected item is looked up by id only, so it is found even when it was
+    # moved to another category.
+    criterion = Item.category_id == category_id
+    if item_id:
+        criterion = or_(criterion, Item.id == item_id)
+
+    rows = Item.query.options(
+        joinedload(Item.user)).filter(criterion).order_by(Item.id).all()
+
+    items = [itm for itm in rows if itm.category_id == category_id]
+
+    item_active = None
+    if item_id:
+        item_active = next((itm for itm in rows if itm.id == item_id), None)
+        if item_active is None:
+            return None
+
+    return CatalogPage(categories=all_categories,
+                       category_active=category_active,
+                       items=items,
+                       item_active=item_active)
+
+
+def load_search_results(hits):
+    """Return the SearchResults of a list of SearchHits, in the same order.
+    Hits of rows that were deleted after the search are left out.
+    """
+    categories = {cat.id: cat for cat in load_categories()}
+
+    item_ids = [hit.id for hit in hits if hit.resource_type == 'item']
+    items = {}
+    if item_ids:
+        items = {itm.id: itm for itm in Item.query.filter(
+            Item.id.in_(item_ids))}
+
+    results = []
+    for hit in hits:
+        if hit.resource_type == 'item':
+            itm = items.get(hit.id)
+            if itm is not None and itm.category_id in categories:
+                results.append(SearchResult(categories[itm.category_id], itm))
+        elif hit.id in categories:
+            results.append(SearchResult(categories[hit.id], None))
+    return results
@@ -2,24 +2,41 @@
 HTTP requests into those routes. (front-end)
 """
 from flask import Blueprint, render_template, flash, \
-    url_for, redirect, abort
+    url_for, redirect, abort, make_response, session, request, current_app, \
+    jsonify
 from flask_login import login_required, current_user
+from sqlalchemy.orm.exc import StaleDataError
 
 from .forms import AddCategoryForm, EditCategoryForm, \
      AddItemForm, EditItemForm
 from ..extensions import db
 from ..catalog import Category, Item
+from ..changes import log_bulk_delete
+from .pages import load_catalog_page, load_categories, \
+     category_items_version, load_search_results
+from ..conditional import make_etag, is_not_modified, set_validators, \
+     not_modified_response
+from ..search import search, encode_hit_cursor, decode_hit_cursor, \
+     autocomplete_index
 
 
 catalog = Blueprint('catalog',  # pylint: disable=invalid-name
                     __name__, url_prefix='/catalog')
 
 
+def current_user_version():
+    """Return the fields of the current user that are shown on every page"""
+    if not current_user.is_authenticated:
+        return None
+    return (current_user.id, current_user.first_name, current_user.last_name,
+            current_user.confirmed, current_user.blocked)
+
+
 @catalog.route('/categories/',
                methods=['GET'])
 def categories():
     """Handle HTTP requests for categories"""
-    all_categories = Category.query.all()
+    all_categories = load_categories()
     if all_categories:
         # redirect it to the first existing category_id
         return redirect(url_for('catalog.category_items',
@@ -38,42 +55,96 @@ def categories():
 @catalog.route('/categories/<int:category_id>/items',
                methods=['GET'])
 def category_items(category_id):
-    """Handle HTTP requests for all items in a category"""
-    category_active = Category.query.filter_by(id=category_id).first()
-    if category_active is None:
+    """Handle HTTP requests for all items in a category.
+    Answers 304 Not Modified if the client has the current version.
+    """
+    version = category_items_version(category_id)
+    if version is None:
         abort(404)
 
-    all_categories = Category.query.all()
-    items = Item.query.filter_by(category_id=category_id).all()
-    return render_template('catalog/items.html',
-                           categories=all_categories,
-                           category_id=category_id,
-                           category_active=category_active,
-                           items=items,
-                           item_id=0,
-                           item_active=None)
+    etag = make_etag(version, current_user_version())
+    if '_flashes' not in session and is_not_modified(etag):
+        return not_modified_response(etag)
+
+    page = load_catalog_page(category_id)
+    if page is None:
+        abort(404)
+
+    response = make_response(render_template(
+        'catalog/items.html',
+        categories=page.categories,
+        category_id=category_id,
+        category_active=page.category_active,
+        items=page.items,
+        item_id=0,
+        item_active=None))
+    return set_validators(response, etag)
 
 
 @catalog.route('/categories/<int:category_id>/items/<int:item_id>/',
                methods=['GET'])
 def category_item(category_id, item_id):
     """Handle HTTP requests for a specific item in a category"""
-    category_active = Category.query.filter_by(id=category_id).first()
-    item_active = Item.query.filter_by(id=item_id).first()
-
-    if category_active is None or item_active is None:
+    page = load_catalog_page(category_id, item_id)
+    if page is None:
         abort(404)
 
-    all_categories = Category.query.all()
-    items = Item.query.filter_by(category_id=category_id).all()
-
     return render_template('catalog/items.html',
-                           categories=all_categories,
+                           categories=page.categories,
                            category_id=category_id,
-                           category_active=category_active,
-                           items=items,
+                           category_active=page.category_active,
+                           items=page.items,
                            item_id=item_id,
-                           item_active=item_active)
+                           item_active=page.item_active)
+
+
+@catalog.route('/search',
+               methods=['GET'])
+def search_catalog():
+    """Handle HTTP requests to search the items and categories"""
+    query = request.args.get('q', '').strip()
+    try:
+        after = decode_hit_cursor(request.args.get('cursor'))
+    except ValueError:
+        abort(400)
+
+    page_size = current_app.config['SEARCH_PAGE_SIZE']
+    hits = search(query, after=after, limit=page_size + 1) if query else []
+
+    next_cursor = None
+    if len(hits) > page_size:
+        hits = hits[:page_size]
+        next_cursor = encode_hit_cursor(hits[-1])
+
+    return render_template('catalog/search.html',
+                           categories=load_categories(),
+                           query=query,
+                           results=load_search_results(hits),
+                           next_cursor=next_cursor)
+
+
+@catalog.route('/autocomplete',
+               methods=['GET'])
+def autocomplete():
+    """Handle HTTP requests for the names that start with term, as a JSON list
+    of {label, value, url} for the jQuery UI autocomplete of the search box
+    """
+    limit = current_app.config['AUTOCOMPLETE_LIMIT']
+    suggestions = autocomplete_index.complete(request.args.get('term', ''),
+                                              limit)
+
+    result = []
+    for suggestion in suggestions:
+        if suggestion.resource_type == 'category':
+            url = url_for('catalog.category_items',
+                          category_id=suggestion.category_id)
+        else:
+            url = url_for('catalog.category_item',
+                          category_id=suggestion.category_id,
+                          item_id=suggestion.id)
+        result.append({'label': suggestion.name, 'value': suggestion.name,
+                       'url': url})
+    return jsonify(result)
 
 
 @catalog.route('/categories/add',
@@ -161,9 +232,12 @@ def delete_category(category_id):
     # first delete all items that belong to this category
     # since user owns this category, we allow deletion all items, even
     # those that were added by other users.
-    items = Item.query.filter_by(category_id=category_id).all()
-    for item in items:
-        db.session.delete(item)
+    # This is a single set-based DELETE, so the items are never loaded. It
+    # skips the events of the change log, so the tombstones are written first
+    in_category = Item.category_id == category_id
+    db.session.expire(category_active, ['items'])
+    log_bulk_delete(db.session, Item, in_category)
+    Item.query.filter(in_category).delete(synchronize_session=False)
 
     # now delete the category
     cat_name = category_active.name  # save name for flash message
@@ -232,24 +306,17 @@ def edit_category_item(category_id, item_id):
     form = EditItemForm(obj=item_active)
 
     if form.validate_on_submit():
-        # update description
-        item_active.description = form.description.data
-        db.session.commit()
-        flash('Successfully updated Item description',
-              'success')
-
-        # check if name of item was modified, and if so, if new name is unique
-        if form.name.data != item_active.name:
-            if Item.query.filter_by(name=form.name.data).first():
-                flash("Cannot rename Item to '<b>{}</b>', because that name "
-                      "already exists".format(form.name.data),
-                      'danger')
-            else:
-                item_active.name = form.name.data
-                db.session.commit()
-
-                flash('Successfully updated Item name',
-                      'success')
+        # Do not overwrite the changes of someone else, who edited the item
+        # after this form was loaded. Show the form again, with their changes.
+        if form.version.data != item_active.version:
+            return edit_conflict(category_id, item_id)
+
+        try:
+            update_item(item_active, form)
+        except StaleDataError:
+            # changed by another request, between our SELECT and UPDATE
+            db.session.rollback()
+            return edit_conflict(category_id, item_id)
 
         return redirect(url_for('catalog.category_item',
                                 category_id=category_id,
@@ -260,6 +327,40 @@ def edit_category_item(category_id, item_id):
                            item_active=item_active)
 
 
+def update_item(item_active, form):
+    """Store the description and name of the EditItemForm in the item"""
+    # update description
+    item_active.description = form.description.data
+    db.session.commit()
+    flash('Successfully updated Item description',
+          'success')
+
+    # check if name of item was modified, and if so, if new name is unique
+    if form.name.data != item_active.name:
+        if Item.query.filter_by(name=form.name.data).first():
+            flash("Cannot rename Item to '<b>{}</b>', because that name "
+                  "already exists".format(form.name.data),
+                  'danger')
+        else:
+            item_active.name = form.name.data
+            db.session.commit()
+
+            flash('Successfully updated Item name',
+                  'success')
+
+
+def edit_conflict(category_id, item_id):
+    """Redirect back to the edit form of an item that was changed by someone
+    else while it was being edited
+    """
+    flash('The Item was changed by someone else while you were editing it. '
+          'Please review their changes, and edit it again.',
+          'danger')
+    return redirect(url_for('catalog.edit_category_item',
+                            category_id=category_id,
+                            item_id=item_id))
+
+
 @catalog.route('/categories/<int:category_id>/items/<int:item_id>/delete',
                methods=['GET', 'POST'])
 @login_required
@@ -0,0 +1,3 @@
+"""package changes: the change log of categories, items and users"""
+from .models import Change
+from .recorder import log_bulk_delete
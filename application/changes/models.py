@@ -0,0 +1,35 @@
+"""Definition of database tables using ORM of changes"""
+from datetime import datetime
+from ..extensions import db
+
+
+class Change(db.Model):
+    """ORM for one insert, update or delete of a category, item or user.
+
+    The change log is append-only. The id orders the changes, and is the
+    cursor of the change feed. A delete is recorded as a tombstone: the row is
+    gone, but its change tells consumers to forget it.
+    """
+    # pylint: disable=too-few-public-methods
+    __tablename__ = 'changes'
+
+    # For the change feed of one resource type
+    __table_args__ = (
+        db.Index('ix_changes_resource_type_id', 'resource_type', 'id'),
+    )
+
+    INSERT = 'insert'
+    UPDATE = 'update'
+    DELETE = 'delete'
+
+    id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    resource_type = db.Column(db.String(16))  # category, item or user
+    resource_id = db.Column(db.Integer)
+    operation = db.Column(db.String(8))
+    version = db.Column(db.Integer, nullable=True)  # None for a delete
+
+    def __repr__(self):
+        """Returns output of print"""
+        return '<Change %r %s %s %r>' % (self.id, self.operation,
+                                         self.resource_type, self.resource_id)
@@ -0,0 +1,112 @@
+"""Record every change of a category, item or user in the change log
+
+Downstream systems, eg. search and analytics, keep a copy of the catalog in
+sync by reading the change log through the change feed of the REST api, so
+they only fetch what changed since their last sync.
+
+The changes are written by SQLAlchemy session events, in the same transaction
+as the change itself, so a change is logged if and only if it is committed:
+- after_flush: one insert, update or delete per flushed Category, Item or User.
+  An update is only logged when a column actually changed.
+- before_flush: deleting a category or a user makes the database delete their
+  items and categories (ON DELETE CASCADE), which the session never sees.
+  Tombstones for those rows are inserted with one INSERT ... SELECT, before
+  the rows are gone.
+
+Set-based deletes (Query.delete) bypass the session events. Call
+log_bulk_delete with the same criterion right before them.
+
+Rows written with SQLAlchemy Core, eg. by `flask seed`, are not logged.
+Consumers start with a full sync, and then follow the change feed.
+"""
+from datetime import datetime
+from sqlalchemy import and_, event, literal, or_
+from sqlalchemy.orm import Session
+from ..extensions import db
+from ..catalog.models import Category, Item
+from ..user.models import User
+from .models import Change
+
+# Resource type in the change log, for each model that is logged
+RESOURCE_TYPES = {Category: 'category', Item: 'item', User: 'user'}
+
+
+def log_bulk_delete(session, model, *criterion):
+    """Insert tombstones for the rows of model that match criterion, which are
+    about to be deleted without the session knowing about them
+    """
+    select_ = db.select([literal(datetime.utcnow()),
+                         literal(RESOURCE_TYPES[model]),
+                         model.id,
+                         literal(Change.DELETE)]).where(and_(*criterion))
+    session.execute(Change.__table__.insert().from_select(
+        ['timestamp', 'resource_type', 'resource_id', 'operation'], select_))
+
+
+@event.listens_for(Session, 'before_flush')
+def log_cascaded_deletes(session, unused_flush_context, unused_instances):
+    """Insert tombstones for the rows that the database deletes together with
+    a deleted category or user
+    """
+    deleted = [obj for obj in session.deleted
+               if isinstance(obj, (Category, User))]
+    if not deleted:
+        return
+
+    # Rows that are deleted explicitly get their tombstone after the flush
+    explicit = {model: [obj.id for obj in session.deleted
+                        if isinstance(obj, model)]
+                for model in (Category, Item)}
+
+    def not_explicit(model):
+        """Criterion that excludes the explicitly deleted rows of model"""
+        if not explicit[model]:
+            return True
+        return ~model.id.in_(explicit[model])
+
+    with session.no_autoflush:
+        for obj in deleted:
+            if isinstance(obj, Category):
+                log_bulk_delete(session, Item, Item.category_id == obj.id,
+                                not_explicit(Item))
+                continue
+
+            owned_categories = db.select([Category.id]).where(
+                Category.user_id == obj.id)
+            log_bulk_delete(session, Item,
+                            or_(Item.user_id == obj.id,
+                                Item.category_id.in_(owned_categories)),
+                            not_explicit(Item))
+            log_bulk_delete(session, Category, Category.user_id == obj.id,
+                            not_explicit(Category))
+
+
+@event.listens_for(Session, 'after_flush')
+def log_flushed_changes(session, unused_flush_context):
+    """Insert a change for every flushed category, item and user"""
+    now = datetime.utcnow()
+    rows = []
+
+    def add(obj, operation):
+        """Add a change of obj, if it is logged"""
+        resource_type = RESOURCE_TYPES.get(type(obj))
+        if resource_type is None:
+            return
+        rows.append({'timestamp': now,
+                     'resource_type': resource_type,
+                     'resource_id': obj.id,
+                     'operation': operation,
+                     'version': (None if operation == Change.DELETE
+                                 else obj.version)})
+
+    # The session still shows its state from before the flush
+    for obj in session.new:
+        add(obj, Change.INSERT)
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            add(obj, Change.UPDATE)
+    for obj in session.deleted:
+        add(obj, Change.DELETE)
+
+    if rows:
+        session.execute(Change.__table__.insert(), rows)
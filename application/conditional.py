@@ -0,0 +1,75 @@
+"""Conditional GET: answer unchanged resources with 304 Not Modified
+
+Polling clients send back the ETag of the last response they received:
+
+    GET /api/v1/categories/
+    If-None-Match: "5d41402abc4b2a76b9719d911017c592"
+
+Instead of running the full query and serializing the whole payload, the view
+first computes a cheap version token of the data it is about to return, eg. the
+count, the newest id and the last modification of the rows in scope. The
+strong ETag is a hash of that token and the URL, including the query string.
+When it matches, the response is an empty 304.
+
+The functions in this module are shared by the catalog pages and the REST api.
+"""
+import hashlib
+from flask import Response, request
+from sqlalchemy import func
+
+
+def collection_version(query_, model):
+    """Returns a version token of the rows selected by query_, that changes
+    when rows are added, removed or updated
+    """
+    row = query_.order_by(None).with_entities(
+        func.count(model.id), func.max(model.id),
+        func.max(model.updated_at)).one()
+    return repr(tuple(row))
+
+
+def row_version(session, model, id_):
+    """Returns the (version, updated_at) of the row of model with id_, or None
+    when there is no such row
+    """
+    return session.query(model.version, model.updated_at).filter(
+        model.id == id_).first()
+
+
+def make_etag(*tokens):
+    """Returns the ETag of a response for the current URL, that contains data
+    with the version tokens
+    """
+    parts = [request.full_path] + [str(token) for token in tokens]
+    return hashlib.md5('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def is_not_modified(etag, last_modified=None):
+    """Returns True if the client already has the response with etag.
+
+    If-Modified-Since is only used when there is no If-None-Match, and when the
+    caller knows when the data was last modified.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= \
+            request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def set_validators(response, etag, last_modified=None):
+    """Add the ETag and Last-Modified headers to response. Clients must
+    revalidate before they use a stored copy.
+    """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified_response(etag, last_modified=None):
+    """Returns an empty 304 Not Modified response"""
+    return set_validators(Response(status=304), etag, last_modified)
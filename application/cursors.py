@@ -0,0 +1,19 @@
+"""Opaque cursors of the keyset paginations, eg. of the REST api and of the
+search: the sort key of the last row of a page, as URL-safe base64 of JSON
+"""
+import base64
+import json
+
+
+def encode_key(key):
+    """Returns the cursor of key, a list of JSON values"""
+    return base64.urlsafe_b64encode(
+        json.dumps(key).encode('utf-8')).decode('ascii')
+
+
+def decode_key(cursor):
+    """Returns the key stored in cursor.
+    Raises ValueError for an invalid cursor.
+    """
+    return json.loads(
+        base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
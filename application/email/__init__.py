@@ -2,3 +2,5 @@
 from .views import email
 from .utils import send_confirmation_email, send_invitation_email, \
      send_password_reset_email
+from .models import OutboxMessage
+from .outbox import enqueue_email, drain_outbox
@@ -0,0 +1,46 @@
+"""Definition of database tables using ORM of email"""
+import json
+from datetime import datetime
+from flask_mail import Message
+from ..extensions import db
+
+
+class OutboxMessage(db.Model):
+    """ORM for an email that waits in the outbox until the mail worker sends
+    it. Sent messages are deleted. Messages that could not be sent after
+    MAIL_OUTBOX_MAX_ATTEMPTS attempts stay in the outbox with failed_at set.
+    """
+    # pylint: disable=too-few-public-methods
+    __tablename__ = 'email_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    subject = db.Column(db.String)
+    sender = db.Column(db.String, nullable=True)  # None: MAIL_DEFAULT_SENDER
+    recipients_json = db.Column('recipients', db.Text)
+    html = db.Column(db.Text)
+
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, index=True,
+                                default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    failed_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def recipients(self):
+        """List of email addresses"""
+        return json.loads(self.recipients_json)
+
+    @recipients.setter
+    def recipients(self, recipients):
+        """Store the list of email addresses"""
+        self.recipients_json = json.dumps(list(recipients))
+
+    def to_message(self):
+        """Returns the flask_mail Message to send"""
+        return Message(self.subject, recipients=self.recipients,
+                       html=self.html, sender=self.sender)
+
+    def __repr__(self):
+        """Returns output of print"""
+        return '<OutboxMessage %r %r>' % (self.id, self.subject)
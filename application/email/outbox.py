@@ -0,0 +1,135 @@
+"""Durable outbox of emails, drained by the `flask mail-worker` command
+
+Request handlers only store the email in the email_outbox table, so they never
+wait for the SMTP server. The mail worker sends the emails that are due, in
+batches of MAIL_OUTBOX_BATCH_SIZE, over one SMTP connection that is reused
+for as long as there are emails to send.
+
+- A sent email is deleted from the outbox when its batch is committed. If the
+  worker dies in between, the email is sent again. (at least once delivery)
+- An email that can not be sent is retried after MAIL_OUTBOX_RETRY_DELAY
+  seconds, doubling the delay after every attempt, up to
+  MAIL_OUTBOX_MAX_RETRY_DELAY. After MAIL_OUTBOX_MAX_ATTEMPTS attempts it is
+  marked as failed, and stays in the outbox for inspection.
+- On PostgreSQL, the rows of a batch are locked with SKIP LOCKED, so several
+  workers can drain the same outbox without sending an email twice.
+"""
+import smtplib
+import socket
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from ..extensions import db, mail
+from .models import OutboxMessage
+
+# Errors after which the SMTP connection can not be used anymore
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError,
+                     socket.timeout)
+
+
+def enqueue_email(subject, recipients, html_body, sender=None):
+    """Store an email in the outbox, and commit it"""
+    message = OutboxMessage(subject=subject, recipients=recipients,
+                            html=html_body, sender=sender)
+    db.session.add(message)
+    db.session.commit()
+    return message
+
+
+def due_messages(batch_size):
+    """Returns the next batch of emails that are due to be sent"""
+    return OutboxMessage.query.filter(
+        OutboxMessage.failed_at.is_(None),
+        OutboxMessage.next_attempt_at <= datetime.utcnow()).order_by(
+            OutboxMessage.next_attempt_at, OutboxMessage.id).limit(
+                batch_size).with_for_update(skip_locked=True).all()
+
+
+def retry_delay(attempts):
+    """Returns the seconds to wait after attempts failed attempts"""
+    config = current_app.config
+    return min(config['MAIL_OUTBOX_RETRY_DELAY'] * 2 ** (attempts - 1),
+               config['MAIL_OUTBOX_MAX_RETRY_DELAY'])
+
+
+def schedule_retry(message, error):
+    """Record a failed attempt to send message"""
+    now = datetime.utcnow()
+    message.attempts += 1
+    message.last_error = '{}: {}'.format(type(error).__name__, error)
+    if message.attempts >= current_app.config['MAIL_OUTBOX_MAX_ATTEMPTS']:
+        message.failed_at = now
+        current_app.logger.error('Giving up on sending %r: %s', message,
+                                 message.last_error)
+    else:
+        message.next_attempt_at = now + timedelta(
+            seconds=retry_delay(message.attempts))
+
+
+def send_batch(connection, messages):
+    """Send messages over an open connection, and commit the result.
+
+    Returns the number of sent messages. When the connection is lost, the rest
+    of the batch is left for the next attempt and the error is raised.
+    """
+    sent = 0
+    for message in messages:
+        try:
+            connection.send(message.to_message())
+        except Exception as error:  # pylint: disable=broad-except
+            schedule_retry(message, error)
+            if isinstance(error, CONNECTION_ERRORS):
+                db.session.commit()
+                raise
+        else:
+            db.session.delete(message)
+            sent += 1
+    db.session.commit()
+    return sent
+
+
+def drain_outbox():
+    """Send all emails that are due, over one SMTP connection.
+    Returns the number of sent emails.
+    """
+    batch_size = current_app.config['MAIL_OUTBOX_BATCH_SIZE']
+    sent = 0
+    try:
+        messages = due_messages(batch_size)
+        if messages:
+            with mail.connect() as connection:
+                while messages:
+                    sent += send_batch(connection, messages)
+                    messages = due_messages(batch_size)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return sent
+
+
+def run_worker(poll_interval, once=False):
+    """Drain the outbox every poll_interval seconds, until interrupted.
+    After an error, eg. the SMTP server is down, wait longer and longer before
+    trying again.
+    """
+    errors = 0
+    while True:
+        try:
+            sent = drain_outbox()
+            errors = 0
+            if sent:
+                current_app.logger.info('Sent %d emails', sent)
+        except Exception:  # pylint: disable=broad-except
+            errors += 1
+            current_app.logger.exception('Failed to drain the email outbox')
+        finally:
+            db.session.remove()
+
+        if once:
+            return
+
+        if errors:
+            time.sleep(retry_delay(errors))
+        else:
+            time.sleep(poll_interval)
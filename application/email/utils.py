@@ -1,9 +1,7 @@
 """Utilities used by the email blueprint"""
-from flask import current_app, url_for, render_template
-from flask_mail import Message
-# from threading import Thread
-from ..extensions import mail
+from flask import url_for, render_template
 from ..user import User
+from .outbox import enqueue_email
 
 
 ##############################################################################
@@ -14,21 +12,11 @@ from ..user import User
 #
 ##############################################################################
 
-def send_async_email(msg):
-    """Sends email from a thread"""
-    with current_app.app_context():
-        mail.send(msg)
-
-
 def send_email(subject, recipients, html_body):
-    """Sends emails to recipients"""
-    msg = Message(subject, recipients=recipients)
-    msg.html = html_body
-
-    mail.send(msg)  # outcomment this to do async
-    # To send async
-    # thr = Thread(target=send_async_email, args=[msg])
-    # thr.start()
+    """Queues an email to recipients in the outbox.
+    It is sent by the mail worker: $ flask mail-worker
+    """
+    enqueue_email(subject, recipients, html_body)
 
 
 def get_confirmation_link(user):
@@ -3,6 +3,9 @@
 Note that all the extensions are initialized in the configure_extensions method
 of app.py
 """
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
@@ -25,6 +28,18 @@ from flask_mail import Mail
 # Add SQLAlchemy
 db = SQLAlchemy()
 
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, unused_connection_record):
+    """SQLite only enforces foreign keys, including ON DELETE CASCADE, when
+    this is switched on for each connection
+    """
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
 # Add Flask-Migrate extension, for migrating databases
 migrate = Migrate()
 
@@ -0,0 +1,183 @@
+"""Per-request timing and SQL instrumentation
+
+For every request, the instrumentation records:
+- the endpoint and the total time
+- the number of SQL statements and the time spent executing them
+- the INSTRUMENTATION_SLOWEST_QUERIES slowest statements
+
+The numbers are added to each response as a Server-Timing header, which the
+network tab of the browser developer tools shows, eg.:
+
+    Server-Timing: db;dur=3.2;desc="4 queries", app;dur=12.9
+
+Each request is also counted in the Prometheus metrics, by endpoint, method and
+status, with its latency. (See application/metrics)
+
+Requests that take longer than SLOW_REQUEST_THRESHOLD_MS are logged as one
+line of JSON, with the slowest statements, but without their parameters:
+
+    Slow request: {"endpoint": "api.item_list", "duration_ms": 812.4, ...}
+
+The overhead is two perf_counter calls per SQL statement and a few per
+request, so it can stay on in production. Set INSTRUMENTATION_ENABLED to
+False to remove it completely.
+"""
+import heapq
+import json
+import time
+from flask import g, request, request_started, request_finished, \
+    got_request_exception, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .extensions import db
+from .metrics import observe_request, instrument_pool
+
+
+class RequestStats(object):
+    """Timing and SQL statistics of one request"""
+    __slots__ = ('start', 'query_count', 'query_time', 'slowest',
+                 'max_slowest')
+
+    def __init__(self, max_slowest):
+        self.start = time.perf_counter()
+        self.query_count = 0
+        self.query_time = 0.0
+        self.slowest = []  # min-heap of (duration, sequence, statement)
+        self.max_slowest = max_slowest
+
+    def add_query(self, statement, duration):
+        """Record the execution of a SQL statement"""
+        self.query_count += 1
+        self.query_time += duration
+        if not self.max_slowest:
+            return
+        entry = (duration, self.query_count, statement)
+        if len(self.slowest) < self.max_slowest:
+            heapq.heappush(self.slowest, entry)
+        elif duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    @property
+    def duration(self):
+        """Seconds since the start of the request"""
+        return time.perf_counter() - self.start
+
+    def slowest_queries(self):
+        """Returns the slowest statements, slowest first"""
+        return [{'duration_ms': round(duration * 1000.0, 2),
+                 'statement': statement}
+                for duration, _, statement in sorted(self.slowest,
+                                                     reverse=True)]
+
+
+def get_request_stats():
+    """Returns the RequestStats of the current request, or None"""
+    if not has_app_context():
+        return None
+    return g.get('request_stats')
+
+
+class Instrumentation(object):
+    """Registers the SQLAlchemy events and Flask signals that record the
+    RequestStats of every request
+    """
+
+    def __init__(self):
+        self.max_slowest = 5
+
+    def init_app(self, app):
+        """Start instrumenting the requests of app"""
+        if not app.config.get('INSTRUMENTATION_ENABLED', True):
+            return
+
+        self.max_slowest = app.config.get('INSTRUMENTATION_SLOWEST_QUERIES',
+                                          5)
+
+        if not event.contains(Engine, 'before_cursor_execute',
+                              before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute',
+                         before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute',
+                         after_cursor_execute)
+            event.listen(Engine, 'handle_error', handle_error)
+
+        request_started.connect(self.on_request_started, app)
+        request_finished.connect(self.on_request_finished, app)
+        got_request_exception.connect(self.on_request_exception, app)
+
+    def on_request_started(self, unused_sender, **unused_kwargs):
+        """Start recording the statistics of a request"""
+        g.request_stats = RequestStats(self.max_slowest)
+        instrument_pool(db.engine.pool)
+
+    @staticmethod
+    def on_request_finished(sender, response, **unused_kwargs):
+        """Add the Server-Timing header, and log a slow request"""
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return
+
+        duration = stats.duration
+        if sender.config.get('SERVER_TIMING_HEADER', True):
+            response.headers['Server-Timing'] = (
+                'db;dur={:.1f};desc="{} queries", app;dur={:.1f}'.format(
+                    stats.query_time * 1000.0, stats.query_count,
+                    duration * 1000.0))
+
+        observe_request(request.endpoint, request.method,
+                        response.status_code, duration)
+        log_if_slow(sender, stats, duration, response.status_code)
+
+    @staticmethod
+    def on_request_exception(sender, **unused_kwargs):
+        """Log a slow request that failed with an exception"""
+        stats = g.pop('request_stats', None)
+        if stats is not None:
+            duration = stats.duration
+            observe_request(request.endpoint, request.method, 500, duration)
+            log_if_slow(sender, stats, duration, 500)
+
+
+def log_if_slow(app, stats, duration, status_code):
+    """Log the statistics of a request that took longer than the threshold"""
+    threshold = app.config.get('SLOW_REQUEST_THRESHOLD_MS', 500)
+    if threshold is None or duration * 1000.0 < threshold:
+        return
+
+    app.logger.warning('Slow request: %s', json.dumps({
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'path': request.path,
+        'status': status_code,
+        'duration_ms': round(duration * 1000.0, 2),
+        'query_count': stats.query_count,
+        'query_ms': round(stats.query_time * 1000.0, 2),
+        'slowest_queries': stats.slowest_queries()}))
+
+
+def before_cursor_execute(conn, unused_cursor, unused_statement,
+                          unused_parameters, unused_context,
+                          unused_executemany):
+    """Remember the start time of a statement"""
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, unused_cursor, statement, unused_parameters,
+                         unused_context, unused_executemany):
+    """Record the duration of a statement executed during a request"""
+    duration = time.perf_counter() - conn.info['query_start'].pop()
+    stats = get_request_stats()
+    if stats is not None:
+        stats.add_query(statement, duration)
+
+
+def handle_error(exception_context):
+    """Forget the start time of a statement that failed"""
+    conn = exception_context.connection
+    if conn is not None and exception_context.cursor is not None and \
+            conn.info.get('query_start'):
+        conn.info['query_start'].pop()
+
+
+# Flask coding convention is to use lowercase for extension-like objects.
+instrumentation = Instrumentation()  # pylint: disable=invalid-name
@@ -0,0 +1,4 @@
+"""package for blueprint: metrics"""
+from .collectors import observe_request, observe_cache, observe_auth, \
+     instrument_pool
+from .views import metrics
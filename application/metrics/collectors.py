@@ -0,0 +1,103 @@
+"""Prometheus metrics of the application
+
+The metrics are updated by the instrumentation of the requests, the caches and
+the authentication of the api, and exposed by the /metrics route.
+
+With several worker processes (eg. gunicorn), set the environment variable
+prometheus_multiproc_dir to an empty directory before the application starts.
+Each process then keeps its metrics in a memory mapped file in that directory,
+and /metrics adds up the files of all processes. See gunicorn_config.py
+"""
+# The metric classes of prometheus_client 0.2.0 are made by a decorator, whose
+# signature and labels pylint can not follow
+# pylint: disable=no-member,no-value-for-parameter
+import time
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from ..extensions import db
+from ..email.models import OutboxMessage
+
+REQUESTS = Counter(
+    'catalog_http_requests_total', 'Number of HTTP requests',
+    ['endpoint', 'method', 'status'])
+
+REQUEST_LATENCY = Histogram(
+    'catalog_http_request_duration_seconds', 'Latency of HTTP requests',
+    ['endpoint', 'method'],
+    buckets=(.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0,
+             10.0))
+
+DB_POOL_WAIT = Histogram(
+    'catalog_db_pool_checkout_wait_seconds',
+    'Time waiting for a database connection from the pool',
+    buckets=(.0001, .0005, .001, .005, .01, .05, .1, .5, 1.0, 5.0))
+
+CACHE_LOOKUPS = Counter(
+    'catalog_cache_lookups_total', 'Lookups in the in-process caches',
+    ['cache', 'result'])
+
+AUTH_ATTEMPTS = Counter(
+    'catalog_auth_attempts_total', 'Authentications of api requests',
+    ['method', 'outcome'])
+
+
+def observe_request(endpoint, method, status, duration):
+    """Count a request, and its latency in seconds"""
+    endpoint = endpoint or 'none'  # eg. 404 for an unknown URL
+    REQUESTS.labels(endpoint, method, status).inc()
+    REQUEST_LATENCY.labels(endpoint, method).observe(duration)
+
+
+def observe_cache(cache, hit):
+    """Count a lookup in cache"""
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def observe_auth(method, success):
+    """Count an authentication of an api request"""
+    AUTH_ATTEMPTS.labels(method, 'success' if success else 'failure').inc()
+
+
+def instrument_pool(pool):
+    """Observe how long each checkout of a connection from pool waits.
+
+    SQLAlchemy has no event before a checkout, so the internal _do_get method
+    of the pool is wrapped. The wait includes opening a new connection.
+    """
+    if getattr(pool, 'catalog_metrics', False):
+        return
+
+    do_get = pool._do_get  # pylint: disable=protected-access
+
+    def timed_do_get():
+        """Get a connection from the pool, and observe the wait"""
+        start = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+    pool._do_get = timed_do_get  # pylint: disable=protected-access
+    pool.catalog_metrics = True
+
+
+class OutboxCollector(object):
+    """Collects the number of emails in the outbox when /metrics is scraped.
+    The outbox is shared by all processes, so it is read from the database.
+    """
+    # pylint: disable=too-few-public-methods
+
+    @staticmethod
+    def collect():
+        """Yields the outbox depth, by state"""
+        gauge = GaugeMetricFamily('catalog_email_outbox_messages',
+                                  'Number of emails in the outbox',
+                                  labels=['state'])
+        pending = OutboxMessage.query.filter(
+            OutboxMessage.failed_at.is_(None)).count()
+        failed = OutboxMessage.query.filter(
+            OutboxMessage.failed_at.isnot(None)).count()
+        db.session.commit()
+        gauge.add_metric(['pending'], pending)
+        gauge.add_metric(['failed'], failed)
+        yield gauge
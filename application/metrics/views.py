@@ -0,0 +1,47 @@
+"""Define the URL route of the metrics blueprint, which exposes the metrics in
+the text format of Prometheus:
+
+    scrape_configs:
+      - job_name: catalog
+        bearer_token: <METRICS_TOKEN>
+        static_configs:
+          - targets: ['localhost:5000']
+"""
+import hmac
+import os
+from flask import Blueprint, Response, abort, current_app, request
+from prometheus_client import CollectorRegistry, REGISTRY, \
+    CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+from .collectors import OutboxCollector
+
+metrics = Blueprint('metrics', __name__)  # pylint: disable=invalid-name
+
+# Metrics that are read from the database, and are the same for all processes
+DATABASE_REGISTRY = CollectorRegistry()
+DATABASE_REGISTRY.register(OutboxCollector())
+
+
+def process_registry():
+    """Returns the registry with the metrics of all worker processes"""
+    if 'prometheus_multiproc_dir' not in os.environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    return registry
+
+
+@metrics.route('/metrics')
+def expose():
+    """Return all metrics. If METRICS_TOKEN is configured, it must be provided
+    as a bearer token.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(
+            request.headers.get('Authorization', ''), 'Bearer ' + token):
+        abort(401)
+
+    data = (generate_latest(process_registry()) +
+            generate_latest(DATABASE_REGISTRY))
+    return Response(data, headers={'Content-Type': CONTENT_TYPE_LATEST})
@@ -0,0 +1,84 @@
+"""Hashing and verification of passwords, off the request thread
+
+Hashing a password is slow on purpose, and blocks the request worker that does
+it. The password_hasher runs werkzeug's generate_password_hash and
+check_password_hash in a small pool of processes instead:
+
+- PASSWORD_HASH_WORKERS:     number of processes of the pool, per worker
+                             process of the application. 0 runs the hashing
+                             on the calling thread.
+- PASSWORD_HASH_MAX_PENDING: callers that find this many hashes already queued
+                             or running wait for a free slot, so a burst of
+                             logins can not queue unbounded work.
+- PASSWORD_HASH_METHOD:      werkzeug method, eg. pbkdf2:sha256:150000
+- PASSWORD_HASH_SALT_LENGTH: length of the salt
+
+Stored hashes that were made with another method or salt length are reported
+by needs_rehash, so they can be upgraded when the user logs in.
+
+The pool is a ProcessPool, which is created on first use, and again after a
+fork.
+"""
+import threading
+from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+from .process_pool import ProcessPool
+
+
+def normalize_method(method):
+    """Returns method as it is written in the hashes that it makes, eg.
+    pbkdf2:sha256 -> pbkdf2:sha256:50000
+    """
+    if method.startswith('pbkdf2:') and method.count(':') == 1:
+        return '{}:{}'.format(method, DEFAULT_PBKDF2_ITERATIONS)
+    return method
+
+
+class PasswordHasher(ProcessPool):
+    """Hash and verify passwords, in a bounded pool of processes"""
+
+    def __init__(self):
+        super(PasswordHasher, self).__init__()
+        self.method = normalize_method('pbkdf2:sha256')
+        self.salt_length = 8
+        self._slots = threading.BoundedSemaphore(1)
+
+    def init_app(self, app):
+        """Read configuration of app"""
+        self.shutdown()
+        self.method = normalize_method(
+            app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'))
+        self.salt_length = app.config.get('PASSWORD_HASH_SALT_LENGTH', 8)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 0)
+        self._slots = threading.BoundedSemaphore(
+            app.config.get('PASSWORD_HASH_MAX_PENDING', 16))
+
+    def hash(self, password):
+        """Returns the hash of password, to be stored"""
+        return self._run(generate_password_hash, password, self.method,
+                         self.salt_length)
+
+    def verify(self, pwhash, password):
+        """Returns True if password matches the stored pwhash"""
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """Returns True if pwhash was made with other parameters than the
+        configured ones
+        """
+        if pwhash.count('$') < 2:
+            return True
+        method, salt = pwhash.split('$', 2)[:2]
+        return method != self.method or len(salt) != self.salt_length
+
+    def _run(self, func, *args):
+        """Run func(*args) in the pool, or on this thread without workers"""
+        if not self.workers:
+            return func(*args)
+
+        with self._slots:
+            return self.run_in_pool(func, *args).result()
+
+
+# Flask coding convention is to use lowercase for extension-like objects.
+password_hasher = PasswordHasher()  # pylint: disable=invalid-name
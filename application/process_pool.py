@@ -0,0 +1,38 @@
+"""Base class of the services that run slow work in a pool of processes, eg.
+the password hasher and the thumbnailer
+
+The pool has `workers` processes. It is created on first use, and again after
+a fork, so it is never shared between the worker processes of eg. gunicorn.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+class ProcessPool(object):
+    """Fork-aware pool of `workers` processes"""
+
+    def __init__(self):
+        self.workers = 0
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    def shutdown(self):
+        """Stop the pool of this process, if any"""
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def run_in_pool(self, func, *args):
+        """Returns the future of func(*args), in the pool of this process"""
+        return self._get_pool().submit(func, *args)
+
+    def _get_pool(self):
+        """Returns the pool of this process, creating it if needed"""
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pool_pid = os.getpid()
+            return self._pool
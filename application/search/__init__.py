@@ -0,0 +1,5 @@
+"""package search: full-text search of items and categories, and the
+autocomplete of their names"""
+from .index import include_object
+from .query import SearchHit, search, encode_hit_cursor, decode_hit_cursor
+from .autocomplete import autocomplete_index
@@ -0,0 +1,245 @@
+"""Process-local prefix index of the category and item names, for typeahead
+
+Every keystroke in the search box asks for the names that start with what was
+typed so far. A LIKE 'x%' query per keystroke is answered instead from a sorted
+list in memory: a binary search finds the first name with the prefix, and the
+next limit entries are the suggestions. Names are compared case-insensitively.
+
+The index is loaded on first use, and then kept up to date incrementally:
+- SQLAlchemy after_insert, after_update and after_delete events on Category
+  and Item collect the changed names, which are applied to the index of the
+  process that made the change after the transaction is committed.
+
+- The other worker processes, and the rows that the database deletes with ON
+  DELETE CASCADE, are caught up from the change log: at most every
+  AUTOCOMPLETE_REFRESH_INTERVAL seconds, a lookup reads the changes of
+  categories and items after the last change seen, and reloads those rows.
+  Like the change feed, the last change seen only moves past changes older
+  than CHANGE_FEED_DELAY seconds, so changes that commit out of order are not
+  skipped. See application/changes
+"""
+import bisect
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from ..extensions import db
+from ..catalog.models import Category, Item
+from ..changes import Change
+
+# One name in the index. category_id is the category of an item, and the id
+# of a category.
+Suggestion = namedtuple('Suggestion',
+                        ['key', 'name', 'resource_type', 'id', 'category_id'])
+
+# Resource type in the change log of each indexed model
+RESOURCE_TYPES = {Category: 'category', Item: 'item'}
+
+# More changes than this since the last refresh reload the whole index
+REFRESH_BATCH = 1000
+
+
+def make_key(name):
+    """Returns the sort and search key of a name"""
+    return (name or '').casefold()
+
+
+def category_suggestions(query):
+    """Returns the Suggestions of the categories in query"""
+    return [Suggestion(make_key(name), name, 'category', id_, id_)
+            for id_, name in query.with_entities(Category.id, Category.name)]
+
+
+def item_suggestions(query):
+    """Returns the Suggestions of the items in query"""
+    return [Suggestion(make_key(name), name, 'item', id_, category_id)
+            for id_, name, category_id in query.with_entities(
+                Item.id, Item.name, Item.category_id)]
+
+
+class AutocompleteIndex(object):
+    """Sorted list of all category and item names, in the memory of the
+    process
+    """
+
+    def __init__(self):
+        self.refresh_interval = 1.0
+        self._lock = threading.Lock()
+        self._suggestions = None  # sorted list of Suggestion
+        self._by_id = {}  # (resource_type, id) -> Suggestion
+        self._change_id = 0
+        self._refreshed_at = 0.0
+
+    def init_app(self, app):
+        """Read configuration of app and start with an empty index"""
+        self.refresh_interval = app.config.get(
+            'AUTOCOMPLETE_REFRESH_INTERVAL', 1.0)
+        self.clear()
+
+    def complete(self, prefix, limit=10):
+        """Returns the first limit Suggestions, in alphabetical order, whose
+        names start with prefix
+        """
+        key = make_key(prefix).strip()
+        if not key or limit < 1:
+            return []
+
+        self._catch_up()
+        with self._lock:
+            suggestions = self._suggestions
+            start = bisect.bisect_left(suggestions, (key,))
+            result = []
+            for suggestion in suggestions[start:start + limit]:
+                if not suggestion.key.startswith(key):
+                    break
+                result.append(suggestion)
+        return result
+
+    def apply(self, resource_type, id_, suggestion):
+        """Replace the name of the category or item id_ with suggestion, or
+        remove it if suggestion is None
+        """
+        with self._lock:
+            if self._suggestions is None:
+                return
+            old = self._by_id.pop((resource_type, id_), None)
+            if old is not None:
+                index = bisect.bisect_left(self._suggestions, old)
+                if self._suggestions[index:index + 1] == [old]:
+                    del self._suggestions[index]
+            if suggestion is not None:
+                bisect.insort(self._suggestions, suggestion)
+                self._by_id[resource_type, id_] = suggestion
+
+    def remove_category_items(self, category_id):
+        """Remove the items of a deleted category"""
+        with self._lock:
+            if self._suggestions is None:
+                return
+            self._suggestions = [
+                suggestion for suggestion in self._suggestions
+                if not (suggestion.resource_type == 'item' and
+                        suggestion.category_id == category_id)]
+            self._by_id = {(suggestion.resource_type, suggestion.id):
+                           suggestion for suggestion in self._suggestions}
+
+    def clear(self):
+        """Forget the index, which is loaded again on the next lookup"""
+        with self._lock:
+            self._suggestions = None
+            self._by_id = {}
+
+    def _catch_up(self):
+        """Load the index, or apply the changes of other processes if it was
+        not refreshed for refresh_interval seconds
+        """
+        now = time.time()
+        if (self._suggestions is not None and
+                now - self._refreshed_at < self.refresh_interval):
+            return
+        self._refreshed_at = now
+
+        cutoff = datetime.utcnow() - timedelta(
+            seconds=current_app.config['CHANGE_FEED_DELAY'])
+        if self._suggestions is not None:
+            changes = db.session.query(
+                Change.id, Change.timestamp, Change.resource_type,
+                Change.resource_id).filter(
+                    Change.id > self._change_id,
+                    Change.resource_type.in_(RESOURCE_TYPES.values())
+                ).order_by(Change.id).limit(REFRESH_BATCH).all()
+            if len(changes) < REFRESH_BATCH:
+                self._reload_changed(changes)
+                self._change_id = max(
+                    [self._change_id] + [change.id for change in changes
+                                         if change.timestamp <= cutoff])
+                return
+
+        # Changes up to here are in the loaded rows, newer ones are applied
+        # again by the next refresh
+        change_id = db.session.query(Change.id).filter(
+            Change.timestamp <= cutoff).order_by(Change.id.desc()).limit(
+                1).scalar() or 0
+        suggestions = (category_suggestions(Category.query) +
+                       item_suggestions(Item.query))
+        suggestions.sort()
+        with self._lock:
+            self._suggestions = suggestions
+            self._by_id = {(suggestion.resource_type, suggestion.id):
+                           suggestion for suggestion in suggestions}
+            self._change_id = change_id
+
+    def _reload_changed(self, changes):
+        """Reload the categories and items of changes from the database"""
+        for model, loader in ((Category, category_suggestions),
+                              (Item, item_suggestions)):
+            resource_type = RESOURCE_TYPES[model]
+            ids = {change.resource_id for change in changes
+                   if change.resource_type == resource_type}
+            if not ids:
+                continue
+            found = {suggestion.id: suggestion for suggestion in loader(
+                model.query.filter(model.id.in_(ids)))}
+            for id_ in ids:
+                self.apply(resource_type, id_, found.get(id_))
+
+
+# Flask coding convention is to use lowercase for extension-like objects.
+autocomplete_index = AutocompleteIndex()  # pylint: disable=invalid-name
+
+
+def remember(target, suggestion):
+    """Remember the Suggestion of target, None if it was deleted, until the
+    transaction is committed
+    """
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('autocomplete_changes', {})[
+            RESOURCE_TYPES[type(target)], target.id] = suggestion
+
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_update')
+def on_category_change(unused_mapper, unused_connection, target):
+    """Remember the new name of a flushed category"""
+    if inspect(target).attrs.name.history.has_changes():
+        remember(target, Suggestion(make_key(target.name), target.name,
+                                    'category', target.id, target.id))
+
+
+@event.listens_for(Item, 'after_insert')
+@event.listens_for(Item, 'after_update')
+def on_item_change(unused_mapper, unused_connection, target):
+    """Remember the new name or category of a flushed item"""
+    state = inspect(target)
+    if (state.attrs.name.history.has_changes() or
+            state.attrs.category_id.history.has_changes()):
+        remember(target, Suggestion(make_key(target.name), target.name,
+                                    'item', target.id, target.category_id))
+
+
+@event.listens_for(Category, 'after_delete')
+@event.listens_for(Item, 'after_delete')
+def on_delete(unused_mapper, unused_connection, target):
+    """Remember that a category or item was deleted"""
+    remember(target, None)
+
+
+@event.listens_for(Session, 'after_commit')
+def on_commit(session):
+    """Apply the committed names to the index of this process"""
+    changes = session.info.pop('autocomplete_changes', {})
+    for (resource_type, id_), suggestion in changes.items():
+        autocomplete_index.apply(resource_type, id_, suggestion)
+        if resource_type == 'category' and suggestion is None:
+            # The database deleted the items of the category
+            autocomplete_index.remove_category_items(id_)
+
+
+@event.listens_for(Session, 'after_rollback')
+def on_rollback(session):
+    """Forget about names that were rolled back"""
+    session.info.pop('autocomplete_changes', None)
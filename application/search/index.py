@@ -0,0 +1,91 @@
+"""Full-text search indexes of the item names and descriptions and the
+category names, chosen by database dialect:
+
+- SQLite: FTS5 tables with external content, items_search and
+  categories_search, that index the rows of items and categories by their id
+  (rowid). Triggers on items and categories keep them in sync with every
+  insert, update and delete, including the rows written with SQLAlchemy Core
+  and the rows deleted by ON DELETE CASCADE. The porter tokenizer stems
+  English words, eg. 'ales' finds 'Ale'.
+
+- PostgreSQL: GIN indexes on the tsvector of the rows. The search queries use
+  the same expression, so the indexes are always in sync without triggers.
+  Names weigh more than descriptions.
+
+db.create_all() creates the indexes through metadata events, and the
+migrations create them for existing databases.
+"""
+from sqlalchemy import DDL, event
+from ..extensions import db
+
+# Tables of SQLite FTS5, that are not part of the models
+FTS_TABLES = ('items_search', 'categories_search')
+
+# The tsvector of a row, in PostgreSQL
+ITEMS_TSVECTOR = ("(setweight(to_tsvector('english', coalesce(name, '')), "
+                  "'A') || setweight(to_tsvector('english', "
+                  "coalesce(description, '')), 'B'))")
+CATEGORIES_TSVECTOR = ("(setweight(to_tsvector('english', coalesce(name, '')),"
+                       " 'A'))")
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE items_search USING fts5("
+    "name, description, content='items', content_rowid='id', "
+    "tokenize='porter unicode61')",
+    "CREATE TRIGGER items_search_insert AFTER INSERT ON items BEGIN "
+    "INSERT INTO items_search(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER items_search_delete AFTER DELETE ON items BEGIN "
+    "INSERT INTO items_search(items_search, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER items_search_update AFTER UPDATE OF name, description "
+    "ON items BEGIN "
+    "INSERT INTO items_search(items_search, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO items_search(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+
+    "CREATE VIRTUAL TABLE categories_search USING fts5("
+    "name, content='categories', content_rowid='id', "
+    "tokenize='porter unicode61')",
+    "CREATE TRIGGER categories_search_insert AFTER INSERT ON categories BEGIN "
+    "INSERT INTO categories_search(rowid, name) VALUES (new.id, new.name); "
+    "END",
+    "CREATE TRIGGER categories_search_delete AFTER DELETE ON categories BEGIN "
+    "INSERT INTO categories_search(categories_search, rowid, name) "
+    "VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER categories_search_update AFTER UPDATE OF name "
+    "ON categories BEGIN "
+    "INSERT INTO categories_search(categories_search, rowid, name) "
+    "VALUES ('delete', old.id, old.name); "
+    "INSERT INTO categories_search(rowid, name) VALUES (new.id, new.name); "
+    "END",
+]
+
+SQLITE_DROP = ['DROP TABLE IF EXISTS items_search',
+               'DROP TABLE IF EXISTS categories_search']
+
+POSTGRESQL_CREATE = [
+    'CREATE INDEX ix_items_search ON items USING gin ({})'.format(
+        ITEMS_TSVECTOR),
+    'CREATE INDEX ix_categories_search ON categories USING gin ({})'.format(
+        CATEGORIES_TSVECTOR),
+]
+
+for statement in SQLITE_CREATE:
+    event.listen(db.metadata, 'after_create',
+                 DDL(statement).execute_if(dialect='sqlite'))
+for statement in SQLITE_DROP:
+    event.listen(db.metadata, 'before_drop',
+                 DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRESQL_CREATE:
+    event.listen(db.metadata, 'after_create',
+                 DDL(statement).execute_if(dialect='postgresql'))
+
+
+def include_object(unused_obj, name, type_, reflected, unused_compare_to):
+    """Alembic autogenerate filter, that ignores the FTS5 tables, and their
+    shadow tables, eg. items_search_data
+    """
+    return not (type_ == 'table' and reflected and
+                name.startswith(FTS_TABLES))
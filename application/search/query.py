@@ -0,0 +1,119 @@
+"""Run full-text searches, ranked and paged with a keyset
+
+A search returns SearchHits of items and categories, ordered by score, best
+first, and then by type and id. Lower scores are better: the bm25 of SQLite
+FTS5 is negative, and PostgreSQL's ts_rank is negated.
+
+All words of the query must match. The last word also matches as a prefix,
+so the results follow the user while typing.
+
+Like the keyset pagination of the REST api, the next page starts right after
+the (score, type, id) of the last hit of a page, so every page costs the same.
+Every type only returns its best matches, with LIMIT, so a search does not
+load all matching rows.
+"""
+import re
+from collections import namedtuple
+from sqlalchemy import text
+from ..cursors import encode_key, decode_key
+from ..extensions import db
+from .index import ITEMS_TSVECTOR, CATEGORIES_TSVECTOR
+
+# One search result
+SearchHit = namedtuple('SearchHit', ['score', 'resource_type', 'id'])
+
+RESOURCE_TYPES = ('category', 'item')
+
+# The longest query that is searched
+MAX_WORDS = 16
+
+# The matching rows of a type, with their score, in each dialect
+SQLITE_MATCHES = {
+    'item': "SELECT rowid AS id, bm25(items_search, 10.0, 1.0) AS score "
+            "FROM items_search WHERE items_search MATCH :query",
+    'category': "SELECT rowid AS id, bm25(categories_search) AS score "
+                "FROM categories_search WHERE categories_search MATCH :query",
+}
+
+POSTGRESQL_MATCHES = {
+    'item': "SELECT id, -ts_rank({0}, to_tsquery('english', :query)) AS score "
+            "FROM items WHERE {0} @@ to_tsquery('english', :query)".format(
+                ITEMS_TSVECTOR),
+    'category': "SELECT id, -ts_rank({0}, to_tsquery('english', :query)) "
+                "AS score FROM categories "
+                "WHERE {0} @@ to_tsquery('english', :query)".format(
+                    CATEGORIES_TSVECTOR),
+}
+
+
+def query_words(query):
+    """Returns the words of a query, without any search syntax"""
+    return re.findall(r'[^\W_]+', query.lower())[:MAX_WORDS]
+
+
+def match_expression(words, dialect):
+    """Returns the full-text query for words, in the syntax of dialect"""
+    if dialect == 'postgresql':
+        return ' & '.join(words[:-1] + [words[-1] + ':*'])
+    return ' '.join(['"{}"'.format(word) for word in words]) + '*'
+
+
+def encode_hit_cursor(hit):
+    """Returns an opaque cursor for the position of a SearchHit"""
+    return encode_key(list(hit))
+
+
+def decode_hit_cursor(cursor):
+    """Returns the SearchHit stored in a cursor, or None for an empty cursor.
+    Raises ValueError for an invalid cursor.
+    """
+    if not cursor:
+        return None
+
+    try:
+        score, resource_type, id_ = decode_key(cursor)
+        if resource_type not in RESOURCE_TYPES:
+            raise ValueError(resource_type)
+        return SearchHit(float(score), resource_type, int(id_))
+    except TypeError as error:
+        raise ValueError(str(error))
+
+
+def keyset_condition(resource_type, after):
+    """Returns the SQL condition for the hits of resource_type that come after
+    the SearchHit after
+    """
+    if resource_type > after.resource_type:
+        return 'score >= :score'
+    if resource_type < after.resource_type:
+        return 'score > :score'
+    return 'score > :score OR (score = :score AND id > :id)'
+
+
+def search(query, resource_types=RESOURCE_TYPES, after=None, limit=20):
+    """Returns the limit best SearchHits for query, that come after the
+    SearchHit after
+    """
+    words = query_words(query)
+    if not words:
+        return []
+
+    dialect = db.engine.dialect.name
+    matches = (POSTGRESQL_MATCHES if dialect == 'postgresql' else
+               SQLITE_MATCHES)
+    params = {'query': match_expression(words, dialect), 'limit': limit}
+    if after is not None:
+        params.update({'score': after.score, 'id': after.id})
+
+    hits = []
+    for resource_type in resource_types:
+        sql = 'SELECT id, score FROM ({}) AS matches'.format(
+            matches[resource_type])
+        if after is not None:
+            sql += ' WHERE ' + keyset_condition(resource_type, after)
+        sql += ' ORDER BY score, id LIMIT :limit'
+
+        hits.extend(SearchHit(score, resource_type, id_)
+                    for id_, score in db.session.execute(text(sql), params))
+
+    return sorted(hits)[:limit]
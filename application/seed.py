@@ -0,0 +1,159 @@
+"""Bulk seeding of large synthetic catalogs, eg. for capacity testing
+
+The ORM adds, flushes and tracks every object, which is far too slow for
+millions of rows. The seeder instead generates plain dictionaries and inserts
+them with Core, in chunks of chunk_size rows per transaction:
+- SQLite:     executemany of a single INSERT statement
+- PostgreSQL: multi-row INSERT ... VALUES statements, which avoid a round-trip
+              per row
+
+Everything is generated from a random.Random(seed), so the same arguments
+always produce the same catalog. The seeder adds to the existing content of the
+database, and can be used by the `flask seed` command, benchmarks and tests:
+
+    from application.seed import seed_catalog
+    seed_catalog(db.engine, users=1000, categories=5000, items=1000000)
+"""
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, text
+from .user import User, Role
+from .catalog import Category, Item, category_cache
+from .passwords import password_hasher
+
+# Number of rows that are inserted by the seed_catalog function
+SeedResult = namedtuple('SeedResult', ['users', 'categories', 'items'])
+
+ADJECTIVES = ['Amber', 'Barrel-Aged', 'Bitter', 'Black', 'Blonde', 'Bourbon',
+              'Crisp', 'Dark', 'Double', 'Dry', 'Golden', 'Hazy', 'Hoppy',
+              'Imperial', 'Old', 'Pale', 'Red', 'Roasted', 'Session', 'Smoked',
+              'Sour', 'Spiced', 'Strong', 'Triple', 'Wild']
+STYLES = ['Ale', 'Barleywine', 'Bock', 'Dubbel', 'Gose', 'IPA', 'Kölsch',
+          'Lager', 'Lambic', 'Pilsner', 'Porter', 'Saison', 'Stout',
+          'Tripel', 'Weizen']
+BREWERIES = ['Anderson Valley', 'Bear Republic', 'Bell\'s', 'Cigar City',
+             'Great Lakes', 'Lagunitas', 'New Belgium', 'Rogue',
+             'Sierra Nevada', 'Stone', 'Tröegs', 'Uinta']
+
+DEFAULT_PASSWORD = 'not-so-good-password'
+
+
+def max_id(conn, model):
+    """Returns the highest id in the table of model, or 0"""
+    return conn.execute(select([func.max(model.id)])).scalar() or 0
+
+
+def insert_chunked(engine, table, rows, chunk_size):
+    """Insert the dictionaries of the rows iterator in chunks of chunk_size,
+    each chunk in its own transaction
+    """
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            insert_chunk(engine, table, chunk)
+            chunk = []
+    if chunk:
+        insert_chunk(engine, table, chunk)
+
+
+def insert_chunk(engine, table, chunk):
+    """Insert a list of dictionaries in one transaction"""
+    with engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            # Keep each statement well below the limit of 65535 parameters
+            size = 65535 // len(chunk[0])
+            for first in range(0, len(chunk), size):
+                conn.execute(table.insert().values(chunk[first:first + size]))
+        else:
+            conn.execute(table.insert(), chunk)
+
+
+def reset_sequences(engine, models):
+    """PostgreSQL does not advance the id sequence of a table when rows are
+    inserted with an explicit id. Move it past the highest id.
+    """
+    if engine.dialect.name != 'postgresql':
+        return
+
+    with engine.begin() as conn:
+        for model in models:
+            conn.execute(text(
+                "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                "(SELECT max(id) FROM {0}))".format(model.__tablename__)))
+
+
+def seed_catalog(engine, users=10, categories=20, items=1000,
+                 seed=42, chunk_size=10000, password=DEFAULT_PASSWORD):
+    """Insert users, categories and items with random, but deterministic,
+    content. Categories and items are owned by random seeded users.
+
+    Returns a SeedResult with the number of inserted rows.
+    """
+    # pylint: disable=too-many-arguments, too-many-locals
+    if users < 1 and (categories > 0 or items > 0):
+        raise ValueError('At least 1 user is needed to own the catalog')
+    if categories < 1 and items > 0:
+        raise ValueError('At least 1 category is needed for the items')
+
+    rnd = random.Random(seed)
+    start = datetime(2018, 1, 1)
+
+    with engine.connect() as conn:
+        role_id = conn.execute(
+            select([Role.id]).where(Role.default)).scalar()
+        first_user = max_id(conn, User) + 1
+        first_category = max_id(conn, Category) + 1
+        first_item = max_id(conn, Item) + 1
+
+    if role_id is None:
+        raise RuntimeError('No default role found. Insert the roles first, '
+                           'eg. with: flask initdb')
+
+    # One password hash for all seeded users. Hashing is slow on purpose.
+    password_hash = password_hasher.hash(password)
+
+    user_ids = range(first_user, first_user + users)
+    insert_chunked(engine, User.__table__, (
+        {'id': id_,
+         'email': 'seed-user{}@example.com'.format(id_),
+         'password_hash': password_hash,
+         'password_set': True,
+         'first_name': rnd.choice(ADJECTIVES),
+         'last_name': 'User{}'.format(id_),
+         'confirmed': True,
+         'blocked': False,
+         'failed_logins': 0,
+         'registered_with_google': False,
+         'role_id': role_id} for id_ in user_ids), chunk_size)
+
+    category_ids = range(first_category, first_category + categories)
+    insert_chunked(engine, Category.__table__, (
+        {'id': id_,
+         'timestamp': start + timedelta(minutes=id_),
+         'name': '{} {} #{}'.format(rnd.choice(ADJECTIVES),
+                                    rnd.choice(STYLES), id_),
+         'user_id': rnd.choice(user_ids)} for id_ in category_ids),
+                   chunk_size)
+
+    item_ids = range(first_item, first_item + items)
+    insert_chunked(engine, Item.__table__, (
+        {'id': id_,
+         'timestamp': start + timedelta(seconds=id_),
+         'name': '{} {} {} #{}'.format(rnd.choice(BREWERIES),
+                                       rnd.choice(ADJECTIVES),
+                                       rnd.choice(STYLES), id_),
+         'description': 'Made by {} Brewing Company'.format(
+             rnd.choice(BREWERIES)),
+         'user_id': rnd.choice(user_ids),
+         'category_id': rnd.choice(category_ids)} for id_ in item_ids),
+                   chunk_size)
+
+    reset_sequences(engine, [User, Category, Item])
+
+    # Core inserts bypass the ORM events, so notify the cache explicitly
+    if categories:
+        category_cache.invalidate()
+
+    return SeedResult(users=users, categories=categories, items=items)
@@ -0,0 +1,195 @@
+"""Thumbnails of the profile pictures, made off the request thread
+
+An uploaded profile picture is saved as is, and the thumbnailer then makes
+square derivatives of it, next to the original, in a small pool of processes:
+
+    IMAGE_DEST/selfie.jpg             the original upload
+    IMAGE_DEST/selfie.jpg.128.webp    128 x 128, WebP
+    IMAGE_DEST/selfie.jpg.128.jpg     128 x 128, JPEG
+    ...
+
+so neither the upload nor the avatars wait for a large original. Avatars are
+served from the smallest derivative that is at least as large as requested,
+and the original is only served while its derivatives are not made yet.
+
+- THUMBNAIL_SIZES:        the sizes of the derivatives, in pixels
+- THUMBNAIL_DEFAULT_SIZE: the size of an avatar, when none is requested
+- THUMBNAIL_FORMATS:      the formats of the derivatives. WebP is skipped when
+                          Pillow is built without it.
+- THUMBNAIL_QUALITY:      the quality of the lossy formats
+- THUMBNAIL_WORKERS:      number of processes of the pool, per worker process
+                          of the application. 0 makes the derivatives on the
+                          calling thread.
+
+The pool is a ProcessPool, like the one of the password hasher.
+"""
+import os
+from functools import partial
+from PIL import Image, ImageOps, features
+from .process_pool import ProcessPool
+
+# Format -> file extension, Pillow format and mimetype
+FORMATS = {'webp': ('webp', 'WEBP', 'image/webp'),
+           'jpeg': ('jpg', 'JPEG', 'image/jpeg')}
+
+# EXIF tag of the orientation of the camera
+ORIENTATION_TAG = 0x0112
+
+# EXIF orientation -> the transpositions that turn the image upright. Pillow
+# 5.1 has neither ImageOps.exif_transpose, nor Image.TRANSVERSE.
+ORIENTATIONS = {2: (Image.FLIP_LEFT_RIGHT,),
+                3: (Image.ROTATE_180,),
+                4: (Image.FLIP_TOP_BOTTOM,),
+                5: (Image.ROTATE_90, Image.FLIP_TOP_BOTTOM),
+                6: (Image.ROTATE_270,),
+                7: (Image.ROTATE_90, Image.FLIP_LEFT_RIGHT),
+                8: (Image.ROTATE_90,)}
+
+
+def derivative_filename(filename, size, image_format):
+    """Returns the filename of a derivative of filename, eg.
+    selfie.jpg -> selfie.jpg.128.webp
+    """
+    return '{}.{}.{}'.format(filename, size, FORMATS[image_format][0])
+
+
+def exif_transpose(image):
+    """Returns image turned upright by its EXIF orientation, eg. a photo
+    taken with the phone on its side
+    """
+    try:
+        # Only JPEG images have EXIF in Pillow 5.1
+        # pylint: disable=protected-access
+        exif = image._getexif() if hasattr(image, '_getexif') else None
+    except (IOError, OSError, IndexError, KeyError, SyntaxError, ValueError):
+        exif = None
+    for method in ORIENTATIONS.get((exif or {}).get(ORIENTATION_TAG), ()):
+        image = image.transpose(method)
+    return image
+
+
+def save_derivative(image, target, image_format, quality):
+    """Save image to the path target, in image_format, under a temporary
+    name first
+    """
+    pil_format = FORMATS[image_format][1]
+    if pil_format == 'JPEG' and image.mode == 'RGBA':
+        opaque = Image.new('RGB', image.size, (255, 255, 255))
+        opaque.paste(image, mask=image.split()[3])
+        image = opaque
+    part = target + '.part'
+    image.save(part, pil_format, quality=quality)
+    os.replace(part, target)
+
+
+def make_derivatives(path, sizes, formats, quality):
+    """Make the derivatives of the image at path, largest first. Every file is
+    written under a temporary name first, so a derivative is never served
+    half-written.
+
+    Returns the paths of the derivatives.
+    """
+    directory, filename = os.path.split(path)
+    written = []
+    with Image.open(path) as original:
+        # Let JPEG decode at a fraction of its size, which is much faster
+        # for large photos
+        largest = max(sizes)
+        original.draft('RGB', (largest * 2, largest * 2))
+        image = exif_transpose(original)
+        image = image.convert('RGBA' if 'A' in image.getbands() or
+                              'transparency' in image.info else 'RGB')
+
+        for size in sorted(sizes, reverse=True):
+            image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            for image_format in formats:
+                target = os.path.join(directory, derivative_filename(
+                    filename, size, image_format))
+                save_derivative(image, target, image_format, quality)
+                written.append(target)
+    return written
+
+
+class Thumbnailer(ProcessPool):
+    """Make, find and remove the derivatives of uploaded images"""
+
+    def __init__(self):
+        super(Thumbnailer, self).__init__()
+        self.sizes = (64, 128, 256)
+        self.default_size = 128
+        self.formats = ('jpeg',)
+        self.quality = 80
+        self.logger = None
+
+    def init_app(self, app):
+        """Read configuration of app"""
+        self.shutdown()
+        self.sizes = tuple(sorted(app.config.get('THUMBNAIL_SIZES',
+                                                 self.sizes)))
+        self.default_size = app.config.get('THUMBNAIL_DEFAULT_SIZE',
+                                           self.default_size)
+        self.formats = tuple(
+            image_format for image_format in app.config.get(
+                'THUMBNAIL_FORMATS', ('webp', 'jpeg'))
+            if image_format != 'webp' or features.check('webp'))
+        self.quality = app.config.get('THUMBNAIL_QUALITY', self.quality)
+        self.workers = app.config.get('THUMBNAIL_WORKERS', 0)
+        self.logger = app.logger
+
+    def submit(self, path):
+        """Make the derivatives of the image at path, in the background.
+        Returns the future of the job, or None when it ran on this thread.
+        """
+        args = (path, self.sizes, self.formats, self.quality)
+        if not self.workers:
+            try:
+                make_derivatives(*args)
+            except (IOError, OSError, ValueError):
+                self.logger.exception('Failed to make thumbnails of %s', path)
+            return None
+
+        future = self.run_in_pool(make_derivatives, *args)
+        future.add_done_callback(partial(self._report, path))
+        return future
+
+    def _report(self, path, future):
+        """Log the failure of a background job of path, if it failed"""
+        if future.exception() is not None:
+            self.logger.error('Failed to make thumbnails of %s: %s', path,
+                              future.exception())
+
+    def derivatives(self, path):
+        """Returns the paths of all possible derivatives of the image at
+        path, made or not
+        """
+        directory, filename = os.path.split(path)
+        return [os.path.join(directory, derivative_filename(
+            filename, size, image_format))
+                for size in self.sizes for image_format in FORMATS]
+
+    def find(self, path, size=None, mimetypes=('image/jpeg',)):
+        """Returns the path and mimetype of the smallest derivative of the
+        image at path that is at least size pixels, in the first of mimetypes
+        that is made. Larger sizes come first, then the largest smaller one.
+
+        Returns None when no derivative is made yet.
+        """
+        size = size or self.default_size
+        sizes = [candidate for candidate in self.sizes if candidate >= size] \
+            + [candidate for candidate in reversed(self.sizes)
+               if candidate < size]
+        formats = [image_format for mimetype in mimetypes
+                   for image_format in self.formats
+                   if FORMATS[image_format][2] == mimetype]
+        directory, filename = os.path.split(path)
+        for candidate in sizes:
+            for image_format in formats:
+                found = os.path.join(directory, derivative_filename(
+                    filename, candidate, image_format))
+                if os.path.exists(found):
+                    return found, FORMATS[image_format][2]
+        return None
+
+
+# Flask coding convention is to use lowercase for extension-like objects.
+thumbnailer = Thumbnailer()  # pylint: disable=invalid-name
@@ -1,13 +1,17 @@
 """Definition of database tables using ORM of user"""
 import os
-from sqlalchemy import Column
+from datetime import datetime
+from sqlalchemy import Column, event, inspect, or_
+from sqlalchemy.orm import Session, object_session
 # from sqlalchemy.orm import backref
 from flask import current_app, url_for
 from flask_login import UserMixin, AnonymousUserMixin
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
 from itsdangerous import BadSignature, SignatureExpired
-from werkzeug.security import generate_password_hash, check_password_hash
 from ..extensions import db, login_manager, images
+from ..passwords import password_hasher
+from ..thumbnails import thumbnailer
+from ..blobs import save_upload, release, media_url
 
 
 class User(db.Model, UserMixin):
@@ -32,9 +36,15 @@ class User(db.Model, UserMixin):
     blocked = db.Column(db.Boolean, nullable=True, default=False)
     profile_pic_filename = db.Column(db.String, default=None, nullable=True)
     profile_pic_url = db.Column(db.String, default=None, nullable=True)
+    updated_at = db.Column(db.DateTime, index=True, default=datetime.utcnow,
+                           onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
 
     role_id = db.Column(db.Integer, db.ForeignKey('roles.id'))
 
+    # See the version column of Category
+    __mapper_args__ = {'version_id_col': version}
+
     ################################
     # Application specific columns #
     ################################
@@ -80,20 +90,38 @@ class User(db.Model, UserMixin):
 
     @staticmethod
     def delete_account(user):
-        """Deletes user and all it's owned Categories and Items"""
-
-        # first delete all owned categories and all the items in those
-        # categories, including items that other users added to the category.
-        for category in user.categories:
-            for item in category.items:
-                db.session.delete(item)
-            db.session.delete(category)
-        db.session.commit()
+        """Deletes user and all it's owned Categories and Items.
 
-        # then delete all remaining owned items
-        for item in user.items:
-            db.session.delete(item)
-        db.session.commit()
+        Everything is deleted in one transaction with set-based deletes, so
+        the items are never loaded into the session. The profile picture is
+        removed from disk after the transaction is committed.
+
+        Tombstones for the deleted rows are written to the change log first.
+        """
+        # pylint: disable=cyclic-import
+        from ..catalog import Category, Item
+        from ..catalog.cache import invalidate_after_commit
+        from ..changes import log_bulk_delete
+
+        # Forget the categories and items that are loaded already: the flush
+        # would otherwise set their user_id to NULL, after they are deleted
+        db.session.expire(user, ['categories', 'items'])
+
+        # first delete all items in owned categories, including items that
+        # other users added to the category, and all remaining owned items
+        owned_categories = db.session.query(Category.id).filter(
+            Category.user_id == user.id)
+        items = or_(Item.category_id.in_(owned_categories),
+                    Item.user_id == user.id)
+        log_bulk_delete(db.session, Item, items)
+        Item.query.filter(items).delete(synchronize_session=False)
+
+        # then delete all owned categories
+        owned = Category.user_id == user.id
+        log_bulk_delete(db.session, Category, owned)
+        Category.query.filter(owned).delete(synchronize_session=False)
+        # The bulk delete skips the events that invalidate the category cache
+        invalidate_after_commit(db.session)
 
         # finally, delete the user
         db.session.delete(user)
@@ -139,22 +167,44 @@ class User(db.Model, UserMixin):
     @password.setter
     def password(self, password):
         """Hash the password before storing"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
         self.password_set = True
 
     def verify_password(self, password):
-        """Check the hashed password"""
+        """Check the hashed password.
+        If it was hashed with outdated parameters, it is hashed again.
+        """
         if (self.password_set and
-                check_password_hash(self.password_hash, password)):
-            self.failed_logins = 0
+                password_hasher.verify(self.password_hash, password)):
+            values = {'failed_logins': 0} if self.failed_logins else {}
+            if password_hasher.needs_rehash(self.password_hash):
+                values['password_hash'] = password_hasher.hash(password)
+            if values:
+                self.update_login(**values)
             return True
         else:
-            self.failed_logins += 1
-            if self.failed_logins > 2:
-                self.blocked = True
-            db.session.commit()
+            users = User.__table__
+            failed_logins = users.c.failed_logins + 1
+            self.update_login(failed_logins=failed_logins,
+                              blocked=db.case([(failed_logins > 2, True)],
+                                              else_=users.c.blocked))
             return False
 
+    def update_login(self, **values):
+        """Update the columns of the login of the user and commit. values may
+        be SQL expressions, eg. of the counter of failed logins.
+
+        The UPDATE neither checks nor bumps the version, so concurrent logins
+        of the same user cannot fail with a StaleDataError, and they do not
+        change the user for the api.
+        """
+        if inspect(self).pending:
+            db.session.flush()
+        users = User.__table__
+        db.session.execute(users.update().where(users.c.id == self.id).values(
+            updated_at=users.c.updated_at, **values))
+        db.session.commit()
+
     def unblock(self):
         """Unblock the account by resetting the values"""
         self.failed_logins = 0
@@ -270,26 +320,36 @@ class User(db.Model, UserMixin):
     def profile_pic(self, client_file_storage):
         """Upload the profile picture to the server and set the url"""
 
-        # If we already have a profile picture, remove it
+        # If we already have a profile picture, drop our reference to it. The
+        # garbage collection removes it, once nobody refers to it.
         if self.profile_pic_filename:
-            filepath = os.path.join(
-                current_app.config['UPLOADED_IMAGES_DEST'],
-                self.profile_pic_filename)
-            os.remove(filepath)
+            release_picture(db.session, self.profile_pic_filename)
             self.profile_pic_filename = None
             self.profile_pic_url = None
 
-        # This uploads & saves the file on the server
-        # NOTE: It uses the secure_filename function...
-        server_filename = images.save(client_file_storage)
+        # This saves the file on the server, once per content, and makes the
+        # thumbnails in the background
+        server_filename = save_upload(client_file_storage, db.session)
 
         # Generate the URL to this file
-        url = images.url(server_filename)
+        url = media_url(server_filename)
 
         # Store information with the user
         self.profile_pic_filename = server_filename
         self.profile_pic_url = url
 
+    def profile_pic_thumbnail_url(self, size=None, mimetype='image/jpeg'):
+        """Returns the URL of the smallest thumbnail of the profile picture
+        that is at least size pixels, in mimetype, or None while there is none
+        """
+        if self.profile_pic_filename:
+            found = thumbnailer.find(
+                images.path(self.profile_pic_filename), size, (mimetype,))
+            if found is not None:
+                return media_url(os.path.relpath(
+                    found[0], images.config.destination))
+        return None
+
     def to_json(self):
         """Serialize user object to json format"""
         json_user = {'url': url_for('api.user_detail', id=self.id)}
@@ -351,6 +411,48 @@ def load_user(user_id):
     return User.query.get(int(user_id))
 
 
+def remove_file_after_commit(session, filepath):
+    """Remove filepath from disk once the transaction of session is committed.
+    Nothing is removed when the transaction is rolled back.
+    """
+    session.info.setdefault('files_to_remove', []).append(filepath)
+
+
+def release_picture(session, filename, connection=None):
+    """Drop a reference to the profile picture filename. A picture that was
+    uploaded before the blob store, and its thumbnails, are removed once the
+    transaction of session is committed.
+    """
+    if not release(connection or session, filename):
+        filepath = images.path(filename)
+        for path in [filepath] + thumbnailer.derivatives(filepath):
+            remove_file_after_commit(session, path)
+
+
+@event.listens_for(User, 'after_delete')
+def on_user_delete(unused_mapper, connection, target):
+    """Release the profile picture of a deleted user"""
+    if target.profile_pic_filename:
+        release_picture(object_session(target), target.profile_pic_filename,
+                        connection)
+
+
+@event.listens_for(Session, 'after_commit')
+def on_commit(session):
+    """Remove the files of the committed transaction"""
+    for filepath in session.info.pop('files_to_remove', []):
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
+
+
+@event.listens_for(Session, 'after_rollback')
+def on_rollback(session):
+    """Keep the files of the rolled back transaction"""
+    session.info.pop('files_to_remove', None)
+
+
 class Permission:  # pylint: disable=too-few-public-methods
     """Defines the list of permissions"""
     # implementation based on "Flask Web Development - Chapter 9. User Roles"
@@ -6,6 +6,7 @@ from flask_login import login_required, current_user
 
 from . import User
 from .forms import ProfileForm
+from ..blobs import UPLOAD_ERRORS, image_upload
 from ..extensions import db
 
 user = Blueprint('user',  # pylint: disable=invalid-name
@@ -14,9 +15,14 @@ user = Blueprint('user',  # pylint: disable=invalid-name
 
 @user.route('/profile', methods=['GET', 'POST'])
 @login_required
+@image_upload
 def profile():
     """Update profile of current user"""
-    form = ProfileForm(obj=current_user)
+    try:
+        form = ProfileForm(obj=current_user)
+    except UPLOAD_ERRORS as error:
+        flash(error.description, 'danger')
+        return redirect(url_for('user.profile'))
 
     if form.validate_on_submit():
         client_file_storage = form.profile_pic.data
@@ -0,0 +1,4 @@
+"""Benchmarks of the application. Run them from the root of the project, eg:
+
+    (venv) $ python -m benchmarks.bench_indexes --help
+"""
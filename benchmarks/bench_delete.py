@@ -0,0 +1,95 @@
+"""Benchmark deleting a user account: row-by-row versus set-based deletes
+
+Seeds a catalog in which one power user owns about half of all categories and
+items, and then deletes that account twice, on identical data:
+- row-by-row: every item and category is loaded into the session and deleted
+              with db.session.delete, with three commits. (the old algorithm)
+- bulk:       User.delete_account, which uses set-based deletes in one
+              transaction.
+
+Usage:
+    (venv) $ python -m benchmarks.bench_delete --items 100000
+
+    To run it against PostgreSQL (or any database that SQLAlchemy supports):
+    (venv) $ python -m benchmarks.bench_delete \\
+                 --database-url postgresql://user:pw@localhost/catalog_bench
+
+WARNING: all tables in the database are dropped and re-created.
+"""
+import argparse
+import os
+import tempfile
+import time
+from config import Config
+from application import create_app
+from application.extensions import db
+from application.user import User, Role
+from application.catalog import Item
+from application.seed import seed_catalog
+
+
+def delete_row_by_row(user):
+    """Deletes user and all it's owned Categories and Items, one by one"""
+    for category in user.categories:
+        for item in category.items:
+            db.session.delete(item)
+        db.session.delete(category)
+    db.session.commit()
+
+    for item in user.items:
+        db.session.delete(item)
+    db.session.commit()
+
+    db.session.delete(user)
+    db.session.commit()
+
+
+def run(engine, args, delete):
+    """Seed the database, and time the deletion of the power user"""
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    Role.insert_roles()
+    seed_catalog(engine, users=2, categories=args.categories,
+                 items=args.items)
+
+    user = User.query.get(1)
+    start = time.perf_counter()
+    delete(user)
+    elapsed = time.perf_counter() - start
+
+    remaining = Item.query.count()
+    print('  {:<18} {:8.2f} s   ({} of {} items remain)'.format(
+        delete.__name__, elapsed, remaining, args.items))
+
+
+def main():
+    """Parse arguments and run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=None,
+                        help='defaults to a temporary sqlite database')
+    parser.add_argument('--categories', type=int, default=200)
+    parser.add_argument('--items', type=int, default=100000)
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'bench_delete.db')
+
+    class BenchmarkConfig(Config):
+        """Configuration for the benchmark"""
+        # pylint: disable=too-few-public-methods
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = database_url
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        print('Database: {}'.format(db.engine.url))
+        print('Deleting the account of a user that owns about half of '
+              '{} categories and {} items:'.format(args.categories,
+                                                   args.items))
+        run(db.engine, args, delete_row_by_row)
+        run(db.engine, args, User.delete_account)
+
+
+if __name__ == '__main__':
+    main()
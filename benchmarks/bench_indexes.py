@@ -0,0 +1,142 @@
+"""Benchmark the indexes on the foreign keys of the items and categories tables
+
+Seeds a database with a large synthetic catalog, and then shows the query plan
+and the latency of the queries that filter on the foreign keys, first without
+and then with the indexes of revision 3f2b8c1d7a45.
+
+Usage:
+    (venv) $ python -m benchmarks.bench_indexes --items 1000000
+
+    To run it against PostgreSQL (or any database that SQLAlchemy supports):
+    (venv) $ python -m benchmarks.bench_indexes \\
+                 --database-url postgresql://user:pw@localhost/catalog_bench
+
+WARNING: all tables in the database are dropped and re-created.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from sqlalchemy import text
+from config import Config
+from application import create_app
+from application.extensions import db
+from application.user import Role
+from application.seed import seed_catalog
+
+# The indexes that are benchmarked, by table
+INDEXES = {'categories': ['ix_categories_user_id'],
+           'items': ['ix_items_category_id_timestamp_id',
+                     'ix_items_user_id_timestamp_id']}
+
+QUERIES = [
+    ('items of a category (catalog page, ItemList)',
+     'SELECT id, name FROM items WHERE category_id = :category_id '
+     'ORDER BY timestamp, id LIMIT 30'),
+    ('items of a user (ItemList)',
+     'SELECT id, name FROM items WHERE user_id = :user_id '
+     'ORDER BY timestamp, id LIMIT 30'),
+    ('categories of a user (CategoryList, delete_account)',
+     'SELECT id FROM categories WHERE user_id = :user_id'),
+    ('items in categories of a user (delete_account)',
+     'SELECT count(*) FROM items WHERE category_id IN '
+     '(SELECT id FROM categories WHERE user_id = :user_id)'),
+]
+
+
+def set_indexes(engine, create):
+    """Create or drop the benchmarked indexes"""
+    for table_name, index_names in INDEXES.items():
+        for index in db.metadata.tables[table_name].indexes:
+            if index.name in index_names:
+                if create:
+                    index.create(bind=engine)
+                else:
+                    index.drop(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text('ANALYZE'))
+
+
+def explain(conn, sql, params):
+    """Returns the query plan of sql as text"""
+    if conn.dialect.name == 'sqlite':
+        rows = conn.execute(text('EXPLAIN QUERY PLAN ' + sql), params)
+        return '\n'.join(str(row[-1]) for row in rows)
+    if conn.dialect.name == 'postgresql':
+        rows = conn.execute(text('EXPLAIN ANALYZE ' + sql), params)
+    else:
+        rows = conn.execute(text('EXPLAIN ' + sql), params)
+    return '\n'.join(' '.join(str(col) for col in row) for row in rows)
+
+
+def measure(engine, users, categories, runs):
+    """Print the query plan and latency of all QUERIES"""
+    rnd = random.Random(7)
+    with engine.connect() as conn:
+        for title, sql in QUERIES:
+            params = {'user_id': rnd.randint(1, users),
+                      'category_id': rnd.randint(1, categories)}
+            print('\n  {}'.format(title))
+            for line in explain(conn, sql, params).splitlines():
+                print('      ' + line)
+
+            timings = []
+            for _ in range(runs):
+                params = {'user_id': rnd.randint(1, users),
+                          'category_id': rnd.randint(1, categories)}
+                start = time.perf_counter()
+                conn.execute(text(sql), params).fetchall()
+                timings.append((time.perf_counter() - start) * 1000.0)
+            print('    median: {:.3f} ms   max: {:.3f} ms'.format(
+                statistics.median(timings), max(timings)))
+
+
+def main():
+    """Parse arguments and run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=None,
+                        help='defaults to a temporary sqlite database')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--categories', type=int, default=5000)
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'bench_indexes.db')
+
+    class BenchmarkConfig(Config):
+        """Configuration for the benchmark"""
+        # pylint: disable=too-few-public-methods
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = database_url
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        engine = db.engine
+        print('Database: {}'.format(engine.url))
+
+        db.drop_all()
+        db.create_all()
+        Role.insert_roles()
+
+        start = time.perf_counter()
+        seed_catalog(engine, users=args.users, categories=args.categories,
+                     items=args.items)
+        print('Seeded {} users, {} categories and {} items in {:.1f} s'.format(
+            args.users, args.categories, args.items,
+            time.perf_counter() - start))
+
+        set_indexes(engine, create=False)
+        print('\n=== WITHOUT foreign key indexes ===')
+        measure(engine, args.users, args.categories, args.runs)
+
+        set_indexes(engine, create=True)
+        print('\n=== WITH foreign key indexes ===')
+        measure(engine, args.users, args.categories, args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Benchmark logins per second of one application worker process
+
+Simulates one threaded worker (eg. gunicorn --worker-class gthread) that serves
+email & password logins of the REST api (POST /api/v1/token) on a number of
+threads, with the password hashing:
+- inline: on the request thread (PASSWORD_HASH_WORKERS = 0)
+- pool:   in a pool of PASSWORD_HASH_WORKERS processes
+
+For each run, it also reports the latency of a cheap request (GET /api/v1/help
+with a token) that is served by the same worker during the burst of logins.
+
+Usage:
+    (venv) $ python -m benchmarks.bench_passwords --threads 8 --workers 4
+
+WARNING: all tables in the database are dropped and re-created.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from base64 import b64encode
+from config import Config
+from application import create_app
+from application.extensions import db
+from application.user import User, Role
+from application.passwords import password_hasher
+from application.seed import seed_catalog, DEFAULT_PASSWORD
+
+
+def basic_auth(email_or_token, password):
+    """Returns the headers for HTTP basic authentication"""
+    return {'Authorization': 'Basic ' + b64encode(
+        (email_or_token + ':' + password).encode('utf-8')).decode('utf-8')}
+
+
+def run(app, args, workers):
+    """Time args.logins logins on args.threads threads"""
+    password_hasher.shutdown()
+    password_hasher.workers = workers
+    emails = [usr.email for usr in User.query.filter(
+        User.email.like('seed-user%')).limit(args.threads)]
+    token = User.query.filter(User.email.like('seed-user%')).first(
+        ).generate_auth_token(3600)
+
+    def login(email, count):
+        """Log in count times"""
+        with app.test_client() as client:
+            for _ in range(count):
+                response = client.post('/api/v1/token',
+                                       headers=basic_auth(email,
+                                                          DEFAULT_PASSWORD))
+                assert response.status_code == 200
+
+    def probe(latencies, done):
+        """Measure the latency of a cheap request during the logins"""
+        with app.test_client() as client:
+            while not done.is_set():
+                start = time.perf_counter()
+                client.get('/api/v1/help', headers=basic_auth(token, ''))
+                latencies.append((time.perf_counter() - start) * 1000.0)
+                time.sleep(0.01)
+
+    # warm up the pool
+    login(emails[0], 1)
+
+    latencies = []
+    done = threading.Event()
+    prober = threading.Thread(target=probe, args=(latencies, done))
+    threads = [threading.Thread(target=login,
+                                args=(email, args.logins // args.threads))
+               for email in emails]
+    start = time.perf_counter()
+    prober.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    prober.join()
+
+    logins = len(threads) * (args.logins // args.threads)
+    print('  {:<8} {:8.1f} logins/s   cheap request median: {:7.1f} ms  '
+          'max: {:7.1f} ms'.format('pool' if workers else 'inline',
+                                   logins / elapsed,
+                                   statistics.median(latencies),
+                                   max(latencies)))
+
+
+def main():
+    """Parse arguments and run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8,
+                        help='request threads of the worker')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='processes of the password hashing pool')
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--method', default=Config.PASSWORD_HASH_METHOD)
+    args = parser.parse_args()
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(),
+                                               'bench_passwords.db')
+
+    class BenchmarkConfig(Config):
+        """Configuration for the benchmark"""
+        # pylint: disable=too-few-public-methods
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = database_url
+        PASSWORD_HASH_METHOD = args.method
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        Role.insert_roles()
+        seed_catalog(db.engine, users=args.threads, categories=0, items=0)
+        db.session.remove()
+
+        print('{} logins with {} on {} threads:'.format(
+            args.logins, password_hasher.method, args.threads))
+        run(app, args, 0)
+        run(app, args, args.workers)
+        password_hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark the compiled serializer of the lists of the REST api
+
+Times a page of items and a page of users, each dumped by:
+- schema:   the marshmallow-jsonapi schema, from ORM instances
+            (FAST_SERIALIZER = False)
+- compiled: the RowSerializer compiled from the schema, from rows
+
+both for the whole request, and for the dump of the page only.
+
+Usage:
+    (venv) $ python -m benchmarks.bench_serializer --items 5000 --size 500
+
+WARNING: all tables in the database are dropped and re-created.
+"""
+import argparse
+import os
+import tempfile
+import time
+from base64 import b64encode
+from config import Config
+from application import create_app
+from application.extensions import db
+from application.user import User, Role
+from application.catalog import Item
+from application.api.catalog import ItemSchema
+from application.api.serializer import compile_schema
+from application.seed import seed_catalog
+
+
+def timed(function, repeat):
+    """Returns the average milliseconds of a call of function"""
+    function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) * 1000.0 / repeat
+
+
+def report(label, schema, compiled):
+    """Print the timings of the schema and the compiled serializer"""
+    print('  {:<44} schema: {:7.1f} ms  compiled: {:7.1f} ms  {:5.1f}x'.format(
+        label, schema, compiled, schema / compiled))
+
+
+def time_requests(app, url, headers, repeat):
+    """Time GET url with the schema, and with the compiled serializer"""
+    with app.test_client() as client:
+        timings = []
+        for fast in (False, True):
+            app.config['FAST_SERIALIZER'] = fast
+            timings.append(timed(lambda: client.get(url, headers=headers),
+                                 repeat))
+    report(url, *timings)
+
+
+def time_dumps(app, size, repeat):
+    """Time the dump of a page of items only, without the query"""
+    serializer = compile_schema(ItemSchema, Item)
+    objects = Item.query.limit(size).all()
+    rows = db.session.query(*serializer.columns).limit(size).all()
+    with app.test_request_context('/api/v1/items/'):
+        schema = timed(lambda: ItemSchema(many=True).dump(objects), repeat)
+        compiled = timed(lambda: serializer.dump(rows), repeat)
+    report('dump of {} items'.format(size), schema, compiled)
+
+
+def main():
+    """Parse arguments and run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--size', type=int, default=500,
+                        help='page size')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(),
+                                               'bench_serializer.db')
+
+    class BenchmarkConfig(Config):
+        """Configuration for the benchmark"""
+        # pylint: disable=too-few-public-methods
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = database_url
+        INSTRUMENTATION_ENABLED = False
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        Role.insert_roles()
+        User.insert_default_users()
+        seed_catalog(db.engine, users=args.users, categories=20,
+                     items=args.items)
+        db.session.remove()
+
+        headers = {'Authorization': 'Basic ' + b64encode(
+            (app.config['ADMIN_EMAIL'] + ':' +
+             app.config['ADMIN_PW']).encode('utf-8')).decode('utf-8')}
+
+        print('{} items, {} users, pages of {}:'.format(
+            args.items, args.users, args.size))
+        time_requests(app, '/api/v1/items/?page[size]={}'.format(args.size),
+                      headers, args.repeat)
+        time_requests(app, '/api/v1/items/?page[cursor]=&page[size]={}'
+                      .format(args.size), headers, args.repeat)
+        time_requests(app, '/api/v1/users/?page[size]={}'.format(
+            min(args.size, args.users)), headers, args.repeat)
+        time_dumps(app, args.size, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -39,6 +39,17 @@ class Config(object):
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
 
+    # Emails are queued in an outbox, and sent by: $ flask mail-worker
+    # See application/email/outbox.py
+    MAIL_OUTBOX_BATCH_SIZE = int(
+        os.environ.get('MAIL_OUTBOX_BATCH_SIZE') or 50)
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(
+        os.environ.get('MAIL_OUTBOX_MAX_ATTEMPTS') or 8)
+    MAIL_OUTBOX_RETRY_DELAY = int(
+        os.environ.get('MAIL_OUTBOX_RETRY_DELAY') or 30)
+    MAIL_OUTBOX_MAX_RETRY_DELAY = int(
+        os.environ.get('MAIL_OUTBOX_MAX_RETRY_DELAY') or 3600)
+
     # In a new database, we initialize one ADMIN, one USERMANAGER and one USER
     ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL') or 'admin@example.com'
     ADMIN_PW = os.environ.get('ADMIN_PW') or 'not-so-good-password'
@@ -64,6 +75,65 @@ class Config(object):
         'sqlite:///' + os.path.join(BASE_DIR, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Optional file, shared by all worker processes, that is used to notify
+    # the processes when the cached list of categories must be reloaded
+    CATEGORY_CACHE_VERSION_FILE = os.environ.get('CATEGORY_CACHE_VERSION_FILE')
+
+    # Verified API tokens and the auth fields of their users are cached in the
+    # memory of each process. A change to a user (eg. blocked) is seen at once
+    # by the process that made it, and by the others within the TTL (seconds).
+    AUTH_TOKEN_CACHE_SIZE = int(
+        os.environ.get('AUTH_TOKEN_CACHE_SIZE') or 10000)
+    AUTH_IDENTITY_CACHE_SIZE = int(
+        os.environ.get('AUTH_IDENTITY_CACHE_SIZE') or 10000)
+    AUTH_IDENTITY_CACHE_TTL = int(
+        os.environ.get('AUTH_IDENTITY_CACHE_TTL') or 30)
+
+    # Passwords are hashed in a pool of PASSWORD_HASH_WORKERS processes, per
+    # application process. Hashes made with another method or salt length are
+    # upgraded when the user logs in. See application/passwords.py
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or \
+        'pbkdf2:sha256:50000'
+    PASSWORD_HASH_SALT_LENGTH = int(
+        os.environ.get('PASSWORD_HASH_SALT_LENGTH') or 8)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 1)
+    PASSWORD_HASH_MAX_PENDING = int(
+        os.environ.get('PASSWORD_HASH_MAX_PENDING') or 16)
+
+    # Per-request timing and SQL instrumentation. Requests that take longer
+    # than SLOW_REQUEST_THRESHOLD_MS are logged, with their slowest queries.
+    # See application/instrumentation.py
+    INSTRUMENTATION_ENABLED = \
+        os.environ.get('INSTRUMENTATION_ENABLED', 'True') == 'True'
+    INSTRUMENTATION_SLOWEST_QUERIES = int(
+        os.environ.get('INSTRUMENTATION_SLOWEST_QUERIES') or 5)
+    SLOW_REQUEST_THRESHOLD_MS = float(
+        os.environ.get('SLOW_REQUEST_THRESHOLD_MS') or 500)
+    SERVER_TIMING_HEADER = \
+        os.environ.get('SERVER_TIMING_HEADER', 'True') == 'True'
+
+    # Optional bearer token that Prometheus must send to scrape /metrics
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Number of results on a page of the catalog search
+    SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE') or 20)
+
+    # Number of names suggested while typing in the search box, and the
+    # seconds between reads of the change log, that catch up with the changes
+    # of other worker processes. See application/search/autocomplete.py
+    AUTOCOMPLETE_LIMIT = int(os.environ.get('AUTOCOMPLETE_LIMIT') or 10)
+    AUTOCOMPLETE_REFRESH_INTERVAL = float(
+        os.environ.get('AUTOCOMPLETE_REFRESH_INTERVAL') or 1)
+
+    # Dump the lists of the REST api without include with a serializer that
+    # is compiled from the schema. See application/api/serializer.py
+    FAST_SERIALIZER = os.environ.get('FAST_SERIALIZER', 'True') == 'True'
+
+    # The change feed (/api/v1/changes) only returns changes that are older
+    # than this many seconds, so it does not skip changes of transactions that
+    # commit out of order. See application/api/changes/views.py
+    CHANGE_FEED_DELAY = float(os.environ.get('CHANGE_FEED_DELAY') or 5)
+
     # Avoid DeprecationWarning: Request.is_xhr is deprecated.
     JSONIFY_PRETTYPRINT_REGULAR = False
 
@@ -85,6 +155,33 @@ class Config(object):
         DEFAULT_DEST)
     # UPLOADS_DEFAULT_URL = TODO!
 
+    # Square thumbnails of the profile pictures, made by a pool of
+    # THUMBNAIL_WORKERS processes. See application/thumbnails.py
+    THUMBNAIL_SIZES = (64, 128, 256)
+    THUMBNAIL_DEFAULT_SIZE = int(os.environ.get('THUMBNAIL_DEFAULT_SIZE') or
+                                 128)
+    THUMBNAIL_FORMATS = ('webp', 'jpeg')
+    THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY') or 80)
+    THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS') or 2)
+    # Uploads are stored once per content. `flask gc-blobs` removes the files
+    # that nobody refers to for BLOB_GC_GRACE seconds. See application/blobs
+    BLOB_GC_GRACE = int(os.environ.get('BLOB_GC_GRACE') or 3600)
+    # Uploads are served from /media/, cached for MEDIA_MAX_AGE seconds, and
+    # by the web server with MEDIA_OFFLOAD = x-accel-redirect or x-sendfile.
+    # See application/blobs/views.py
+    MEDIA_MAX_AGE = int(os.environ.get('MEDIA_MAX_AGE') or 365 * 24 * 3600)
+    MEDIA_LEGACY_MAX_AGE = int(os.environ.get('MEDIA_LEGACY_MAX_AGE') or 300)
+    MEDIA_OFFLOAD = os.environ.get('MEDIA_OFFLOAD')
+    MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX') or '/_media/'
+    # Uploaded images are checked while they are read, and kept in memory up
+    # to UPLOAD_SPOOL_SIZE bytes. See application/blobs/uploads.py
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or
+                             16 * 1024 * 1024)
+    UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES') or
+                           8 * 1024 * 1024)
+    UPLOAD_MAX_DIMENSION = int(os.environ.get('UPLOAD_MAX_DIMENSION') or 8000)
+    UPLOAD_SPOOL_SIZE = int(os.environ.get('UPLOAD_SPOOL_SIZE') or 64 * 1024)
+
     #################
     # Google OAUTH2 #
     #################
@@ -110,6 +207,19 @@ class TestConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite://'  # In memory database
 
+    # hash passwords on the calling thread, and cheaply
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    PASSWORD_HASH_WORKERS = 0
+
+    # return changes to the change feed right away
+    CHANGE_FEED_DELAY = 0
+
+    # make the thumbnails on the calling thread
+    THUMBNAIL_WORKERS = 0
+
+    # catch up with the change log on every autocomplete
+    AUTOCOMPLETE_REFRESH_INTERVAL = 0
+
     # turn CSRF off to enable unittesting of frontend without CSRF tokens
     CSRF_ENABLED = False
     WTF_CSRF_ENABLED = False
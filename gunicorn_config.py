@@ -0,0 +1,26 @@
+"""Configuration of gunicorn, for the Prometheus metrics of all workers
+
+    $ export prometheus_multiproc_dir=/tmp/catalog-metrics
+    $ gunicorn -c gunicorn_config.py catalog:app
+
+Each worker process keeps its metrics in a file in prometheus_multiproc_dir.
+The files of a previous run are removed when gunicorn starts.
+"""
+import glob
+import os
+
+
+def on_starting(unused_server):
+    """Start with empty metrics"""
+    path = os.environ.get('prometheus_multiproc_dir')
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for filename in glob.glob(os.path.join(path, '*.db')):
+            os.remove(filename)
+
+
+def child_exit(unused_server, worker):
+    """Keep the metrics of an exited worker out of the live gauges"""
+    if os.environ.get('prometheus_multiproc_dir'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,55 @@
+"""row versions
+
+Revision ID: 15bbce7b7475
+Revises: c13a7f8ad359
+Create Date: 2026-10-17 22:29:19.582773
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '15bbce7b7475'
+down_revision = 'c13a7f8ad359'
+branch_labels = None
+depends_on = None
+
+TABLES = ['categories', 'items', 'users']
+
+# See the cascade deletes migration
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(),
+                                       nullable=True))
+        op.add_column(table, sa.Column('version', sa.Integer(),
+                                       server_default='1', nullable=False))
+        op.create_index(op.f('ix_{}_updated_at'.format(table)), table,
+                        ['updated_at'], unique=False)
+
+    # Existing categories and items were last modified when they were created,
+    # as far as we know
+    op.execute('UPDATE categories SET updated_at = timestamp')
+    op.execute('UPDATE items SET updated_at = timestamp')
+    op.execute('UPDATE users SET updated_at = CURRENT_TIMESTAMP')
+
+
+def downgrade():
+    # SQLite re-creates the tables, see the cascade deletes migration
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        op.execute('PRAGMA foreign_keys=OFF')
+
+    for table in reversed(TABLES):
+        op.drop_index(op.f('ix_{}_updated_at'.format(table)),
+                      table_name=table)
+        with op.batch_alter_table(
+                table, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_column('version')
+            batch_op.drop_column('updated_at')
+
+    if sqlite:
+        op.execute('PRAGMA foreign_keys=ON')
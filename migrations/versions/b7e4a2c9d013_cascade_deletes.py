@@ -0,0 +1,58 @@
+"""cascade deletes
+
+Revision ID: b7e4a2c9d013
+Revises: 3f2b8c1d7a45
+Create Date: 2026-10-17 13:47:05.906112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4a2c9d013'
+down_revision = '3f2b8c1d7a45'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table) of the foreign keys that cascade deletes
+FOREIGN_KEYS = [('categories', 'user_id', 'users'),
+                ('items', 'user_id', 'users'),
+                ('items', 'category_id', 'categories')]
+
+# The initial migration created unnamed foreign keys. PostgreSQL names them
+# <table>_<column>_fkey, and with this naming convention the batch mode of
+# alembic gives the (re-created) SQLite tables the same names.
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def replace_foreign_keys(ondelete):
+    """Re-create the foreign keys with a new ON DELETE clause"""
+    # SQLite re-creates the tables, and dropping the old categories table must
+    # not be blocked by, or cascade into, the items that refer to it.
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        op.execute('PRAGMA foreign_keys=OFF')
+
+    for table in ('categories', 'items'):
+        with op.batch_alter_table(
+                table, naming_convention=NAMING_CONVENTION) as batch_op:
+            for table_, column, referred_table in FOREIGN_KEYS:
+                if table_ != table:
+                    continue
+                name = '{}_{}_fkey'.format(table, column)
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred_table,
+                                            [column], ['id'],
+                                            ondelete=ondelete)
+
+    if sqlite:
+        op.execute('PRAGMA foreign_keys=ON')
+
+
+def upgrade():
+    replace_foreign_keys(ondelete='CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(ondelete=None)
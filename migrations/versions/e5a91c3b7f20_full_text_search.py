@@ -0,0 +1,76 @@
+"""full-text search
+
+Revision ID: e5a91c3b7f20
+Revises: 00d28831acf1
+Create Date: 2026-10-17 23:12:41.305518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a91c3b7f20'
+down_revision = '00d28831acf1'
+branch_labels = None
+depends_on = None
+
+# See application/search/index.py
+ITEMS_TSVECTOR = ("(setweight(to_tsvector('english', coalesce(name, '')), "
+                  "'A') || setweight(to_tsvector('english', "
+                  "coalesce(description, '')), 'B'))")
+CATEGORIES_TSVECTOR = ("(setweight(to_tsvector('english', coalesce(name, '')),"
+                       " 'A'))")
+
+SQLITE_TABLES = [
+    ('items', 'items_search', ['name', 'description']),
+    ('categories', 'categories_search', ['name']),
+]
+
+
+def create_sqlite_index(table, fts_table, columns):
+    """Create the FTS5 table of table, its triggers, and index the rows"""
+    names = ', '.join(columns)
+    new = ', '.join('new.' + column for column in columns)
+    old = ', '.join('old.' + column for column in columns)
+    delete = ("INSERT INTO {0}({0}, rowid, {1}) "
+              "VALUES ('delete', old.id, {2}); ").format(fts_table, names, old)
+    insert = "INSERT INTO {}(rowid, {}) VALUES (new.id, {}); ".format(
+        fts_table, names, new)
+
+    op.execute("CREATE VIRTUAL TABLE {} USING fts5({}, content='{}', "
+               "content_rowid='id', tokenize='porter unicode61')".format(
+                   fts_table, names, table))
+    op.execute('CREATE TRIGGER {0}_insert AFTER INSERT ON {1} BEGIN {2}END'
+               .format(fts_table, table, insert))
+    op.execute('CREATE TRIGGER {0}_delete AFTER DELETE ON {1} BEGIN {2}END'
+               .format(fts_table, table, delete))
+    op.execute('CREATE TRIGGER {0}_update AFTER UPDATE OF {1} ON {2} '
+               'BEGIN {3}{4}END'.format(fts_table, names, table, delete,
+                                        insert))
+    op.execute("INSERT INTO {0}({0}) VALUES ('rebuild')".format(fts_table))
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for table, fts_table, columns in SQLITE_TABLES:
+            create_sqlite_index(table, fts_table, columns)
+    elif dialect == 'postgresql':
+        op.create_index('ix_items_search', 'items',
+                        [sa.text(ITEMS_TSVECTOR)], postgresql_using='gin')
+        op.create_index('ix_categories_search', 'categories',
+                        [sa.text(CATEGORIES_TSVECTOR)],
+                        postgresql_using='gin')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for _, fts_table, _ in SQLITE_TABLES:
+            for trigger in ('insert', 'delete', 'update'):
+                op.execute('DROP TRIGGER {}_{}'.format(fts_table, trigger))
+            op.execute('DROP TABLE {}'.format(fts_table))
+    elif dialect == 'postgresql':
+        op.drop_index('ix_categories_search', table_name='categories')
+        op.drop_index('ix_items_search', table_name='items')
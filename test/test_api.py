@@ -1,13 +1,19 @@
 """Unit tests for api"""
+import os
 import unittest
 import json
+from datetime import datetime
 from base64 import b64encode
 from test.utils import pprint_response
 from test.setup_and_teardown import my_setup, my_teardown
+from sqlalchemy import event
 from flask import current_app
 from flask_uploads import FileStorage
 from application.user import User, Role
+from application.catalog import Category, Item, category_cache
+from application.changes import Change
 from application.extensions import db
+from application.seed import seed_catalog
 
 
 
@@ -188,6 +194,51 @@ class APITestCase(unittest.TestCase):
         response = self.client().post(url, headers=headers)
         self.is_403_forbidden(response)
 
+    def test_0_7_token_cache(self):
+        """Test that token authentication is cached, and that changes to the
+        user are seen right away
+        """
+        usr = User(email='john@example.com', password='cat', confirmed=True)
+        db.session.add(usr)
+        db.session.commit()
+
+        url = '/api/v1/token'
+        headers = get_api_headers('john@example.com', 'cat')
+        response = self.client().post(url, headers=headers)
+        token = json.loads(response.get_data(as_text=True))['token']
+
+        statements = []
+
+        def count_statement(unused_conn, unused_cursor, statement, *args):
+            """Records the SQL statements being executed"""
+            # pylint: disable=unused-argument
+            statements.append(statement)
+
+        url = '/api/v1/categories/'
+        headers = get_api_headers(token, '')
+        self.is_200_ok(self.client().get(url, headers=headers))
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        try:
+            self.is_200_ok(self.client().get(url, headers=headers))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_statement)
+        # the auth fields of the user are the only thing read from roles
+        self.assertTrue(statements)
+        self.assertFalse([sql for sql in statements if 'roles' in sql])
+
+        # a change to the user invalidates the cached identity
+        usr.confirmed = False
+        db.session.commit()
+        self.is_403_forbidden(self.client().get(url, headers=headers))
+
+        usr.confirmed = True
+        db.session.commit()
+        self.is_200_ok(self.client().get(url, headers=headers))
+
+        # so does deleting the user
+        User.delete_account(usr)
+        self.is_401_unauthorized(self.client().get(url, headers=headers))
+
     def test_0_6_routes_info(self, print_routes=True):
         """As admin, Get all the available routes, for debug purposes"""
         url = '/api/v1/help'
@@ -435,6 +486,32 @@ class APITestCase(unittest.TestCase):
         self.assertFalse(usr.blocked)
         self.assertEqual(usr.failed_logins, 0)
 
+    def test_1_7_delete_user(self):
+        """Test that deleting a user also removes their categories from the
+        category cache
+        """
+        usr = User.query.filter_by(
+            email=current_app.config['USER_EMAIL']).one()
+        category_ids = [cat.id for cat in
+                        Category.query.filter_by(user_id=usr.id)]
+        self.assertTrue(category_ids)
+        self.assertEqual([cat.id for cat in category_cache.get()
+                          if cat.user_id == usr.id], category_ids)
+
+        headers = get_api_headers(current_app.config['ADMIN_EMAIL'],
+                                  current_app.config['ADMIN_PW'])
+        response = self.client().delete(
+            '/api/v1/users/{}'.format(usr.id), headers=headers)
+        self.is_200_ok(response)
+
+        self.assertEqual(Category.query.filter(
+            Category.id.in_(category_ids)).count(), 0)
+        self.assertEqual([cat for cat in category_cache.get()
+                          if cat.id in category_ids], [])
+        response = self.client().get(
+            '/catalog/categories/{}/items'.format(category_ids[0]))
+        self.assertEqual(response.status_code, 404)
+
     def test_2_0_get_users(self):
         """Test retrieval of all users, and verify permissions of admin,
         usermanager and user.
@@ -616,6 +693,358 @@ class APITestCase(unittest.TestCase):
         json_response = json.loads(response.get_data(as_text=True))
         self.assertEqual(json_response['meta']['count'], 20)
 
+    def get_all_pages(self, url, headers):
+        """Follows the next links of a keyset paginated collection and returns
+        the ids of all retrieved objects
+        """
+        ids = []
+        while url:
+            response = self.client().get(url, headers=headers)
+            self.is_200_ok(response)
+            json_response = json.loads(response.get_data(as_text=True))
+            self.assertLessEqual(len(json_response['data']), 7)
+            ids += [int(obj['id']) for obj in json_response['data']]
+            url = json_response['links'].get('next')
+        return ids
+
+    def test_4_4_get_items_keyset(self):
+        """Test keyset (cursor) pagination of items and categories"""
+        headers = get_api_headers(current_app.config['USER_EMAIL'],
+                                  current_app.config['USER_PW'])
+
+        ids = self.get_all_pages(
+            '/api/v1/items/?page[cursor]=&page[size]=7', headers)
+        self.assertEqual(ids, list(range(1, 41)))
+
+        ids = self.get_all_pages(
+            '/api/v1/categories/2/items/?page[cursor]=&page[size]=7', headers)
+        self.assertEqual(ids, list(range(21, 41)))
+
+        ids = self.get_all_pages(
+            '/api/v1/users/3/items/?page[cursor]=&page[size]=7', headers)
+        self.assertEqual(len(ids), 40)
+
+        ids = self.get_all_pages(
+            '/api/v1/categories/?page[cursor]=&page[size]=1', headers)
+        self.assertEqual(ids, [1, 2])
+
+    def test_4_5_get_items_keyset_errors(self):
+        """Test that a bad cursor or mixing pagination styles is rejected"""
+        headers = get_api_headers(current_app.config['USER_EMAIL'],
+                                  current_app.config['USER_PW'])
+
+        response = self.client().get('/api/v1/items/?page[cursor]=bad',
+                                     headers=headers)
+        self.is_400_bad_request(response)
+
+        response = self.client().get(
+            '/api/v1/items/?page[cursor]=&page[number]=2', headers=headers)
+        self.is_400_bad_request(response)
+
+    def test_4_6_conditional_get(self):
+        """Test that unchanged items and categories are answered with 304"""
+        headers = get_api_headers(current_app.config['USER_EMAIL'],
+                                  current_app.config['USER_PW'])
+
+        for url in ['/api/v1/items/', '/api/v1/items/21',
+                    '/api/v1/categories/', '/api/v1/categories/2',
+                    '/api/v1/categories/2/items/?page[size]=5']:
+            response = self.client().get(url, headers=headers)
+            self.is_200_ok(response)
+            etag = response.headers['ETag']
+
+            headers['If-None-Match'] = etag
+            response = self.client().get(url, headers=headers)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.headers['ETag'], etag)
+            self.assertEqual(response.data, b'')
+            del headers['If-None-Match']
+
+        # A new item changes the ETag of the lists it is in
+        url = '/api/v1/categories/2/items/'
+        response = self.client().get(url, headers=headers)
+        headers['If-None-Match'] = response.headers['ETag']
+        db.session.add(Item(name='New Beer', description='New', user_id=3,
+                            category_id=2))
+        db.session.commit()
+        response = self.client().get(url, headers=headers)
+        self.is_200_ok(response)
+        self.assertNotEqual(response.headers['ETag'], headers['If-None-Match'])
+
+        # An edit changes the ETag of the item
+        url = '/api/v1/items/21'
+        del headers['If-None-Match']
+        response = self.client().get(url, headers=headers)
+        headers['If-None-Match'] = response.headers['ETag']
+        Item.query.get(21).description = 'Changed'
+        db.session.commit()
+        self.is_200_ok(self.client().get(url, headers=headers))
+
+        # A missing category is still reported as such
+        response = self.client().get('/api/v1/categories/99/items/',
+                                     headers=headers)
+        self.is_404_not_found(response)
+
+    def test_4_7_optimistic_concurrency(self):
+        """Test that a PATCH of an outdated version is a 409 Conflict"""
+        headers = get_api_headers(current_app.config['USER_EMAIL'],
+                                  current_app.config['USER_PW'])
+
+        response = self.client().get('/api/v1/items/21', headers=headers)
+        self.is_200_ok(response)
+        attributes = json.loads(response.data)['data']['attributes']
+        self.assertEqual(attributes['version'], 1)
+
+        # The list ETag covers changes to existing items
+        response = self.client().get('/api/v1/items/', headers=headers)
+        list_etag = response.headers['ETag']
+
+        def patch(version):
+            """PATCH the description of item 21, edited from version"""
+            return self.client().patch('/api/v1/items/21', headers=headers,
+                                       data=json.dumps({'data': {
+                                           'type': 'item', 'id': '21',
+                                           'attributes': {
+                                               'description': 'Edited',
+                                               'version': version}}}))
+
+        response = patch(1)
+        self.is_200_ok(response)
+        attributes = json.loads(response.data)['data']['attributes']
+        self.assertEqual(attributes['version'], 2)
+        self.assertEqual(attributes['description'], 'Edited')
+
+        # Someone else already changed version 1
+        response = patch(1)
+        self.assertEqual(response.status_code, 409)
+        error = json.loads(response.data)['errors'][0]
+        self.assertEqual(error['title'], 'Conflict')
+        self.assertEqual(Item.query.get(21).version, 2)
+
+        response = self.client().get(
+            '/api/v1/items/', headers=dict(headers,
+                                           **{'If-None-Match': list_etag}))
+        self.is_200_ok(response)
+
+        # Last-Modified of a detail resource
+        response = self.client().get('/api/v1/items/21', headers=headers)
+        self.assertIn('Last-Modified', response.headers)
+        response = self.client().get(
+            '/api/v1/items/21', headers=dict(
+                headers, **{'If-Modified-Since':
+                            response.headers['Last-Modified']}))
+        self.assertEqual(response.status_code, 304)
+
+    def test_4_8_change_feed(self):
+        """Test reading the change feed page by page"""
+        headers = get_api_headers(current_app.config['USER_EMAIL'],
+                                  current_app.config['USER_PW'])
+
+        def get_page(url):
+            """Returns the json of a page of the feed"""
+            response = self.client().get(url, headers=headers)
+            self.is_200_ok(response)
+            return json.loads(response.data)
+
+        # All categories, items and users were logged when they were added
+        url = '/api/v1/changes?since=0&page[size]=20'
+        changes = []
+        while True:
+            page = get_page(url)
+            changes.extend(page['data'])
+            url = page['links']['next']
+            if not page['meta']['has_more']:
+                break
+        self.assertEqual([int(change['id']) for change in changes],
+                         list(range(1, Change.query.count() + 1)))
+        inserts = set((change['attributes']['resource_type'],
+                       change['attributes']['resource_id'])
+                      for change in changes
+                      if change['attributes']['operation'] == 'insert')
+        self.assertEqual(len(inserts), 3 + 2 + 40)
+
+        # The next link of the last page returns the new changes
+        self.assertEqual(get_page(url)['data'], [])
+        Item.query.get(21).description = 'Changed'
+        db.session.commit()
+        page = get_page(url)
+        self.assertEqual(len(page['data']), 1)
+        self.assertEqual(page['data'][0]['attributes'], {
+            'timestamp': page['data'][0]['attributes']['timestamp'],
+            'resource_type': 'item', 'resource_id': '21',
+            'operation': 'update', 'version': 2})
+
+        page = get_page('/api/v1/changes?filter[resource_type]=category')
+        self.assertEqual(len(page['data']), 2)
+
+        response = self.client().get('/api/v1/changes?since=x',
+                                     headers=headers)
+        self.is_400_bad_request(response)
+
+    def test_4_9_atomic_operations(self):
+        """Test running several operations in one transaction"""
+        headers = get_api_headers(current_app.config['USER_EMAIL'],
+                                  current_app.config['USER_PW'])
+        headers['Content-Type'] = ('application/vnd.api+json; '
+                                   'ext="https://jsonapi.org/ext/atomic"')
+        url = '/api/v1/operations'
+        items = Item.query.count()
+
+        def item_in(lid, name):
+            """Returns the operation that adds an item to category lid"""
+            return {'op': 'add',
+                    'data': {'type': 'item',
+                             'attributes': {'name': name,
+                                            'description': 'Atomic'},
+                             'relationships': {'category': {'data': {
+                                 'type': 'category', 'lid': lid}}}}}
+
+        data = {'atomic:operations': [
+            {'op': 'add', 'data': {'type': 'category', 'lid': 'sour',
+                                   'attributes': {'name': 'Sour Ale'}}},
+            item_in('sour', 'Gose'),
+            item_in('sour', 'Berliner Weisse'),
+            {'op': 'update', 'data': {'type': 'item', 'id': '21',
+                                      'attributes': {'description': 'Sweet',
+                                                     'version': 1}}},
+            {'op': 'remove', 'ref': {'type': 'item', 'id': '22'}},
+        ]}
+        response = self.client().post(url, headers=headers,
+                                      data=json.dumps(data))
+        self.is_200_ok(response)
+        self.assertIn('ext=', response.headers['Content-Type'])
+        results = json.loads(response.data)['atomic:results']
+        self.assertEqual([result.get('data', {}).get('type')
+                          for result in results],
+                         ['category', 'item', 'item', 'item', None])
+        category = Category.query.filter_by(name='Sour Ale').one()
+        self.assertEqual(category.user.email,
+                         current_app.config['USER_EMAIL'])
+        self.assertEqual(Item.query.filter_by(category_id=category.id).count(),
+                         2)
+        self.assertEqual(results[3]['data']['attributes']['version'], 2)
+        self.assertEqual(Item.query.count(), items + 1)
+
+        # A failing operation rolls back the ones before it
+        data = {'atomic:operations': [
+            {'op': 'add', 'data': {'type': 'category', 'lid': 'wild',
+                                   'attributes': {'name': 'Wild Ale'}}},
+            item_in('wild', 'Lambic'),
+            {'op': 'update', 'data': {'type': 'item', 'id': '21',
+                                      'attributes': {'description': 'Stale',
+                                                     'version': 1}}},
+        ]}
+        response = self.client().post(url, headers=headers,
+                                      data=json.dumps(data))
+        self.assertEqual(response.status_code, 409)
+        error = json.loads(response.data)['errors'][0]
+        self.assertEqual(error['source']['pointer'],
+                         '/atomic:operations/2/data/attributes/version')
+        self.assertEqual(Category.query.filter_by(name='Wild Ale').count(), 0)
+        self.assertEqual(Item.query.filter_by(name='Lambic').count(), 0)
+
+        for operation, status_code in [
+                ({'op': 'add', 'data': {'type': 'user'}}, 400),
+                ({'op': 'update', 'ref': [1], 'data': {
+                    'type': 'item', 'id': '21'}}, 400),
+                (item_in('unknown', 'No Category'), 400),
+                ({'op': 'remove', 'ref': {'type': 'item', 'id': '999'}}, 404),
+                ({'op': 'add', 'data': {'type': 'category', 'attributes': {
+                    'name': 'Sour Ale'}}}, 409)]:
+            response = self.client().post(url, headers=headers,
+                                          data=json.dumps({
+                                              'atomic:operations': [operation]
+                                          }))
+            self.assertEqual(response.status_code, status_code,
+                             response.data)
+            self.assertEqual(
+                json.loads(response.data)['errors'][0]['source']['pointer'][
+                    :len('/atomic:operations/0')], '/atomic:operations/0')
+
+        for body in ['[1]', '"operations"', '{}', 'no json']:
+            response = self.client().post(url, headers=headers, data=body)
+            self.is_400_bad_request(response)
+            self.assertEqual(
+                json.loads(response.data)['errors'][0]['source']['pointer'],
+                '/atomic:operations')
+
+    def test_4_10_eager_loading(self):
+        """Test that the queries of a list do not grow with the page size"""
+        seed_catalog(db.engine, users=10, categories=5, items=100)
+        headers = get_api_headers(current_app.config['USER_EMAIL'],
+                                  current_app.config['USER_PW'])
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            """Remember the statements sent to the database"""
+            # pylint: disable=unused-argument
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        self.addCleanup(event.remove, db.engine, 'before_cursor_execute',
+                        count)
+
+        for query in ['include=user',
+                      'include=user.categories&fields[item]=name,user'
+                      '&fields[user]=first_name,categories',
+                      'fields[item]=name']:
+            counts = []
+            for size in (10, 100):
+                del statements[:]
+                response = self.client().get(
+                    '/api/v1/items/?{}&page[size]={}'.format(query, size),
+                    headers=headers)
+                self.is_200_ok(response)
+                self.assertEqual(len(json.loads(response.data)['data']),
+                                 size)
+                counts.append(len(statements))
+            self.assertEqual(counts[0], counts[1], query)
+
+        # only the columns of the requested fields are loaded for the page
+        self.assertFalse([statement for statement in statements
+                          if 'items.description' in statement and
+                          not statement.startswith('SELECT count')])
+
+        response = self.client().get('/api/v1/items/?include=name',
+                                     headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_4_11_compiled_serializer(self):
+        """Test that the compiled serializer dumps the lists byte for byte
+        like the schemas, against the golden files in test/golden
+        """
+        # Fixed times, so that the documents are always the same
+        for model in (Category, Item):
+            db.session.execute(model.__table__.update().values(
+                timestamp=datetime(2018, 4, 1, 12, 30),
+                updated_at=datetime(2018, 4, 1, 12, 30, 15, 250000)))
+        db.session.execute(User.__table__.update().values(
+            updated_at=datetime(2018, 4, 1, 12, 30)))
+        db.session.commit()
+
+        headers = get_api_headers(current_app.config['ADMIN_EMAIL'],
+                                  current_app.config['ADMIN_PW'])
+        for golden, url in [
+                ('item_list.json', '/api/v1/items/?page[size]=3'),
+                ('category_list.json', '/api/v1/categories/?page[cursor]='
+                                       '&page[size]=1'
+                                       '&fields[category]=name,user'),
+                ('user_list.json', '/api/v1/users/')]:
+            with open(os.path.join(os.path.dirname(__file__), 'golden',
+                                   golden), 'rb') as file:
+                expected = file.read()
+            for fast in (True, False):
+                current_app.config['FAST_SERIALIZER'] = fast
+                response = self.client().get(url, headers=headers)
+                self.is_200_ok(response)
+                self.assertEqual(response.data, expected, (golden, fast))
+
+        # Lists with include are dumped by the schemas
+        response = self.client().get('/api/v1/items/?include=user',
+                                     headers=headers)
+        self.is_200_ok(response)
+        self.assertIn('included', json.loads(response.data))
+
     def test_10_0_post_user(self):
         """Test registration of a new user via a POST request."""
         # Register a new user via POST command
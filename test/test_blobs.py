@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Unit tests for the content-addressed storage of the uploaded files"""
+import os
+import time
+import unittest
+from test.setup_and_teardown import my_setup, my_teardown
+from test.test_thumbnails import image_file, remove_picture
+from click.testing import CliRunner
+from flask import current_app
+from flask.cli import ScriptInfo
+from flask_uploads import FileStorage, UploadNotAllowed
+from application.blobs import Blob, collect_garbage, is_blob_filename, \
+    save_upload
+from application.extensions import db, images
+from application.thumbnails import thumbnailer
+from application.user import User
+
+
+class BlobsTestCase(unittest.TestCase):
+    """Unit tests for the blob store"""
+    def setUp(self):
+        my_setup(self)
+
+    def tearDown(self):
+        my_teardown(self)
+
+    def add_user(self, email, filename, content):
+        """Add a user with a profile picture of content"""
+        usr = User(email=email, password='cat')
+        with current_app.test_request_context():
+            usr.profile_pic = FileStorage(content, filename=filename)
+        db.session.add(usr)
+        db.session.commit()
+        self.addCleanup(remove_picture, images.path(usr.profile_pic_filename))
+        return usr
+
+    def test_0_0_deduplication(self):
+        """Test that the same picture is stored once"""
+        content = image_file((300, 200)).read()
+        first = self.add_user('john@example.com', 'a.jpg',
+                              image_file((300, 200)))
+        second = self.add_user('jane@example.com', 'b.jpeg',
+                               image_file((300, 200)))
+
+        self.assertTrue(is_blob_filename(first.profile_pic_filename))
+        self.assertEqual(first.profile_pic_filename,
+                         second.profile_pic_filename)
+        blob = Blob.query.one()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(blob.size, len(content))
+        with open(images.path(blob.filename), 'rb') as file:
+            self.assertEqual(file.read(), content)
+        self.assertIsNotNone(thumbnailer.find(images.path(blob.filename)))
+        self.assertEqual(os.listdir(os.path.join(
+            images.config.destination, 'tmp')), [])
+
+        with self.assertRaises(UploadNotAllowed):
+            save_upload(FileStorage(image_file((10, 10)),
+                                    filename='script.sh'))
+
+    def test_0_1_garbage_collection(self):
+        """Test that a picture is removed once nobody refers to it"""
+        first = self.add_user('john@example.com', 'a.jpg',
+                              image_file((300, 200)))
+        second = self.add_user('jane@example.com', 'b.jpg',
+                               image_file((300, 200)))
+        path = images.path(first.profile_pic_filename)
+
+        with current_app.test_request_context():
+            first.profile_pic = FileStorage(image_file((50, 50)),
+                                            filename='c.jpg')
+        db.session.commit()
+        self.addCleanup(remove_picture,
+                        images.path(first.profile_pic_filename))
+        self.assertEqual(collect_garbage(grace=0).blobs, 0)
+        self.assertTrue(os.path.exists(path))
+
+        # nothing is released when the deletion is rolled back
+        db.session.delete(second)
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(Blob.query.get(os.path.basename(path)[:64])
+                         .ref_count, 1)
+
+        User.delete_account(second)
+        self.assertEqual(Blob.query.get(os.path.basename(path)[:64])
+                         .ref_count, 0)
+
+        # kept for the grace period
+        self.assertEqual(collect_garbage(grace=3600).blobs, 0)
+        self.assertTrue(os.path.exists(path))
+
+        result = collect_garbage(grace=0)
+        self.assertEqual(result.blobs, 1)
+        self.assertEqual(result.files, 1 + len(thumbnailer.sizes) *
+                         len(thumbnailer.formats))
+        self.assertGreater(result.bytes, 0)
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNone(thumbnailer.find(path))
+        self.assertEqual(Blob.query.count(), 1)
+
+    def test_0_2_orphans(self):
+        """Test that files without a blob are removed after the grace
+        period"""
+        usr = self.add_user('john@example.com', 'a.jpg',
+                            image_file((300, 200)))
+        directory = os.path.dirname(images.path(usr.profile_pic_filename))
+        sha256 = os.path.basename(directory) * 32
+        orphans = [os.path.join(directory, sha256 + '.jpg'),
+                   os.path.join(directory, sha256 + '.jpg.64.jpg'),
+                   os.path.join(images.config.destination, 'tmp',
+                                'x.upload')]
+        for path in orphans:
+            self.addCleanup(remove_picture, path)
+            with open(path, 'wb') as file:
+                file.write(b'orphan')
+
+        self.assertEqual(collect_garbage(grace=3600).files, 0)
+        old = time.time() - 7200
+        for path in orphans + os.listdir(directory):
+            path = os.path.join(directory, path)
+            os.utime(path, (old, old))
+
+        result = collect_garbage(grace=3600)
+        self.assertEqual((result.blobs, result.files, result.bytes),
+                         (0, 3, 18))
+        self.assertTrue(os.path.exists(images.path(
+            usr.profile_pic_filename)))
+        self.assertIsNotNone(thumbnailer.find(images.path(
+            usr.profile_pic_filename)))
+
+    def test_1_0_cli(self):
+        """Test the flask gc-blobs command"""
+        usr = self.add_user('john@example.com', 'a.jpg',
+                            image_file((300, 200)))
+        path = images.path(usr.profile_pic_filename)
+        User.delete_account(usr)
+
+        result = CliRunner().invoke(
+            current_app.cli.commands['gc-blobs'], ['--grace', '0'],
+            obj=ScriptInfo(create_app=lambda info: current_app))
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(Blob.query.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
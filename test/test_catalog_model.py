@@ -2,6 +2,7 @@
 """Unit tests for catalog blueprint"""
 import unittest
 from test.setup_and_teardown import my_setup, my_teardown
+from sqlalchemy.orm.exc import StaleDataError
 from application.user import User
 from application.catalog import Category, Item
 from application.extensions import db
@@ -35,6 +36,36 @@ class ItemModelTestCase(unittest.TestCase):
         self.assertEqual(itm.category_id, cat.id)
         self.assertTrue(itm.timestamp)
 
+    def test_0_1_delete_category(self):
+        """Test that deleting a category deletes all it's items"""
+        cat = Category.query.get(1)
+        db.session.delete(cat)
+        db.session.commit()
+
+        self.assertEqual(Item.query.filter_by(category_id=1).count(), 0)
+        self.assertEqual(Item.query.count(), 20)
+
+    def test_0_2_version(self):
+        """Test that updates increment the version and set updated_at"""
+        itm = Item.query.get(1)
+        self.assertEqual(itm.version, 1)
+        created = itm.updated_at
+
+        itm.description = 'Changed'
+        db.session.commit()
+        self.assertEqual(itm.version, 2)
+        self.assertGreater(itm.updated_at, created)
+
+        # Another transaction updates the item after it was loaded
+        with db.engine.begin() as conn:
+            conn.execute(Item.__table__.update().where(
+                Item.id == 1).values(version=3))
+        itm.description = 'Lost update'
+        with self.assertRaises(StaleDataError):
+            db.session.commit()
+        db.session.rollback()
+        self.assertEqual(Item.query.get(1).description, 'Changed')
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
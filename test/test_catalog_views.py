@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Unit tests for the views of the catalog blueprint"""
+import os
+import tempfile
+import unittest
+from test.setup_and_teardown import my_setup, my_teardown
+from flask import current_app
+from sqlalchemy import event
+from application.user import User
+from application.catalog import Category, Item, category_cache
+from application.changes import Change
+from application.extensions import db
+
+
+class CatalogViewsTestCase(unittest.TestCase):
+    """Unit tests for the HTML pages of the catalog"""
+    def setUp(self):
+        my_setup(self)
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     self.count_statement)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute',
+                     self.count_statement)
+        my_teardown(self)
+
+    def count_statement(self, conn, cursor, statement, *unused_args):
+        """Event listener that records the SQL statements being executed"""
+        # pylint: disable=unused-argument
+        self.statements.append(statement)
+
+    def get_query_count(self, url):
+        """Returns the number of SQL statements needed to serve url"""
+        del self.statements[:]
+        response = self.client().get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(self.statements)
+
+    def add_items(self, category_id, count):
+        """Add count items to the category with category_id"""
+        usr = User.query.first()
+        for i in range(count):
+            db.session.add(Item(name='Extra Beer {}'.format(i),
+                                description='Extra description',
+                                user_id=usr.id,
+                                category_id=category_id))
+        db.session.commit()
+        db.session.remove()
+
+    def test_0_0_category_items(self):
+        """Test that the items page of a category renders"""
+        response = self.client().get('/catalog/categories/1/items')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Fat Tire Amber Ale', response.data)
+
+        response = self.client().get('/catalog/categories/99/items')
+        self.assertEqual(response.status_code, 404)
+
+    def test_0_1_category_item(self):
+        """Test that the page of an item renders"""
+        response = self.client().get('/catalog/categories/1/items/2/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Made by Tr\xc3\xb6egs Brewing Company', response.data)
+
+        response = self.client().get('/catalog/categories/1/items/999/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_1_0_category_items_query_count(self):
+        """Test that the number of queries does not grow with page content"""
+        url = '/catalog/categories/1/items'
+        self.get_query_count(url)  # warm up the category cache
+        query_count = self.get_query_count(url)
+        self.assertLessEqual(query_count, 2)
+
+        self.add_items(1, 25)
+        self.assertEqual(self.get_query_count(url), query_count)
+
+    def test_1_1_category_item_query_count(self):
+        """Test that the number of queries does not grow with page content"""
+        url = '/catalog/categories/1/items/3/'
+        self.get_query_count(url)  # warm up the category cache
+        query_count = self.get_query_count(url)
+        self.assertLessEqual(query_count, 2)
+
+        self.add_items(1, 25)
+        self.assertEqual(self.get_query_count(url), query_count)
+
+    def test_1_2_sidebar_is_cached(self):
+        """Test that a warm category cache does not query the categories"""
+        url = '/catalog/categories/1/items/3/'
+        self.get_query_count(url)
+        self.get_query_count(url)
+        self.assertFalse([sql for sql in self.statements
+                          if 'FROM categories' in sql])
+
+    def test_1_3_conditional_get(self):
+        """Test that an unchanged items page is answered with 304"""
+        url = '/catalog/categories/1/items'
+        response = self.client().get(url)
+        etag = response.headers['ETag']
+
+        headers = {'If-None-Match': etag}
+        del self.statements[:]
+        response = self.client().get(url, headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(self.statements), 1)
+
+        self.add_items(1, 1)
+        response = self.client().get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+        # The ETag depends on the URL
+        headers = {'If-None-Match': response.headers['ETag']}
+        response = self.client().get('/catalog/categories/2/items',
+                                     headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+    def test_1_4_edit_item_conflict(self):
+        """Test that an item edited by someone else is not overwritten"""
+        current_app.config['WTF_CSRF_ENABLED'] = False
+        with self.client() as client:
+            client.post('/login', data={
+                'email': current_app.config['USER_EMAIL'],
+                'password': current_app.config['USER_PW']})
+
+            url = '/catalog/categories/1/items/1/edit'
+            data = {'name': 'Fat Tire Amber Ale', 'description': 'Mine',
+                    'version': '1'}
+            response = client.post(url, data=data)
+            self.assertEqual(response.status_code, 302)
+            self.assertIn('/catalog/categories/1/items/1/',
+                          response.headers['Location'])
+            self.assertEqual(Item.query.get(1).description, 'Mine')
+
+            data['description'] = 'Theirs'
+            response = client.post(url, data=data)
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response.headers['Location'].endswith(url))
+            db.session.remove()
+            self.assertEqual(Item.query.get(1).description, 'Mine')
+
+            response = client.get(url)
+            self.assertIn(b'changed by someone else', response.data)
+            self.assertIn(b'name="version" type="hidden" value="2"',
+                          response.data)
+
+    def test_1_5_delete_category(self):
+        """Test that the items deleted with a category get tombstones"""
+        current_app.config['WTF_CSRF_ENABLED'] = False
+        since = db.session.query(db.func.max(Change.id)).scalar()
+        usr = User.query.filter_by(
+            email=current_app.config['USER_EMAIL']).one()
+        cat = Category.query.filter_by(user_id=usr.id).first()
+        item_ids = sorted(itm.id for itm in cat.items)
+        self.assertEqual(len(item_ids), 20)
+
+        with self.client() as client:
+            client.post('/login', data={
+                'email': current_app.config['USER_EMAIL'],
+                'password': current_app.config['USER_PW']})
+            response = client.get(
+                '/catalog/categories/{}/delete'.format(cat.id))
+            self.assertEqual(response.status_code, 302)
+
+        changes = [(change.resource_type, change.resource_id)
+                   for change in Change.query.filter(Change.id > since)]
+        self.assertEqual(len(changes), 21)
+        self.assertIn(('category', cat.id), changes)
+        self.assertEqual(sorted(resource_id for resource_type, resource_id
+                                in changes if resource_type == 'item'),
+                         item_ids)
+
+    def test_2_0_cache_invalidation(self):
+        """Test that the category cache is invalidated by changes"""
+        usr = User.query.first()
+        names = [cat.name for cat in category_cache.get()]
+        self.assertEqual(names, ['American Amber / Red Ale',
+                                 'American Barleywine'])
+
+        cat = Category(name='Stout', user_id=usr.id)
+        db.session.add(cat)
+        db.session.commit()
+        self.assertEqual(category_cache.get()[-1].name, 'Stout')
+
+        cat.name = 'Imperial Stout'
+        db.session.commit()
+        self.assertEqual(category_cache.find(cat.id).name, 'Imperial Stout')
+
+        db.session.delete(cat)
+        db.session.commit()
+        self.assertEqual(len(category_cache.get()), 2)
+
+    def test_2_1_cache_rollback(self):
+        """Test that a rolled back change does not stay in the cache"""
+        usr = User.query.first()
+        db.session.add(Category(name='Porter', user_id=usr.id))
+        db.session.flush()
+        self.assertEqual(category_cache.get()[-1].name, 'Porter')
+
+        db.session.rollback()
+        self.assertEqual(len(category_cache.get()), 2)
+
+    def test_2_2_cache_version_file(self):
+        """Test that other processes are notified via the version file"""
+        version_file = os.path.join(tempfile.mkdtemp(), 'categories.version')
+        category_cache.version_file = version_file
+        try:
+            category_cache.get()
+            self.assertFalse(os.path.exists(version_file))
+
+            # A change made by another process writes a new version token
+            with open(version_file, 'w') as file:
+                file.write('changed by another process')
+            del self.statements[:]
+            category_cache.get()
+            self.assertTrue([sql for sql in self.statements
+                             if 'FROM categories' in sql])
+
+            # A change made by this process writes a new version token too
+            category_cache.invalidate()
+            with open(version_file) as file:
+                self.assertNotEqual(file.read(), 'changed by another process')
+        finally:
+            category_cache.version_file = None
+            os.remove(version_file)
+            os.rmdir(os.path.dirname(version_file))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
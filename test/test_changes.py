@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Unit tests for the change log"""
+import unittest
+from test.setup_and_teardown import my_setup, my_teardown
+from application.user import User
+from application.catalog import Category, Item
+from application.changes import Change
+from application.extensions import db
+
+
+class ChangeLogTestCase(unittest.TestCase):
+    """Unit tests for the change log of categories, items and users"""
+    def setUp(self):
+        my_setup(self)
+        self.since = db.session.query(db.func.max(Change.id)).scalar()
+
+    def tearDown(self):
+        my_teardown(self)
+
+    def new_changes(self):
+        """Returns (operation, resource_type, resource_id, version) of the
+        changes logged since setUp
+        """
+        return [(change.operation, change.resource_type, change.resource_id,
+                 change.version)
+                for change in Change.query.filter(
+                    Change.id > self.since).order_by(Change.id)]
+
+    def test_0_0_insert_update_delete(self):
+        """Test that every insert, update and delete is logged"""
+        self.assertEqual(Change.query.filter_by(resource_type='item').count(),
+                         Item.query.count())
+
+        itm = Item(name='New Beer', description='New', user_id=3,
+                   category_id=1)
+        db.session.add(itm)
+        db.session.commit()
+
+        itm.description = 'Changed'
+        db.session.commit()
+
+        # No change, no update
+        self.assertEqual(itm.description, 'Changed')
+        itm.description = 'Changed'
+        db.session.commit()
+
+        db.session.delete(itm)
+        db.session.commit()
+
+        self.assertEqual(self.new_changes(), [
+            ('insert', 'item', itm.id, 1),
+            ('update', 'item', itm.id, 2),
+            ('delete', 'item', itm.id, None)])
+
+    def test_0_1_rollback(self):
+        """Test that changes that are rolled back are not logged"""
+        Item.query.get(1).description = 'Changed'
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(self.new_changes(), [])
+
+    def test_0_2_cascaded_deletes(self):
+        """Test that the items deleted with their category get tombstones"""
+        db.session.delete(Item.query.get(1))
+        db.session.delete(Category.query.get(1))
+        db.session.commit()
+
+        changes = self.new_changes()
+        self.assertEqual(len(changes), 21)
+        self.assertEqual(sorted(resource_id for _, resource_type, resource_id,
+                                _ in changes if resource_type == 'item'),
+                         list(range(1, 21)))
+        self.assertEqual(set(operation for operation, _, _, _ in changes),
+                         {'delete'})
+        self.assertIn(('delete', 'category', 1, None), changes)
+
+    def test_0_3_delete_account(self):
+        """Test that the bulk deletes of an account get tombstones"""
+        User.delete_account(User.query.get(3))
+
+        changes = self.new_changes()
+        self.assertEqual(changes.count(('delete', 'user', 3, None)), 1)
+        self.assertEqual(len([change for change in changes
+                              if change[1] == 'category']), 2)
+        self.assertEqual(len([change for change in changes
+                              if change[1] == 'item']), 40)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
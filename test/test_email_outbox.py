@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Unit tests for the email outbox and the mail worker"""
+import smtplib
+import unittest
+from datetime import datetime
+from test.utils import DebuggingSMTPServer
+from test.setup_and_teardown import my_setup, my_teardown
+from flask import current_app
+from application.email import OutboxMessage, drain_outbox
+from application.email.outbox import send_batch
+from application.email.utils import send_email
+from application.extensions import db, mail
+
+
+class EmailOutboxTestCase(unittest.TestCase):
+    """Unit tests for the email outbox"""
+    def setUp(self):
+        my_setup(self)
+        self.smtp_server = DebuggingSMTPServer()
+        state = current_app.extensions['mail']
+        state.server = 'localhost'
+        state.port = self.smtp_server.port
+        state.suppress = False
+
+    def tearDown(self):
+        self.smtp_server.shutdown()
+        my_teardown(self)
+
+    def test_0_0_send_email_only_enqueues(self):
+        """Test that send_email stores the email, without sending it"""
+        with mail.record_messages() as outbox:
+            send_email('Hello', ['john@example.com'], '<p>Hello</p>')
+            self.assertEqual(outbox, [])
+        self.assertEqual(self.smtp_server.connections, 0)
+
+        message = OutboxMessage.query.one()
+        self.assertEqual(message.recipients, ['john@example.com'])
+        self.assertEqual(message.attempts, 0)
+
+    def test_0_1_drain_outbox(self):
+        """Test that all emails are sent over one SMTP connection"""
+        current_app.config['MAIL_OUTBOX_BATCH_SIZE'] = 2
+        for i in range(5):
+            send_email('Hello {}'.format(i), ['user{}@example.com'.format(i)],
+                       '<p>Hello</p>')
+
+        with mail.record_messages() as outbox:
+            self.assertEqual(drain_outbox(), 5)
+            self.assertEqual([msg.subject for msg in outbox],
+                             ['Hello {}'.format(i) for i in range(5)])
+
+        self.assertEqual(self.smtp_server.connections, 1)
+        self.assertEqual(len(self.smtp_server.messages), 5)
+        self.assertEqual(self.smtp_server.messages[0][0],
+                         ['user0@example.com'])
+        self.assertEqual(OutboxMessage.query.count(), 0)
+
+        # Nothing is due, so no connection is made
+        self.assertEqual(drain_outbox(), 0)
+        self.assertEqual(self.smtp_server.connections, 1)
+
+    def test_0_2_retry_with_backoff(self):
+        """Test that a failed email is retried later, and finally given up"""
+        current_app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = 2
+        send_email('Rejected', ['reject@example.com'], '<p>Hello</p>')
+        send_email('Accepted', ['john@example.com'], '<p>Hello</p>')
+
+        self.assertEqual(drain_outbox(), 1)
+        message = OutboxMessage.query.one()
+        self.assertEqual(message.attempts, 1)
+        self.assertIn('SMTPRecipientsRefused', message.last_error)
+        self.assertGreater(message.next_attempt_at, datetime.utcnow())
+        self.assertIsNone(message.failed_at)
+
+        # Not due yet
+        self.assertEqual(drain_outbox(), 0)
+        self.assertEqual(message.attempts, 1)
+
+        message.next_attempt_at = datetime.utcnow()
+        self.assertEqual(drain_outbox(), 0)
+        self.assertEqual(message.attempts, 2)
+        self.assertIsNotNone(message.failed_at)
+
+    def test_0_3_smtp_server_down(self):
+        """Test that the outbox is kept when the SMTP server is down"""
+        send_email('Hello', ['john@example.com'], '<p>Hello</p>')
+        self.smtp_server.shutdown()
+
+        with self.assertRaises((ConnectionError, smtplib.SMTPException)):
+            drain_outbox()
+        message = OutboxMessage.query.one()
+        self.assertEqual(message.attempts, 0)
+
+    def test_0_4_connection_lost(self):
+        """Test that the messages sent before a lost connection are
+        committed, and the rest is kept
+        """
+        for i in range(3):
+            send_email('Hello {}'.format(i), ['user{}@example.com'.format(i)],
+                       '<p>Hello</p>')
+
+        class Connection(object):
+            """SMTP connection that is lost at the second message"""
+            # pylint: disable=too-few-public-methods
+            sent = []
+
+            def send(self, message):
+                """Send message, or raise when it is the second"""
+                if len(self.sent) == 1:
+                    raise smtplib.SMTPServerDisconnected('Lost')
+                self.sent.append(message)
+
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            send_batch(Connection(), OutboxMessage.query.order_by(
+                OutboxMessage.id).all())
+        db.session.rollback()
+        self.assertEqual([(msg.subject, msg.attempts) for msg in
+                          OutboxMessage.query.order_by(OutboxMessage.id)],
+                         [('Hello 1', 1), ('Hello 2', 0)])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
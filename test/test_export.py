@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Unit tests for the streaming export of the items"""
+import csv
+import io
+import json
+import unittest
+from click.testing import CliRunner
+from flask.cli import ScriptInfo
+from test.test_api import get_api_headers
+from test.setup_and_teardown import my_setup, my_teardown
+from flask import current_app
+from application.catalog import Item
+from application.catalog.export import EXPORT_COLUMNS, export_items
+
+
+class ExportTestCase(unittest.TestCase):
+    """Unit tests for the export of items as NDJSON and CSV"""
+    def setUp(self):
+        my_setup(self)
+
+    def tearDown(self):
+        my_teardown(self)
+
+    def test_0_0_export_items(self):
+        """Test that the exported rows are all items, written in batches"""
+        chunks = list(export_items('ndjson', batch_size=7))
+        rows = [json.loads(line) for line in ''.join(chunks).splitlines()]
+        self.assertEqual(len(rows), Item.query.count())
+        self.assertEqual(len(chunks), (len(rows) + 6) // 7)
+        self.assertEqual([row['id'] for row in rows],
+                         sorted(row['id'] for row in rows))
+        self.assertEqual(rows[1]['name'], 'Nugget Nectar')
+        self.assertEqual(list(rows[0]), list(EXPORT_COLUMNS))
+
+        rows = list(csv.reader(io.StringIO(''.join(
+            export_items('csv', category_id=1, batch_size=2)))))
+        self.assertEqual(rows[0], list(EXPORT_COLUMNS))
+        self.assertEqual(len(rows) - 1,
+                         Item.query.filter_by(category_id=1).count())
+        self.assertTrue(all(row[3] == '1' for row in rows[1:]))
+
+        # only the header
+        self.assertEqual(''.join(export_items('csv', user_id=999)),
+                         ','.join(EXPORT_COLUMNS) + '\n')
+
+    def test_1_0_api(self):
+        """Test the export endpoints of the api"""
+        headers = get_api_headers(current_app.config['USER_EMAIL'],
+                                  current_app.config['USER_PW'])
+
+        response = self.client().get('/api/v1/export/items', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(len(lines), Item.query.count())
+
+        response = self.client().get('/api/v1/users/3/export/items?format=csv',
+                                     headers=headers)
+        self.assertEqual(response.mimetype, 'text/csv')
+        rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual(len(rows) - 1,
+                         Item.query.filter_by(user_id=3).count())
+
+        for url, status_code in [('/api/v1/export/items?format=xml', 400),
+                                 ('/api/v1/users/999/export/items', 404),
+                                 ('/api/v1/categories/999/export/items', 404)]:
+            response = self.client().get(url, headers=headers)
+            self.assertEqual(response.status_code, status_code)
+
+    def test_2_0_cli(self):
+        """Test the flask export command"""
+        result = CliRunner().invoke(
+            current_app.cli.commands['export'],
+            ['--format', 'csv', '--category', '2'],
+            obj=ScriptInfo(create_app=lambda info: current_app))
+        self.assertEqual(result.exit_code, 0, result.output)
+        rows = list(csv.reader(io.StringIO(result.output)))
+        self.assertEqual(len(rows) - 1,
+                         Item.query.filter_by(category_id=2).count())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
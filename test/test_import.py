@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Unit tests for the bulk import of items"""
+import json
+import os
+import tempfile
+import unittest
+from click.testing import CliRunner
+from flask.cli import ScriptInfo
+from test.test_api import get_api_headers
+from test.setup_and_teardown import my_setup, my_teardown
+from sqlalchemy import event
+from flask import current_app
+from application.catalog import Item
+from application.catalog.bulk_import import import_items
+from application.catalog.export import export_items
+from application.changes import Change
+from application.extensions import db
+from application.search import search
+
+
+class ImportTestCase(unittest.TestCase):
+    """Unit tests for the import of items from NDJSON and CSV"""
+    def setUp(self):
+        my_setup(self)
+
+    def tearDown(self):
+        my_teardown(self)
+
+    def test_0_0_import_items(self):
+        """Test inserts, updates, and errors reported by line"""
+        items = Item.query.count()
+        changes = Change.query.count()
+        lines = [
+            json.dumps({'name': 'Import 1', 'category': 'American Amber / '
+                                                        'Red Ale'}),
+            json.dumps({'name': 'Import 2', 'description': 'Two',
+                        'category_id': 2}),
+            '',
+            json.dumps({'name': 'Nugget Nectar', 'description': 'Updated',
+                        'category_id': 1}),
+            json.dumps({'name': 'Import 3', 'category': 'No Such Style'}),
+            '{"name": ',
+            json.dumps({'description': 'No name', 'category_id': 1}),
+            json.dumps({'name': 'Import 1', 'description': 'Last wins',
+                        'category_id': 1}),
+            json.dumps({'name': 'x' * 97, 'category_id': 1}),
+        ]
+        result = import_items(lines, 'ndjson', user_id=3, batch_size=4)
+        self.assertEqual((result.inserted, result.updated, result.unchanged,
+                          result.failed), (2, 2, 0, 4))
+        self.assertEqual([error.line for error in result.errors],
+                         [5, 6, 7, 9])
+
+        self.assertEqual(Item.query.count(), items + 2)
+        itm = Item.query.filter_by(name='Import 1').one()
+        self.assertEqual(itm.description, 'Last wins')
+        self.assertEqual(itm.version, 2)
+        itm = Item.query.filter_by(name='Nugget Nectar').one()
+        self.assertEqual((itm.description, itm.version), ('Updated', 2))
+
+        # the changes are logged, and the search index follows
+        self.assertEqual(Change.query.count(), changes + 4)
+        self.assertEqual(search('import two')[0][1:],
+                         ('item', Item.query.filter_by(
+                             name='Import 2').one().id))
+
+        # an import of the export changes nothing
+        result = import_items(''.join(export_items('csv')).splitlines(),
+                              'csv', user_id=3)
+        self.assertEqual((result.inserted, result.updated, result.unchanged,
+                          result.failed), (0, 0, items + 2, 0))
+
+        # items of other users are not updated
+        result = import_items(lines[:1], 'ndjson', user_id=1)
+        self.assertEqual(result.failed, 1)
+        self.assertIn('another user', result.errors[0].message)
+
+    def test_0_1_concurrent_edit(self):
+        """Test that an item changed during the import is not overwritten,
+        and that the batch is tried again
+        """
+        table = Item.__table__
+        matched = []
+
+        def edit(conn, unused_cursor, statement, *unused_args):
+            """Change the item right before the first UPDATE of the import"""
+            if 'items.version = ?' in statement and not matched:
+                matched.append(conn.execute(table.update().where(
+                    table.c.name == 'Nugget Nectar').values(
+                        version=table.c.version + 1)).rowcount)
+
+        def count(unused_conn, cursor, statement, *unused_args):
+            """Collect the number of items matched by the import"""
+            if 'items.version = ?' in statement:
+                matched.append(cursor.rowcount)
+
+        for name, listener in [('before_cursor_execute', edit),
+                               ('after_cursor_execute', count)]:
+            event.listen(db.engine, name, listener)
+            self.addCleanup(event.remove, db.engine, name, listener)
+
+        lines = [json.dumps({'name': 'Nugget Nectar',
+                             'description': 'Updated', 'category_id': 1})]
+        result = import_items(lines, 'ndjson', user_id=3)
+        self.assertEqual((result.updated, result.failed), (1, 0))
+        # The edit, the stale UPDATE, and the UPDATE of the second try. The
+        # test database has one connection, so the rollback of the first try
+        # also rolled back the edit.
+        self.assertEqual(matched, [1, 0, 1])
+
+        itm = Item.query.filter_by(name='Nugget Nectar').one()
+        self.assertEqual((itm.description, itm.version), ('Updated', 2))
+        self.assertEqual(Change.query.filter_by(
+            resource_type='item', resource_id=itm.id,
+            operation=Change.UPDATE).one().version, 2)
+
+    def test_1_0_api(self):
+        """Test the import endpoint of the api"""
+        headers = get_api_headers(current_app.config['USER_EMAIL'],
+                                  current_app.config['USER_PW'])
+        headers['Content-Type'] = 'text/csv'
+
+        body = 'name,description,category\nCsv Beer,Brewed,Ipa\nBad,,\n'
+        response = self.client().post('/api/v1/import/items',
+                                      headers=headers, data=body)
+        self.assertEqual(response.status_code, 200)
+        result = json.loads(response.data)
+        self.assertEqual(result['failed'], 2)
+        self.assertEqual([error['line'] for error in result['errors']],
+                         [2, 3])
+
+        body = 'name,description,category_id\nCsv Beer,Brewed,1\n'
+        response = self.client().post('/api/v1/import/items',
+                                      headers=headers, data=body)
+        result = json.loads(response.data)
+        self.assertEqual((result['inserted'], result['failed']), (1, 0))
+        self.assertEqual(Item.query.filter_by(name='Csv Beer').one().user_id,
+                         3)
+
+        response = self.client().post('/api/v1/import/items?format=xml',
+                                      headers=headers, data=body)
+        self.assertEqual(response.status_code, 400)
+
+    def test_2_0_cli(self):
+        """Test the flask import command"""
+        handle, path = tempfile.mkstemp(suffix='.ndjson')
+        with os.fdopen(handle, 'w') as file:
+            file.write(json.dumps({'name': 'Cli Beer', 'category_id': 1}))
+        self.addCleanup(os.remove, path)
+
+        result = CliRunner().invoke(
+            current_app.cli.commands['import'],
+            [path, '--user', current_app.config['USER_EMAIL']],
+            obj=ScriptInfo(create_app=lambda info: current_app))
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(Item.query.filter_by(name='Cli Beer').count(), 1)
+
+        result = CliRunner().invoke(
+            current_app.cli.commands['import'],
+            [path, '--user', 'nobody@example.com'],
+            obj=ScriptInfo(create_app=lambda info: current_app))
+        self.assertNotEqual(result.exit_code, 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Unit tests for the per-request instrumentation"""
+import json
+import unittest
+from test.setup_and_teardown import my_setup, my_teardown
+from flask import current_app
+from application.instrumentation import RequestStats
+
+
+class InstrumentationTestCase(unittest.TestCase):
+    """Unit tests for the Server-Timing header and the slow request log"""
+    def setUp(self):
+        my_setup(self)
+
+    def tearDown(self):
+        my_teardown(self)
+
+    def test_0_0_server_timing(self):
+        """Test that the time and queries of a request are reported"""
+        response = self.client().get('/catalog/categories/1/items')
+        self.assertEqual(response.status_code, 200)
+        timing = response.headers['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="[1-9]\d* queries", '
+                                 r'app;dur=[\d.]+$')
+
+        response = self.client().get('/catalog/categories/99/items')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('Server-Timing', response.headers)
+
+    def test_0_1_slow_request_log(self):
+        """Test that a request above the threshold is logged as JSON"""
+        current_app.config['SLOW_REQUEST_THRESHOLD_MS'] = 0
+        with self.assertLogs(current_app.logger, 'WARNING') as logs:
+            self.client().get('/catalog/categories/1/items')
+
+        self.assertEqual(len(logs.output), 1)
+        entry = json.loads(logs.output[0].split('Slow request: ', 1)[1])
+        self.assertEqual(entry['endpoint'], 'catalog.category_items')
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['query_count'], 0)
+        self.assertLessEqual(len(entry['slowest_queries']), 5)
+        self.assertIn('SELECT', entry['slowest_queries'][0]['statement'])
+
+    def test_0_2_slowest_queries(self):
+        """Test that only the slowest statements are kept, slowest first"""
+        stats = RequestStats(max_slowest=2)
+        for i, duration in enumerate([0.1, 0.4, 0.2, 0.3]):
+            stats.add_query('statement {}'.format(i), duration)
+        self.assertEqual(stats.query_count, 4)
+        self.assertAlmostEqual(stats.query_time, 1.0)
+        self.assertEqual([query['statement']
+                          for query in stats.slowest_queries()],
+                         ['statement 1', 'statement 3'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
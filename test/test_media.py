@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Unit tests for the serving of the uploaded files"""
+import os
+import unittest
+from test.test_api import get_api_headers_multiform
+from test.test_thumbnails import image_file, remove_picture
+from test.setup_and_teardown import my_setup, my_teardown
+from flask import current_app
+from flask_uploads import FileStorage
+from application.extensions import db, images
+from application.user import User
+
+
+class MediaTestCase(unittest.TestCase):
+    """Unit tests for the media blueprint"""
+    def setUp(self):
+        my_setup(self)
+        self.user = User.query.filter_by(
+            email=current_app.config['USER_EMAIL']).one()
+        with current_app.test_request_context():
+            self.user.profile_pic = FileStorage(image_file((300, 200)),
+                                                filename='photo.jpg')
+        db.session.commit()
+        self.path = images.path(self.user.profile_pic_filename)
+        self.addCleanup(remove_picture, self.path)
+        with open(self.path, 'rb') as file:
+            self.content = file.read()
+
+    def tearDown(self):
+        my_teardown(self)
+
+    def test_0_0_immutable(self):
+        """Test the caching of a content-addressed file"""
+        url = self.user.profile_pic_url
+        self.assertTrue(url.startswith('/media/'))
+        self.assertIn(os.path.basename(self.path), url)
+
+        response = self.client().get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.content)
+        self.assertEqual(response.mimetype, 'image/jpeg')
+        self.assertEqual(response.headers['Cache-Control'],
+                         'public, max-age=31536000, immutable')
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        etag = response.headers['ETag']
+        self.assertEqual(etag, '"{}"'.format(os.path.basename(self.path)))
+
+        response = self.client().get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        response = self.client().get(url, headers={'Range': 'bytes=0-9'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, self.content[:10])
+        self.assertEqual(response.headers['Content-Range'],
+                         'bytes 0-9/{}'.format(len(self.content)))
+
+        response = self.client().get(url, headers={
+            'Range': 'bytes={}-'.format(len(self.content))})
+        self.assertEqual(response.status_code, 416)
+
+        with current_app.test_request_context():
+            url = self.user.profile_pic_thumbnail_url(64)
+        response = self.client().get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+
+        for url in ['/media/00/missing.jpg', '/media/../config.py']:
+            self.assertEqual(self.client().get(url).status_code, 404)
+
+    def test_0_1_legacy(self):
+        """Test the caching of a file uploaded before the blob store"""
+        path = images.path('legacy.jpg')
+        self.addCleanup(remove_picture, path)
+        with open(path, 'wb') as file:
+            file.write(self.content)
+
+        response = self.client().get('/media/legacy.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Cache-Control'],
+                         'public, max-age=300')
+        response = self.client().get('/media/legacy.jpg', headers={
+            'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_0_2_offload(self):
+        """Test sending the file by the web server"""
+        url = self.user.profile_pic_url
+        current_app.config['MEDIA_OFFLOAD'] = 'x-accel-redirect'
+        response = self.client().get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['X-Accel-Redirect'],
+                         '/_media/' + self.user.profile_pic_filename)
+        self.assertEqual(response.content_length, len(self.content))
+        self.assertIn('immutable', response.headers['Cache-Control'])
+
+        response = self.client().get(url, headers={
+            'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('X-Accel-Redirect', response.headers)
+
+        current_app.config['MEDIA_OFFLOAD'] = 'x-sendfile'
+        response = self.client().get(url)
+        self.assertEqual(response.headers['X-Sendfile'], self.path)
+
+    def test_1_0_api(self):
+        """Test that the profile picture of the api is revalidated"""
+        headers = get_api_headers_multiform(current_app.config['USER_EMAIL'],
+                                            current_app.config['USER_PW'])
+        for url in ['/api/v1/profile_pic',
+                    '/api/v1/profile_pic?size=original']:
+            response = self.client().get(url, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers['Cache-Control'],
+                             'private, no-cache')
+
+            headers['If-None-Match'] = response.headers['ETag']
+            response = self.client().get(url, headers=headers)
+            self.assertEqual(response.status_code, 304)
+            del headers['If-None-Match']
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
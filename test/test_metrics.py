@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Unit tests for the metrics blueprint"""
+import unittest
+from base64 import b64encode
+from test.setup_and_teardown import my_setup, my_teardown
+from flask import current_app
+from prometheus_client import REGISTRY
+from application.email.utils import send_email
+
+
+def sample(name, **labels):
+    """Returns the current value of a metric, or 0"""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Unit tests for the /metrics route"""
+    def setUp(self):
+        my_setup(self)
+
+    def tearDown(self):
+        my_teardown(self)
+
+    def test_0_0_requests(self):
+        """Test that requests are counted, with their latency"""
+        labels = {'endpoint': 'catalog.category_items', 'method': 'GET'}
+        count = sample('catalog_http_requests_total', status='200', **labels)
+        latency_count = sample('catalog_http_request_duration_seconds_count',
+                               **labels)
+
+        self.client().get('/catalog/categories/1/items')
+        self.assertEqual(sample('catalog_http_requests_total', status='200',
+                                **labels), count + 1)
+        self.assertEqual(sample('catalog_http_request_duration_seconds_count',
+                                **labels), latency_count + 1)
+        self.assertGreater(
+            sample('catalog_db_pool_checkout_wait_seconds_count'), 0)
+
+        response = self.client().get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn(b'catalog_http_requests_total{endpoint="catalog.'
+                      b'category_items",method="GET",status="200"}',
+                      response.data)
+
+    def test_0_1_cache_and_auth(self):
+        """Test that cache lookups and api authentications are counted"""
+        hits = sample('catalog_cache_lookups_total', cache='categories',
+                      result='hit')
+        self.client().get('/catalog/categories/1/items')
+        self.client().get('/catalog/categories/1/items')
+        self.assertGreater(sample('catalog_cache_lookups_total',
+                                  cache='categories', result='hit'), hits)
+
+        failures = sample('catalog_auth_attempts_total', method='password',
+                          outcome='failure')
+        headers = {'Authorization': 'Basic ' + b64encode(
+            b'nobody@example.com:cat').decode('utf-8')}
+        response = self.client().get('/api/v1/items/', headers=headers)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(sample('catalog_auth_attempts_total',
+                                method='password', outcome='failure'),
+                         failures + 1)
+
+    def test_0_2_email_outbox(self):
+        """Test that the depth of the email outbox is exposed"""
+        send_email('Hello', ['john@example.com'], '<p>Hello</p>')
+        response = self.client().get('/metrics')
+        self.assertIn(b'catalog_email_outbox_messages{state="pending"} 1.0',
+                      response.data)
+
+    def test_0_3_token(self):
+        """Test that a configured METRICS_TOKEN is required"""
+        current_app.config['METRICS_TOKEN'] = 'secret'
+        response = self.client().get('/metrics')
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client().get(
+            '/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Unit tests for the full-text search"""
+import json
+import unittest
+from test.test_api import get_api_headers
+from test.setup_and_teardown import my_setup, my_teardown
+from flask import current_app
+from application.user import User
+from application.catalog import Category, Item
+from application.extensions import db
+from application.search import search, autocomplete_index
+from application.search.autocomplete import AutocompleteIndex
+from application.changes import Change
+
+
+class SearchTestCase(unittest.TestCase):
+    """Unit tests for the search of items and categories"""
+    def setUp(self):
+        my_setup(self)
+
+    def tearDown(self):
+        my_teardown(self)
+
+    def test_0_0_search(self):
+        """Test matching, stemming and prefixes"""
+        hits = search('nugget nectar')
+        self.assertEqual(hits[0][1:], ('item', 2))
+
+        # all words must match
+        self.assertEqual(search('nugget lager'), [])
+
+        # stemmed, and the last word is a prefix
+        self.assertIn(('item', 18), [hit[1:] for hit in search('ales')])
+        self.assertIn(('category', 2),
+                      [hit[1:] for hit in search('american barleyw')])
+
+        # search syntax is ignored
+        self.assertEqual(search('"nugget" -nectar*')[0][1:], ('item', 2))
+        self.assertEqual(search('*'), [])
+
+    def test_0_1_index_in_sync(self):
+        """Test that inserts, updates and deletes are searchable"""
+        itm = Item(name='Pliny the Elder', description='Double IPA',
+                   user_id=3, category_id=1)
+        db.session.add(itm)
+        db.session.commit()
+        self.assertEqual(search('pliny')[0][1:], ('item', itm.id))
+
+        itm.description = 'Imperial IPA'
+        db.session.commit()
+        self.assertEqual(search('pliny double'), [])
+        self.assertEqual(search('pliny imperial')[0][1:], ('item', itm.id))
+
+        # deleted together with the category
+        db.session.delete(Category.query.get(1))
+        db.session.commit()
+        self.assertEqual(search('pliny'), [])
+
+        User.delete_account(User.query.get(3))
+        self.assertEqual(search('barleywine'), [])
+
+    def test_0_2_keyset_paging(self):
+        """Test that the pages of a search are the full results"""
+        all_hits = search('made', limit=100)
+        self.assertEqual(len(all_hits), 40)
+
+        hits = []
+        page = search('made', limit=7)
+        while page:
+            hits.extend(page)
+            page = search('made', after=page[-1], limit=7)
+        self.assertEqual(hits, all_hits)
+
+    def test_1_0_api(self):
+        """Test the search endpoint of the api"""
+        headers = get_api_headers(current_app.config['USER_EMAIL'],
+                                  current_app.config['USER_PW'])
+
+        url = '/api/v1/search?q=barleywine&page[size]=5'
+        ids = []
+        while url:
+            response = self.client().get(url, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            result = json.loads(response.data)
+            ids.extend((resource['type'], resource['id'])
+                       for resource in result['data'])
+            self.assertIn('score', result['data'][0]['meta'])
+            url = result['links'].get('next')
+
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertIn(('category', '2'), ids)
+        self.assertIn(('item', '21'), ids)
+
+        response = self.client().get(
+            '/api/v1/search?q=barleywine&filter[type]=category',
+            headers=headers)
+        result = json.loads(response.data)
+        self.assertEqual([resource['type'] for resource in result['data']],
+                         ['category'])
+
+        for url in ['/api/v1/search', '/api/v1/search?q=ale&filter[type]=x',
+                    '/api/v1/search?q=ale&page[cursor]=x']:
+            response = self.client().get(url, headers=headers)
+            self.assertEqual(response.status_code, 400)
+
+    def test_2_0_search_page(self):
+        """Test the search page of the catalog"""
+        current_app.config['SEARCH_PAGE_SIZE'] = 2
+        response = self.client().get('/catalog/search?q=lagunitas brewing')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Made by Lagunitas Brewing Company', response.data)
+        self.assertIn(b'More results', response.data)
+
+        response = self.client().get('/catalog/search?q=xyzzy')
+        self.assertIn(b'Nothing found', response.data)
+
+        response = self.client().get('/catalog/search?q=ale&cursor=x')
+        self.assertEqual(response.status_code, 400)
+
+    def test_3_0_autocomplete(self):
+        """Test the suggested names for a prefix"""
+        names = [suggestion.name for suggestion in
+                 autocomplete_index.complete('NUGG')]
+        self.assertEqual(names, ['Nugget Nectar'])
+
+        names = [suggestion.name for suggestion in
+                 autocomplete_index.complete('american', limit=3)]
+        self.assertEqual(len(names), 3)
+        self.assertEqual(names, sorted(names, key=str.casefold))
+        self.assertEqual(autocomplete_index.complete('xyzzy'), [])
+        self.assertEqual(autocomplete_index.complete(' '), [])
+
+    def test_3_1_autocomplete_in_sync(self):
+        """Test that the suggestions follow the changes of the names"""
+        self.assertEqual(autocomplete_index.complete('pliny'), [])
+        itm = Item(name='Pliny the Elder', user_id=3, category_id=1)
+        db.session.add(itm)
+        db.session.commit()
+        self.assertEqual([(s.resource_type, s.id) for s in
+                          autocomplete_index.complete('pliny')],
+                         [('item', itm.id)])
+
+        itm.name = 'Younger Pliny'
+        db.session.commit()
+        self.assertEqual(autocomplete_index.complete('pliny'), [])
+        self.assertEqual(len(autocomplete_index.complete('younger')), 1)
+
+        # changed by another process, which is read from the change log
+        db.session.execute(Item.__table__.update().where(
+            Item.id == 2).values(name='Nectar of Nuggets'))
+        db.session.add(Change(resource_type='item', resource_id=2,
+                              operation=Change.UPDATE))
+        db.session.commit()
+        self.assertEqual(autocomplete_index.complete('nugget'), [])
+        self.assertEqual(len(autocomplete_index.complete('nectar of')), 1)
+
+        # deleted together with the category
+        db.session.delete(Category.query.get(1))
+        db.session.commit()
+        self.assertEqual(autocomplete_index.complete('younger'), [])
+
+        self.assertEqual(autocomplete_index.complete('nectar of'), [])
+
+        self.assertTrue(autocomplete_index.complete('barleywine'))
+        User.delete_account(User.query.get(3))
+        self.assertEqual(autocomplete_index.complete('barleywine'), [])
+
+    def test_3_2_autocomplete_view(self):
+        """Test the autocomplete of the catalog search box"""
+        response = self.client().get('/catalog/autocomplete?term=nugget')
+        self.assertEqual(response.status_code, 200)
+        result = json.loads(response.data)
+        self.assertEqual(result[0]['label'], 'Nugget Nectar')
+        self.assertTrue(result[0]['url'].endswith('/items/2/'))
+
+    def test_3_3_autocomplete_deleted_category(self):
+        """Test that the items of a category that was deleted by another
+        process are caught up from the change log
+        """
+        current_app.config['WTF_CSRF_ENABLED'] = False
+        other_process = AutocompleteIndex()
+        other_process.init_app(current_app)
+        usr = User.query.filter_by(
+            email=current_app.config['USER_EMAIL']).one()
+        cat = Category.query.filter_by(user_id=usr.id).first()
+        name = Item.query.filter_by(category_id=cat.id).first().name
+        self.assertIn(name, [suggestion.name for suggestion in
+                             other_process.complete(name)])
+
+        with self.client() as client:
+            client.post('/login', data={
+                'email': current_app.config['USER_EMAIL'],
+                'password': current_app.config['USER_PW']})
+            response = client.get(
+                '/catalog/categories/{}/delete'.format(cat.id))
+            self.assertEqual(response.status_code, 302)
+
+        for index in (autocomplete_index, other_process):
+            self.assertNotIn(name, [suggestion.name for suggestion in
+                                    index.complete(name)])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Unit tests for the bulk seeding of synthetic catalogs"""
+import unittest
+from test.setup_and_teardown import my_setup, my_teardown
+from application.user import User
+from application.catalog import Category, Item, category_cache
+from application.extensions import db
+from application.seed import seed_catalog
+
+
+class SeedTestCase(unittest.TestCase):
+    """Unit tests for seed_catalog"""
+    def setUp(self):
+        my_setup(self)
+
+    def tearDown(self):
+        my_teardown(self)
+
+    def test_0_0_seed_catalog(self):
+        """Test that the seeded rows are added to the default content"""
+        users, categories, items = (User.query.count(), Category.query.count(),
+                                    Item.query.count())
+        category_cache.get()
+
+        result = seed_catalog(db.engine, users=3, categories=5, items=50,
+                              chunk_size=7)
+        self.assertEqual(result, (3, 5, 50))
+        self.assertEqual(User.query.count(), users + 3)
+        self.assertEqual(Category.query.count(), categories + 5)
+        self.assertEqual(Item.query.count(), items + 50)
+        self.assertEqual(len(category_cache.get()), categories + 5)
+
+        # Seeded users can log in, and new rows get the next free id
+        usr = User.query.filter(User.email.like('seed-user%')).first()
+        self.assertTrue(usr.verify_password('not-so-good-password'))
+        self.assertTrue(usr.role)
+        itm = Item(name='New Beer', description='New',
+                   user_id=usr.id, category_id=1)
+        db.session.add(itm)
+        db.session.commit()
+        self.assertEqual(itm.id, items + 51)
+
+    def test_0_1_seed_is_deterministic(self):
+        """Test that the same seed produces the same catalog"""
+        seed_catalog(db.engine, users=2, categories=3, items=20, seed=7)
+        first = [(itm.name, itm.user_id, itm.category_id)
+                 for itm in Item.query.order_by(Item.id)][-20:]
+
+        self.tearDown()
+        self.setUp()
+        seed_catalog(db.engine, users=2, categories=3, items=20, seed=7)
+        second = [(itm.name, itm.user_id, itm.category_id)
+                  for itm in Item.query.order_by(Item.id)][-20:]
+        self.assertEqual(first, second)
+
+    def test_0_2_seed_requires_owners(self):
+        """Test that categories and items can not be seeded without owners"""
+        with self.assertRaises(ValueError):
+            seed_catalog(db.engine, users=0, categories=1, items=0)
+        with self.assertRaises(ValueError):
+            seed_catalog(db.engine, users=1, categories=0, items=1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Unit tests for the thumbnails of the profile pictures"""
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from test.test_api import get_api_headers_multiform
+from test.setup_and_teardown import my_setup, my_teardown
+from PIL import Image
+from flask import current_app
+from flask_uploads import FileStorage
+from application.user import User
+from application.extensions import db
+from application.thumbnails import thumbnailer
+from application.blobs import collect_garbage
+
+
+def remove_picture(original):
+    """Remove the picture at path original, and its thumbnails"""
+    for path in [original] + thumbnailer.derivatives(original):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def image_file(size, mode='RGB', image_format='JPEG'):
+    """Returns an in-memory image file of size"""
+    file = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128)[:len(mode)]).save(
+        file, image_format)
+    file.seek(0)
+    return file
+
+
+class ThumbnailsTestCase(unittest.TestCase):
+    """Unit tests for the derivatives of the profile pictures"""
+    def setUp(self):
+        my_setup(self)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def tearDown(self):
+        thumbnailer.shutdown()
+        my_teardown(self)
+
+    def test_0_0_make_derivatives(self):
+        """Test the sizes and formats of the derivatives, and find"""
+        path = os.path.join(self.directory, 'photo.jpg')
+        with open(path, 'wb') as file:
+            file.write(image_file((1200, 800)).read())
+
+        self.assertIsNone(thumbnailer.find(path))
+        self.assertIsNone(thumbnailer.submit(path))
+
+        for size in thumbnailer.sizes:
+            for image_format in thumbnailer.formats:
+                found = os.path.join(self.directory, 'photo.jpg.{}.{}'.format(
+                    size, 'jpg' if image_format == 'jpeg' else image_format))
+                with Image.open(found) as image:
+                    self.assertEqual(image.size, (size, size))
+                    self.assertEqual(image.format, image_format.upper())
+
+        # the smallest that is large enough, else the largest
+        self.assertEqual(thumbnailer.find(path, 100),
+                         (path + '.128.jpg', 'image/jpeg'))
+        self.assertEqual(thumbnailer.find(path, 1000),
+                         (path + '.256.jpg', 'image/jpeg'))
+        self.assertEqual(thumbnailer.find(path, 64, ('image/webp',
+                                                     'image/jpeg'))[1],
+                         thumbnailer.formats[0].join(('image/', '')))
+
+        # transparent pictures get a white background as JPEG
+        path = os.path.join(self.directory, 'logo.png')
+        with open(path, 'wb') as file:
+            file.write(image_file((300, 300), 'RGBA', 'PNG').read())
+        thumbnailer.submit(path)
+        with Image.open(path + '.64.jpg') as image:
+            self.assertEqual(image.mode, 'RGB')
+
+        # a broken picture has no thumbnails
+        path = os.path.join(self.directory, 'broken.jpg')
+        with open(path, 'wb') as file:
+            file.write(b'not an image')
+        thumbnailer.submit(path)
+        self.assertIsNone(thumbnailer.find(path))
+
+    def test_0_2_exif_orientation(self):
+        """Test that a photo taken with the camera on its side is turned
+        upright
+        """
+        # Red left, blue right, with EXIF orientation 6: rotated 90 degrees
+        image = Image.new('RGB', (600, 200), (200, 30, 30))
+        image.paste((30, 30, 200), (300, 0, 600, 200))
+        exif = (b'Exif\0\0MM\0*\0\0\0\x08\0\x01'
+                b'\x01\x12\0\x03\0\0\0\x01\0\x06\0\0\0\0\0\0')
+        path = os.path.join(self.directory, 'photo.jpg')
+        image.save(path, 'JPEG', exif=exif)
+
+        thumbnailer.submit(path)
+        with Image.open(path + '.64.jpg') as thumbnail:
+            # Red on top, blue at the bottom
+            self.assertGreater(thumbnail.getpixel((32, 8))[0], 150)
+            self.assertGreater(thumbnail.getpixel((32, 56))[2], 150)
+
+    def test_0_1_pool(self):
+        """Test making the derivatives in the pool of processes"""
+        path = os.path.join(self.directory, 'photo.jpg')
+        with open(path, 'wb') as file:
+            file.write(image_file((640, 480)).read())
+
+        thumbnailer.workers = 1
+        future = thumbnailer.submit(path)
+        self.assertEqual(len(future.result(timeout=60)),
+                         len(thumbnailer.sizes) * len(thumbnailer.formats))
+        self.assertIsNotNone(thumbnailer.find(path))
+
+    def test_1_0_api(self):
+        """Test uploading a picture, and getting its thumbnails"""
+        headers = get_api_headers_multiform(current_app.config['USER_EMAIL'],
+                                            current_app.config['USER_PW'])
+        response = self.client().post(
+            '/api/v1/profile_pic', headers=headers,
+            data={'profile_pic': FileStorage(image_file((900, 600)),
+                                             filename='photo.jpg')})
+        self.assertEqual(response.status_code, 201)
+        usr = User.query.filter_by(
+            email=current_app.config['USER_EMAIL']).one()
+        original = os.path.join(current_app.config['UPLOADED_IMAGES_DEST'],
+                                usr.profile_pic_filename)
+        self.addCleanup(remove_picture, original)
+
+        headers['Accept'] = 'image/jpeg'
+        response = self.client().get('/api/v1/profile_pic?size=64',
+                                     headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'image/jpeg')
+        self.assertEqual(Image.open(io.BytesIO(response.data)).size,
+                         (64, 64))
+        self.assertIn('Accept', response.headers['Vary'])
+
+        if 'webp' in thumbnailer.formats:
+            headers['Accept'] = 'image/webp,*/*'
+            response = self.client().get('/api/v1/profile_pic',
+                                         headers=headers)
+            self.assertEqual(response.mimetype, 'image/webp')
+            self.assertEqual(Image.open(io.BytesIO(response.data)).size,
+                             (thumbnailer.default_size,) * 2)
+
+        response = self.client().get('/api/v1/profile_pic?size=original',
+                                     headers=headers)
+        self.assertEqual(Image.open(io.BytesIO(response.data)).size,
+                         (900, 600))
+        response.close()
+
+        response = self.client().get('/api/v1/profile_pic?size=large',
+                                     headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+        with current_app.test_request_context():
+            self.assertTrue(usr.profile_pic_thumbnail_url(64).endswith(
+                '.64.jpg'))
+
+            # a new picture replaces the old one, whose file and thumbnails
+            # are collected once nobody refers to it
+            usr.profile_pic = FileStorage(image_file((100, 100)),
+                                          filename='new.jpg')
+            db.session.commit()
+        self.addCleanup(remove_picture, os.path.join(
+            current_app.config['UPLOADED_IMAGES_DEST'],
+            usr.profile_pic_filename))
+        self.assertTrue(os.path.exists(original))
+        collect_garbage(grace=0)
+        self.assertFalse(os.path.exists(original))
+        self.assertFalse(os.path.exists(original + '.64.jpg'))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Unit tests for the streaming, size-capped uploads of images"""
+import io
+import json
+import os
+import unittest
+from test.test_api import get_api_headers_multiform
+from test.test_thumbnails import image_file, remove_picture
+from test.setup_and_teardown import my_setup, my_teardown
+from flask import current_app
+from flask_uploads import FileStorage
+from application.blobs import Blob
+from application.blobs.uploads import ImageSpool, sniff_image
+from application.extensions import images
+from application.user import User
+
+
+class UploadsTestCase(unittest.TestCase):
+    """Unit tests for the checks of the uploaded images"""
+    def setUp(self):
+        my_setup(self)
+        self.headers = get_api_headers_multiform(
+            current_app.config['USER_EMAIL'], current_app.config['USER_PW'])
+
+    def tearDown(self):
+        my_teardown(self)
+
+    def upload(self, file, filename='photo.jpg'):
+        """Post file as profile picture to the api"""
+        return self.client().post(
+            '/api/v1/profile_pic', headers=self.headers,
+            data={'profile_pic': FileStorage(file, filename=filename)})
+
+    def assert_rejected(self, response, status_code):
+        """Check the JSON error of a rejected upload"""
+        self.assertEqual(response.status_code, status_code)
+        self.assertIn('message', json.loads(response.get_data(as_text=True)))
+        self.assertEqual(Blob.query.count(), 0)
+
+    def test_0_0_sniff_image(self):
+        """Test the detection of the image formats"""
+        for image_format, extension in [('JPEG', 'jpg'), ('PNG', 'png'),
+                                        ('GIF', 'gif'), ('BMP', 'bmp')]:
+            head = image_file((10, 10), image_format=image_format).read(8)
+            self.assertEqual(sniff_image(head), extension)
+        for head in [b'<svg xml', b'<html><b', b'']:
+            self.assertIsNone(sniff_image(head))
+
+    def test_0_1_spool(self):
+        """Test that the spool can be read after its checks"""
+        content = image_file((600, 400), 'RGB', 'PNG').read()
+        directory = os.path.join(images.config.destination, 'tmp')
+        spool = ImageSpool(len(content), 600, 1024, directory)
+        for start in range(0, len(content), 500):
+            spool.write(content[start:start + 500])
+        spool.seek(0)
+        self.assertEqual(spool.read(), content)
+        self.assertEqual(spool.content.extension, 'png')
+        spool.close()
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_1_0_accepted(self):
+        """Test that an image is stored from the spool, by its content"""
+        current_app.config['UPLOAD_SPOOL_SIZE'] = 1024
+        current_app.config['UPLOAD_MAX_DIMENSION'] = 600
+        content = image_file((600, 400), 'RGB', 'PNG').read()
+        response = self.upload(io.BytesIO(content))
+        self.assertEqual(response.status_code, 201)
+
+        usr = User.query.filter_by(
+            email=current_app.config['USER_EMAIL']).one()
+        path = images.path(usr.profile_pic_filename)
+        self.addCleanup(remove_picture, path)
+        self.assertTrue(path.endswith('.png'))
+        with open(path, 'rb') as stored:
+            self.assertEqual(stored.read(), content)
+        self.assertEqual(Blob.query.one().size, len(content))
+        self.assertEqual(os.listdir(os.path.join(
+            images.config.destination, 'tmp')), [])
+
+    def test_1_1_rejected(self):
+        """Test that too large and other files are rejected"""
+        current_app.config['UPLOAD_MAX_BYTES'] = 1000
+        self.assert_rejected(self.upload(image_file((600, 400))), 413)
+
+        current_app.config['UPLOAD_MAX_BYTES'] = 1024 * 1024
+        current_app.config['UPLOAD_MAX_DIMENSION'] = 500
+        self.assert_rejected(self.upload(image_file((600, 400))), 413)
+        self.assert_rejected(self.upload(io.BytesIO(b'<svg></svg>')), 415)
+        self.assert_rejected(self.upload(io.BytesIO(b'GIF89a')), 415)
+        self.assert_rejected(self.upload(
+            io.BytesIO(b'\xff\xd8\xff' + b'\0' * 100)), 415)
+
+        # what was spooled to disk is removed
+        current_app.config['UPLOAD_SPOOL_SIZE'] = 1024
+        self.assert_rejected(self.upload(image_file((600, 400))), 413)
+        self.assertEqual(os.listdir(os.path.join(
+            images.config.destination, 'tmp')), [])
+
+        # and when the body ends in the middle of the file
+        body = (b'--boundary\r\nContent-Disposition: form-data; '
+                b'name="profile_pic"; filename="photo.png"\r\n'
+                b'Content-Type: image/png\r\n\r\n' +
+                image_file((600, 400), 'RGB', 'PNG').read())
+        headers = dict(self.headers)
+        headers['Content-Type'] = 'multipart/form-data; boundary=boundary'
+        response = self.client().post('/api/v1/profile_pic',
+                                      headers=headers, data=body)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(os.listdir(os.path.join(
+            images.config.destination, 'tmp')), [])
+
+        current_app.config['MAX_CONTENT_LENGTH'] = 1000
+        response = self.upload(image_file((400, 400)))
+        self.assertEqual(response.status_code, 413)
+
+    def test_2_0_profile_form(self):
+        """Test that the profile page flashes a rejected upload"""
+        client = self.client()
+        response = client.post('/login', data={
+            'email': current_app.config['USER_EMAIL'],
+            'password': current_app.config['USER_PW']})
+        self.assertEqual(response.status_code, 302)
+
+        response = client.post('/user/profile', data={
+            'profile_pic': FileStorage(io.BytesIO(b'<html></html>'),
+                                       filename='photo.jpg'),
+            'email': current_app.config['USER_EMAIL'],
+            'first_name': 'Example', 'last_name': 'User'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith('/user/profile'))
+
+        response = client.get('/user/profile')
+        self.assertIn(b'not a JPEG, PNG, GIF or BMP image', response.data)
+        self.assertEqual(Blob.query.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
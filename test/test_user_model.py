@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 """Unit tests for user blueprint"""
+import os
 import unittest
 import time
 from test.setup_and_teardown import my_setup, my_teardown
+from flask import current_app
 from application.user import User, AnonymousUser, Role, Permission
+from application.catalog import Category, Item, category_cache
 from application.extensions import db
+from application.passwords import password_hasher
 
 
 class UserModelTestCase(unittest.TestCase):
@@ -39,6 +43,61 @@ class UserModelTestCase(unittest.TestCase):
         usr2 = User(password='cat')
         self.assertTrue(usr.password_hash != usr2.password_hash)
 
+    def test_password_rehash(self):
+        """Test that a hash with outdated parameters is upgraded on login"""
+        usr = User(email='john@example.com', password='cat')
+        db.session.add(usr)
+        db.session.commit()
+        old_hash = usr.password_hash
+        self.assertFalse(password_hasher.needs_rehash(old_hash))
+
+        password_hasher.method = 'pbkdf2:sha256:2000'
+        self.assertTrue(password_hasher.needs_rehash(old_hash))
+        self.assertFalse(usr.verify_password('dog'))
+        self.assertEqual(usr.password_hash, old_hash)
+
+        self.assertTrue(usr.verify_password('cat'))
+        self.assertTrue(usr.password_hash.startswith('pbkdf2:sha256:2000$'))
+        self.assertFalse(password_hasher.needs_rehash(usr.password_hash))
+        self.assertTrue(usr.verify_password('cat'))
+
+    def test_password_concurrent_logins(self):
+        """Test that logins of a user changed since it was loaded do not
+        conflict, and do not bump its version
+        """
+        usr = User(email='john@example.com', password='cat')
+        db.session.add(usr)
+        db.session.commit()
+        users = User.__table__
+
+        for failed_logins in [1, 2, 3]:
+            version = usr.version
+            # Another request logs in between the load and the update
+            db.session.execute(users.update().where(
+                users.c.id == usr.id).values(version=users.c.version + 1))
+            self.assertFalse(usr.verify_password('dog'))
+            self.assertEqual(usr.failed_logins, failed_logins)
+            self.assertEqual(usr.version, version + 1)
+        self.assertTrue(usr.blocked)
+
+        password_hasher.method = 'pbkdf2:sha256:2000'
+        version = usr.version
+        self.assertTrue(usr.verify_password('cat'))
+        self.assertEqual(usr.failed_logins, 0)
+        self.assertTrue(usr.password_hash.startswith('pbkdf2:sha256:2000$'))
+        self.assertEqual(usr.version, version)
+
+    def test_password_hash_workers(self):
+        """Test hashing and verification in the pool of processes"""
+        password_hasher.workers = 2
+        try:
+            usr = User(password='cat')
+            self.assertTrue(usr.verify_password('cat'))
+            self.assertFalse(usr.verify_password('dog'))
+        finally:
+            password_hasher.shutdown()
+            password_hasher.workers = 0
+
     def test_valid_confirmation_token(self):
         """Test a valid email confirmation token"""
         usr = User(password='cat')
@@ -177,6 +236,74 @@ class UserModelTestCase(unittest.TestCase):
         self.assertFalse(usr.can(Permission.CRUD_USERS))
         self.assertFalse(usr.can(Permission.ADMIN))
 
+    def test_delete_account(self):
+        """Test that deleting an account deletes all owned categories and
+        items, including items of other users in the owned categories
+        """
+        usr = User.query.filter_by(
+            email=current_app.config['USER_EMAIL']).one()
+        other = User(email='john@example.com', password='cat')
+        db.session.add(other)
+        db.session.commit()
+
+        other_category = Category(name='Stout', user_id=other.id)
+        db.session.add(other_category)
+        db.session.commit()
+        db.session.add_all([
+            Item(name='Kept', description='kept', user_id=other.id,
+                 category_id=other_category.id),
+            Item(name='Deleted 1', description='in owned category',
+                 user_id=other.id, category_id=1),
+            Item(name='Deleted 2', description='owned item',
+                 user_id=usr.id, category_id=other_category.id)])
+        db.session.commit()
+
+        User.delete_account(usr)
+
+        self.assertIsNone(User.query.filter_by(
+            email=current_app.config['USER_EMAIL']).first())
+        self.assertEqual([cat.name for cat in Category.query.all()],
+                         ['Stout'])
+        self.assertEqual([itm.name for itm in Item.query.all()], ['Kept'])
+
+    def test_delete_account_loaded(self):
+        """Test deleting an account with its categories and items loaded,
+        which also clears the category cache
+        """
+        usr = User.query.filter_by(
+            email=current_app.config['USER_EMAIL']).one()
+        self.assertTrue(usr.categories)
+        self.assertTrue(usr.items)
+        self.assertIn(usr.categories[0].id,
+                      [cat.id for cat in category_cache.get()])
+
+        User.delete_account(usr)
+
+        self.assertEqual(Category.query.filter_by(user_id=usr.id).count(), 0)
+        self.assertEqual(category_cache.get(), [])
+
+    def test_delete_account_profile_pic(self):
+        """Test that the profile picture is removed after the commit"""
+        usr = User(email='john@example.com', password='cat')
+        usr.profile_pic_filename = 'test_delete_account.gif'
+        db.session.add(usr)
+        db.session.commit()
+
+        filepath = os.path.join(current_app.config['UPLOADED_IMAGES_DEST'],
+                                usr.profile_pic_filename)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'wb') as file:
+            file.write(b'GIF89a')
+
+        # nothing is removed when the deletion is rolled back
+        db.session.delete(usr)
+        db.session.flush()
+        db.session.rollback()
+        self.assertTrue(os.path.exists(filepath))
+
+        User.delete_account(usr)
+        self.assertFalse(os.path.exists(filepath))
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
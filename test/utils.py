@@ -2,6 +2,8 @@
 
 import pprint
 import json
+import socketserver
+import threading
 
 PPR = pprint.PrettyPrinter(indent=2)
 
@@ -46,3 +48,76 @@ def ordered(obj):
         return sorted(ordered(x) for x in obj)
 
     return obj
+
+
+class DebuggingSMTPServer(socketserver.ThreadingTCPServer):
+    """Local stand-in for an SMTP server, for unit tests of sending email.
+
+    It accepts every message, except for recipients that contain 'reject',
+    and records the messages and the number of connections:
+
+        server = DebuggingSMTPServer()
+        ... send emails to localhost, port server.port ...
+        server.shutdown()
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        socketserver.ThreadingTCPServer.__init__(self, ('localhost', 0),
+                                                 DebuggingSMTPHandler)
+        self.port = self.server_address[1]
+        self.messages = []
+        self.connections = 0
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def shutdown(self):
+        """Stop serving, and close the socket"""
+        socketserver.ThreadingTCPServer.shutdown(self)
+        self.server_close()
+
+
+class DebuggingSMTPHandler(socketserver.StreamRequestHandler):
+    """Handles one connection to the DebuggingSMTPServer"""
+
+    def reply(self, line):
+        """Send a reply line to the client"""
+        self.wfile.write((line + '\r\n').encode('ascii'))
+
+    def handle(self):
+        """Minimal SMTP dialog: EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+        self.server.connections += 1
+        self.reply('220 localhost debugging SMTP server')
+        recipients = []
+        for line in self.rfile:
+            command = line.decode('ascii').strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                if 'reject' in command:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(command[8:].strip('<> '))
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for data_line in self.rfile:
+                    if data_line.rstrip(b'\r\n') == b'.':
+                        break
+                    data.append(data_line)
+                self.server.messages.append((recipients, b''.join(data)))
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')